@@ -0,0 +1,243 @@
+"""Analysis path benchmark on synthetic gateway traces
+
+Generates synthetic captures (per-node counters, losses, CRC errors, cut-off
+lines) and measures wall time and peak memory (RSS above the stage start) of
+each analysis stage. Results can be saved as a baseline and later runs compared against it:
+
+    poetry run python3 ./benchmarks/bench_metrics.py --sizes 10000 1000000 --save benchmarks/baselines/metrics.json
+    poetry run python3 ./benchmarks/bench_metrics.py --sizes 10000 1000000 --baseline benchmarks/baselines/metrics.json
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import queue
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from loratestbed.metrics import (
+    read_packet_trace,
+    filter_packet_trace,
+    extract_required_metrics_from_trace,
+    compute_experiment_results,
+)
+from loratestbed.synthetic import write_synthetic_trace
+
+logging.basicConfig(
+    format="[%(asctime)s] [%(levelname)s] %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+# how often to check that the run of a size is still alive
+RESULT_POLL_SEC = 1.0
+
+STAGES = [
+    "read_packet_trace",
+    "filter_packet_trace",
+    "extract_required_metrics_from_trace",
+    "compute_experiment_results",
+]
+# read without filtering, so every stage is measured on its own
+NO_FILTER = {
+    "check_crc": False,
+    "min_node_address": None,
+    "max_node_address": None,
+    "rssi_threshold": None,
+    "check_zero_padding": False,
+}
+EXPERIMENT_PARAMS = {
+    "experiment_time_sec": 3600,
+    "packet_airtime_sec": 0.05,
+    "packet_size_bytes": 16,
+    "offered_load_percent": 60,
+}
+# stages faster than this are compared with this much slack
+MIN_COMPARED_SEC = 0.05
+
+
+def _rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class PeakRssSampler:
+    """Samples the process RSS from a thread, tracemalloc slows read_csv down a lot"""
+
+    def __init__(self, interval_sec: float = 0.002):
+        self._interval_sec = interval_sec
+        self._stop = threading.Event()
+        self.peak_bytes = _rss_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, _rss_bytes())
+            time.sleep(self._interval_sec)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, _rss_bytes())
+
+
+def _measure(function, *args, **kwargs):
+    start_rss = _rss_bytes()
+    with PeakRssSampler() as sampler:
+        start_time = time.perf_counter()
+        result = function(*args, **kwargs)
+        wall_sec = time.perf_counter() - start_time
+    return result, {
+        "wall_sec": round(wall_sec, 4),
+        "peak_mb": round((sampler.peak_bytes - start_rss) / 1e6, 2),
+    }
+
+
+def _run_size(num_packets: int, num_nodes: int, trace_dir: str, result_queue):
+    trace_filename = os.path.join(trace_dir, f"gateway-{num_packets}.csv")
+    transmitted = write_synthetic_trace(
+        trace_filename, num_packets, num_nodes=num_nodes, seed=0
+    )
+    controller_df = pd.DataFrame(
+        {
+            "NodeAddress": list(transmitted),
+            "TransmittedPackets": list(transmitted.values()),
+        }
+    )
+
+    stats = {}
+    packet_trace, stats["read_packet_trace"] = _measure(
+        read_packet_trace, trace_filename, use_cache=False, **NO_FILTER
+    )
+    packet_trace, stats["filter_packet_trace"] = _measure(
+        filter_packet_trace, packet_trace
+    )
+    node_metrics_df, stats["extract_required_metrics_from_trace"] = _measure(
+        extract_required_metrics_from_trace, packet_trace, controller_df
+    )
+    _, stats["compute_experiment_results"] = _measure(
+        compute_experiment_results, node_metrics_df, **EXPERIMENT_PARAMS
+    )
+    os.remove(trace_filename)
+    result_queue.put(stats)
+
+
+def run_benchmark(sizes, num_nodes: int = 20):
+    """Stage stats per trace size, each size runs in a fresh process"""
+    results = {}
+    with tempfile.TemporaryDirectory() as trace_dir:
+        for num_packets in sizes:
+            result_queue = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=_run_size, args=(num_packets, num_nodes, trace_dir, result_queue)
+            )
+            process.start()
+            while True:
+                try:
+                    stats = result_queue.get(timeout=RESULT_POLL_SEC)
+                    break
+                except queue.Empty:
+                    # e.g. killed by the OOM killer, it never puts its stats
+                    if not process.is_alive():
+                        raise RuntimeError(
+                            f"The {num_packets} packets run exited with code "
+                            f"{process.exitcode} without results"
+                        )
+            process.join()
+            results[str(num_packets)] = stats
+            for stage in STAGES:
+                logger.info(
+                    f"{num_packets} packets, {stage}: {stats[stage]['wall_sec']:.3f} s, "
+                    f"peak {stats[stage]['peak_mb']:.1f} MB"
+                )
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance: float):
+    """Returns a message for every stage that is slower or larger than tolerance x baseline"""
+    regressions = []
+    for size, stages in results.items():
+        for stage, stats in stages.items():
+            base = baseline.get(size, {}).get(stage)
+            if base is None:
+                continue
+            if stats["wall_sec"] > max(base["wall_sec"], MIN_COMPARED_SEC) * tolerance:
+                regressions.append(
+                    f"{size} packets, {stage}: {stats['wall_sec']:.3f} s vs {base['wall_sec']:.3f} s"
+                )
+            if stats["peak_mb"] > max(base["peak_mb"], 1.0) * tolerance:
+                regressions.append(
+                    f"{size} packets, {stage}: {stats['peak_mb']:.1f} MB vs {base['peak_mb']:.1f} MB"
+                )
+    return regressions
+
+
+def make_parser():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10000, 1000000],
+        help="Trace sizes in packets",
+    )
+    ap.add_argument("--num_nodes", type=int, default=20, help="Number of nodes")
+    ap.add_argument("--save", help="Write the results as a baseline JSON file")
+    ap.add_argument("--baseline", help="Baseline JSON file to compare against")
+    ap.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.5,
+        help="Allowed ratio to the baseline before a stage counts as a regression",
+    )
+    return ap
+
+
+def main():
+    args = make_parser().parse_args()
+    results = run_benchmark(args.sizes, args.num_nodes)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "machine": {
+                        "platform": platform.platform(),
+                        "python": platform.python_version(),
+                        "numpy": np.__version__,
+                        "pandas": pd.__version__,
+                        "cpu_count": os.cpu_count(),
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+        logger.info(f"Saved baseline to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        logger.info("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
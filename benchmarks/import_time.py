@@ -0,0 +1,104 @@
+"""Import time of the command line entry points
+
+Imports each module in a fresh interpreter with -X importtime and reports
+the cumulative import time (best of --repeat runs) and the heavy modules it
+pulled in. Exits with an error if a module is slower than --max_sec or loads
+a module it should defer:
+
+    poetry run python3 ./benchmarks/import_time.py --max_sec 0.5
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+
+logging.basicConfig(
+    format="[%(asctime)s] [%(levelname)s] %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+# modules that start on every run or query, and what they must not import
+ENTRY_POINTS = [
+    "loratestbed.main_gateway",
+    "loratestbed.main_controller",
+    "loratestbed.multi_gateway",
+    "loratestbed.run_testbed",
+    "loratestbed.experiment_logbook",
+    "loratestbed.daemon",
+    "loratestbed.replay",
+]
+DEFERRED_MODULES = ["pandas", "matplotlib", "tabulate", "pdb"]
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import(module: str):
+    """Cumulative import time in seconds and the deferred modules it loaded"""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import sys, {module}; "
+            f"print(' '.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=REPO_ROOT,
+        env=dict(os.environ, PYTHONPATH=REPO_ROOT),
+    )
+    # "import time: self [us] | cumulative | name", the module itself is last
+    for line in reversed(result.stderr.splitlines()):
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            cumulative_sec = int(fields[1]) / 1e6
+            break
+    else:
+        raise RuntimeError(f"No import time reported for {module}")
+    return cumulative_sec, result.stdout.split()
+
+
+def make_parser():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument(
+        "--modules", nargs="+", default=ENTRY_POINTS, help="Modules to import"
+    )
+    ap.add_argument("--repeat", type=int, default=3, help="Imports per module")
+    ap.add_argument(
+        "--max_sec",
+        type=float,
+        default=0.5,
+        help="Slowest allowed import time in seconds",
+    )
+    return ap
+
+
+def main():
+    args = make_parser().parse_args()
+    failures = []
+    for module in args.modules:
+        measurements = [measure_import(module) for _ in range(args.repeat)]
+        import_sec = min(import_sec for import_sec, _ in measurements)
+        loaded = measurements[0][1]
+        logger.info(
+            f"{module}: {import_sec * 1000:.0f} ms"
+            + (f", loads {', '.join(loaded)}" if loaded else "")
+        )
+        if import_sec > args.max_sec:
+            failures.append(f"{module} takes {import_sec:.2f} s to import")
+        if loaded:
+            failures.append(f"{module} imports {', '.join(loaded)}")
+
+    for failure in failures:
+        logger.error(failure)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Ingest throughput benchmark with synthetic gateway traffic
+
+Finds the highest packet rate main_gateway sustains on a pty that looks like
+a gateway port (no dropped bytes, no growing backlog), and measures how many
+packets per second read_packet_trace parses from a synthetic capture.
+
+    poetry run python3 ./benchmarks/ingest_throughput.py --duration 5
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+from loratestbed.main_gateway import run_gateway
+from loratestbed.metrics import read_packet_trace
+from loratestbed.synthetic import (
+    PtyTrafficSource,
+    SyntheticGatewayTraffic,
+    write_synthetic_trace,
+)
+
+logging.basicConfig(
+    format="[%(asctime)s] [%(levelname)s] %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+# seconds the gateway reader may take to open the pty and its output file
+READER_START_TIMEOUT_SEC = 10
+
+
+def measure_gateway_rate(
+    packets_per_sec: float,
+    duration_sec: float,
+    num_nodes: int,
+    packet_size_bytes: int,
+    max_backlog_sec: float = 0.5,
+):
+    traffic = SyntheticGatewayTraffic(
+        num_nodes=num_nodes, packet_size_bytes=packet_size_bytes, seed=0
+    )
+    source = PtyTrafficSource(traffic)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        trace_filename = os.path.join(tmp_dir, "gateway.csv")
+        reader = multiprocessing.Process(
+            target=run_gateway,
+            args=(2000000, source.slave_name, trace_filename),
+        )
+        reader.start()
+        # wait for the reader to open the port and the output file
+        start_time = time.monotonic()
+        while not os.path.exists(trace_filename):
+            if not reader.is_alive():
+                source.close()
+                raise RuntimeError(
+                    f"Gateway reader exited with code {reader.exitcode} before opening the port"
+                )
+            if time.monotonic() - start_time > READER_START_TIMEOUT_SEC:
+                reader.terminate()
+                reader.join()
+                source.close()
+                raise RuntimeError(
+                    f"Gateway reader did not open the port in {READER_START_TIMEOUT_SEC} s"
+                )
+            time.sleep(0.01)
+
+        source.run(packets_per_sec, duration_sec)
+        received_bytes_at_end = os.path.getsize(trace_filename)
+        time.sleep(max_backlog_sec)
+        reader.terminate()
+        reader.join()
+        received_bytes = os.path.getsize(trace_filename)
+    source.close()
+
+    bytes_per_sec = source.num_bytes_written / duration_sec
+    backlog_sec = (source.num_bytes_written - received_bytes_at_end) / bytes_per_sec
+    sustained = (
+        source.num_bytes_dropped == 0
+        and received_bytes == source.num_bytes_written
+        and backlog_sec < max_backlog_sec
+    )
+    logger.info(
+        f"{packets_per_sec:.0f} pkt/s: written {source.num_bytes_written} B, "
+        f"dropped {source.num_bytes_dropped} B, received {received_bytes} B, "
+        f"backlog {backlog_sec:.3f} s, source max write {source.max_write_sec*1000:.1f} ms"
+        f" -> {'sustained' if sustained else 'falling behind'}"
+    )
+    return sustained
+
+
+def find_max_gateway_rate(
+    start_rate, duration_sec, num_nodes, packet_size_bytes, steps=4
+):
+    # double until the reader falls behind, then bisect
+    low, high = 0.0, start_rate
+    while measure_gateway_rate(high, duration_sec, num_nodes, packet_size_bytes):
+        low, high = high, high * 2
+    for _ in range(steps):
+        rate = (low + high) / 2
+        if measure_gateway_rate(rate, duration_sec, num_nodes, packet_size_bytes):
+            low = rate
+        else:
+            high = rate
+    return low
+
+
+def measure_trace_parse_rate(num_packets: int, num_nodes: int, packet_size_bytes: int):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        trace_filename = os.path.join(tmp_dir, "gateway.csv")
+        write_synthetic_trace(
+            trace_filename,
+            num_packets,
+            num_nodes=num_nodes,
+            packet_size_bytes=packet_size_bytes,
+            seed=0,
+        )
+        start_time = time.perf_counter()
+        try:
+            read_packet_trace(trace_filename, use_cache=False)
+        except Exception as exception_message:
+            logger.error(f"read_packet_trace failed: {exception_message}")
+            return 0.0
+        parse_sec = time.perf_counter() - start_time
+
+    logger.info(f"read_packet_trace: {num_packets} packets in {parse_sec:.2f} s")
+    return num_packets / parse_sec
+
+
+def make_parser():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--duration", type=float, default=5, help="Seconds per rate step")
+    ap.add_argument("--start_rate", type=float, default=1000, help="First rate (pkt/s)")
+    ap.add_argument("--num_nodes", type=int, default=20, help="Number of nodes")
+    ap.add_argument("--packet_size_bytes", type=int, default=16, help="Payload size")
+    ap.add_argument(
+        "--trace_packets", type=int, default=1000000, help="Packets in parse benchmark"
+    )
+    ap.add_argument(
+        "--skip_gateway", action="store_true", help="Only benchmark parsing"
+    )
+    return ap
+
+
+def main():
+    args = make_parser().parse_args()
+
+    if not args.skip_gateway:
+        max_rate = find_max_gateway_rate(
+            args.start_rate, args.duration, args.num_nodes, args.packet_size_bytes
+        )
+        logger.info(f"main_gateway max sustained rate: {max_rate:.0f} pkt/s")
+
+    parse_rate = measure_trace_parse_rate(
+        args.trace_packets, args.num_nodes, args.packet_size_bytes
+    )
+    logger.info(f"read_packet_trace rate: {parse_rate:.0f} pkt/s")
+
+
+if __name__ == "__main__":
+    main()
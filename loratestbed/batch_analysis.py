@@ -0,0 +1,213 @@
+import argparse
+import concurrent.futures
+import fnmatch
+import logging
+import os
+from datetime import datetime
+
+import pandas as pd
+import yaml
+
+from loratestbed.experiment_logbook import LOGBOOK_TIME_FORMAT, query_logbook_entries
+from loratestbed.metrics import (
+    read_packet_trace,
+    extract_required_metrics_from_trace,
+    compute_experiment_results,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _resolve_path(path: str, logbook_file: str) -> str:
+    # logbook paths are relative to where run_testbed ran, fall back to the
+    # logbook folder so archived results can be moved around
+    if os.path.exists(path):
+        return path
+    return os.path.join(os.path.dirname(logbook_file), os.path.basename(path))
+
+
+def _resolve_entry_paths(entry: dict, logbook_file: str) -> dict:
+    for column in ["controller_filename", "gateway_filename", "metadata_filename"]:
+        entry[column] = _resolve_path(entry[column], logbook_file)
+    return entry
+
+
+def load_entry_config(entry: dict) -> dict:
+    with open(entry["metadata_filename"], "r") as f:
+        return yaml.safe_load(f)
+
+
+def load_controller_results(entry: dict) -> pd.DataFrame:
+    """Controller results (NodeAddress, TransmittedPackets, ...) of a logbook entry
+
+    Runs saved since controller-<timestamp>.csv was added use that file, older
+    runs get NodeAddress and TransmittedPackets back from the results pickle.
+    """
+    results_folder = os.path.dirname(entry["controller_filename"])
+    controller_filename = os.path.join(
+        results_folder, f"controller-{entry['timestamp']}.csv"
+    )
+    if os.path.exists(controller_filename):
+        return pd.read_csv(controller_filename)
+
+    expt_results_df = pd.read_pickle(entry["controller_filename"])
+    return expt_results_df[["node_indices", "total_packets"]].rename(
+        columns={"node_indices": "NodeAddress", "total_packets": "TransmittedPackets"}
+    )
+
+
+def select_logbook_entries(
+    logbook_file: str,
+    name: str = None,
+    start: datetime = None,
+    end: datetime = None,
+    config_filters: dict = None,
+):
+    """Logbook entries matching an experiment name pattern, a time range and config values
+
+    name is a shell-style pattern (e.g. "sweep-*"), start and end are
+    inclusive. config_filters maps config fields to the required value.
+    Returns entry dicts with resolved file paths.
+    """
+    if not logbook_file.endswith(".csv"):
+        # the SQLite logbook filters on its indexes, configs are not read
+        entries = query_logbook_entries(logbook_file, name, start, end, config_filters)
+        return [_resolve_entry_paths(entry, logbook_file) for entry in entries]
+
+    logbook = pd.read_csv(logbook_file, dtype={"timestamp": str})
+    entries = []
+    for entry in logbook.to_dict("records"):
+        if name is not None and not fnmatch.fnmatch(str(entry["expt_name"]), name):
+            continue
+        timestamp = datetime.strptime(entry["timestamp"], LOGBOOK_TIME_FORMAT)
+        if (start is not None and timestamp < start) or (
+            end is not None and timestamp > end
+        ):
+            continue
+
+        entry = _resolve_entry_paths(entry, logbook_file)
+
+        if config_filters:
+            config = load_entry_config(entry)
+            if any(
+                config.get(field) != value for field, value in config_filters.items()
+            ):
+                continue
+        entries.append(entry)
+    return entries
+
+
+def analyze_entry(entry: dict) -> pd.DataFrame:
+    """Re-run the trace analysis of one logbook entry
+
+    Per-node results are tagged with the entry timestamp and name and with the
+    scalar config fields, so results of many runs stack into one table.
+    """
+    config = load_entry_config(entry)
+    controller_df = load_controller_results(entry)
+
+    packet_trace = read_packet_trace(
+        entry["gateway_filename"], **config.get("packet_filter", {})
+    )
+    node_metrics_df = extract_required_metrics_from_trace(packet_trace, controller_df)
+    expt_results_df = compute_experiment_results(node_metrics_df, **config)
+
+    tags = {"timestamp": entry["timestamp"], "expt_name": entry["expt_name"]}
+    tags.update(
+        {
+            field: value
+            for field, value in config.items()
+            if isinstance(value, (str, int, float, bool))
+        }
+    )
+    for column, value in reversed(list(tags.items())):
+        expt_results_df.insert(0, column, value)
+    return expt_results_df
+
+
+def batch_analyze(entries, max_workers: int = None) -> pd.DataFrame:
+    """Analyze logbook entries in a process pool, one tidy table in entry order
+
+    Runs that fail (e.g. missing files) are logged and left out.
+    """
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(analyze_entry, entry) for entry in entries]
+        for entry, future in zip(entries, futures):
+            try:
+                results.append(future.result())
+            except Exception as exception_message:
+                logger.error(
+                    f"Analysis of {entry['timestamp']} ({entry['expt_name']}) failed: {exception_message}"
+                )
+
+    if not results:
+        return pd.DataFrame()
+    return pd.concat(results, ignore_index=True)
+
+
+def _parse_config_filter(config_filter: str):
+    # field=value, the value is parsed as YAML so numbers stay numbers
+    field, value = config_filter.split("=", 1)
+    return field, yaml.safe_load(value)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="[%(asctime)s] [%(levelname)s] %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(
+        description="Re-analyze archived experiments from the logbook in parallel."
+    )
+    parser.add_argument(
+        "-l",
+        "--logbook",
+        default="./results/experiment_logbook.sqlite",
+        help="Logbook file, SQLite or CSV. Default is ./results/experiment_logbook.sqlite.",
+    )
+    parser.add_argument("-n", "--name", help='Experiment name pattern, e.g. "sweep-*"')
+    parser.add_argument(
+        "--start",
+        type=lambda value: datetime.strptime(value, LOGBOOK_TIME_FORMAT),
+        help="First run time, e.g. 20240101-000000",
+    )
+    parser.add_argument(
+        "--end",
+        type=lambda value: datetime.strptime(value, LOGBOOK_TIME_FORMAT),
+        help="Last run time, e.g. 20240131-235959",
+    )
+    parser.add_argument(
+        "-c",
+        "--config_filter",
+        nargs="*",
+        default=[],
+        help="Config field values runs must have, e.g. mac_protocol=csma transmit_SF=SF8",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, help="Worker processes. Default is the CPU count."
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="Output table, .csv or .pkl",
+    )
+
+    args = parser.parse_args()
+    entries = select_logbook_entries(
+        args.logbook,
+        args.name,
+        args.start,
+        args.end,
+        dict(_parse_config_filter(value) for value in args.config_filter),
+    )
+    logger.info(f"Analyzing {len(entries)} runs")
+    results_df = batch_analyze(entries, args.jobs)
+
+    if args.output.endswith(".csv"):
+        results_df.to_csv(args.output, index=False)
+    else:
+        results_df.to_pickle(args.output)
+    logger.info(f"Saved {len(results_df)} rows to {args.output}")
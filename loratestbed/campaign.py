@@ -0,0 +1,98 @@
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# phases of a run in the order they complete
+PHASES = [
+    "pending",
+    "configured",
+    "triggered",
+    "captured",
+    "results_read",
+    "analysed",
+    "logged",
+]
+STATE_FILENAME = "campaign.json"
+
+
+def _normalize(configs):
+    # configs as they read back from JSON, to compare with a saved campaign
+    return json.loads(json.dumps(configs, default=str))
+
+
+class CampaignState:
+    """Checkpointed progress of a campaign, the last completed phase of every run
+
+    The state is kept in <campaign_dir>/campaign.json and rewritten atomically
+    on every phase change. Each run keeps its capture, controller results and
+    analysis results in <campaign_dir>/run-<point>/ until it is logged, so a
+    rerun can go on from the last completed phase.
+    """
+
+    def __init__(self, campaign_dir: str, configs, experiment_name: str = ""):
+        self.campaign_dir = campaign_dir
+        self._filename = os.path.join(campaign_dir, STATE_FILENAME)
+        self._lock = threading.Lock()
+        os.makedirs(campaign_dir, exist_ok=True)
+
+        if os.path.exists(self._filename):
+            with open(self._filename, "r") as f:
+                self._state = json.load(f)
+            if self._state["configs"] != _normalize(configs):
+                raise ValueError(
+                    f"{campaign_dir} holds another campaign, use a new campaign directory"
+                )
+            logger.info(
+                f"Resuming campaign in {campaign_dir}, "
+                f"{len(self.remaining())} of {len(configs)} runs left"
+            )
+        else:
+            self._state = {
+                "experiment_name": experiment_name,
+                "configs": _normalize(configs),
+                "runs": {},
+            }
+            self._save()
+
+    def _save(self):
+        tmp_filename = f"{self._filename}.tmp-{os.getpid()}"
+        with open(tmp_filename, "w") as f:
+            json.dump(self._state, f, indent=2)
+        os.replace(tmp_filename, self._filename)
+
+    def run(self, point: int) -> dict:
+        """Phase and checkpointed fields (e.g. current_time) of a run"""
+        with self._lock:
+            return dict(self._state["runs"].get(str(point), {"phase": "pending"}))
+
+    def phase(self, point: int) -> str:
+        return self.run(point)["phase"]
+
+    def completed(self, point: int, phase: str) -> bool:
+        return PHASES.index(self.phase(point)) >= PHASES.index(phase)
+
+    def set_phase(self, point: int, phase: str, **fields):
+        with self._lock:
+            run = self._state["runs"].setdefault(str(point), {})
+            run.update(fields)
+            run["phase"] = phase
+            run["updated_at"] = time.time()
+            self._save()
+        logger.debug(f"Run {point}: {phase}")
+
+    def remaining(self):
+        """Runs that are not logged yet"""
+        return [
+            point
+            for point in range(len(self._state["configs"]))
+            if self.phase(point) != "logged"
+        ]
+
+    def run_dir(self, point: int) -> str:
+        path = os.path.join(self.campaign_dir, f"run-{point:03d}")
+        os.makedirs(path, exist_ok=True)
+        return path
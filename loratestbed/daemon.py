@@ -0,0 +1,372 @@
+import argparse
+import json
+import logging
+import os
+import time
+import uuid
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ["queued", "running", "done", "failed", "cancelled"]
+FINISHED_STATES = ["done", "failed", "cancelled"]
+# directories of the spool, jobs move between them as they run
+SPOOL_DIRS = ["incoming", "running", "done", "failed", "status"]
+
+
+def _write_json(filename: str, data: dict):
+    # readers never see a partial file
+    tmp_filename = f"{filename}.tmp-{os.getpid()}"
+    with open(tmp_filename, "w") as f:
+        json.dump(data, f, indent=2, default=str)
+    os.replace(tmp_filename, filename)
+
+
+def _read_json(filename: str) -> dict:
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+class JobQueue:
+    """Experiment jobs in a spool directory, shared by the daemon and its clients
+
+    A job is a JSON file with the config and metadata. Clients submit into
+    incoming/, the daemon moves the job to running/ and then done/ or failed/,
+    and keeps status/<job_id>.json up to date for clients to follow.
+    Higher priority runs first, equal priorities run in submission order.
+    """
+
+    def __init__(self, spool_dir: str):
+        self.spool_dir = spool_dir
+        for name in SPOOL_DIRS:
+            os.makedirs(os.path.join(spool_dir, name), exist_ok=True)
+
+    def _path(self, name: str, job_id: str) -> str:
+        return os.path.join(self.spool_dir, name, f"{job_id}.json")
+
+    def submit(
+        self,
+        config: dict,
+        experiment_name: str = "",
+        logbook_message: str = "",
+        priority: int = 0,
+        submitted_by: str = None,
+    ) -> str:
+        job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        job = {
+            "job_id": job_id,
+            "config": config,
+            "experiment_name": experiment_name,
+            "logbook_message": logbook_message,
+            "priority": priority,
+            "submitted_by": submitted_by or os.environ.get("USER", ""),
+            "submitted_at": time.time(),
+        }
+        self.update_status(job, "queued")
+        _write_json(self._path("incoming", job_id), job)
+        logger.info(f"Submitted job {job_id} with priority {priority}")
+        return job_id
+
+    def queued_jobs(self):
+        """Queued jobs in the order they will run"""
+        jobs = []
+        incoming_dir = os.path.join(self.spool_dir, "incoming")
+        for filename in os.listdir(incoming_dir):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                jobs.append(_read_json(os.path.join(incoming_dir, filename)))
+            except FileNotFoundError:
+                # cancelled while listing
+                continue
+        return sorted(
+            jobs, key=lambda job: (-job["priority"], job["submitted_at"], job["job_id"])
+        )
+
+    def take_next(self):
+        """Moves the next queued job to running/ and returns it, None if the queue is empty"""
+        for job in self.queued_jobs():
+            try:
+                os.rename(
+                    self._path("incoming", job["job_id"]),
+                    self._path("running", job["job_id"]),
+                )
+            except FileNotFoundError:
+                continue
+            self.update_status(job, "running", started_at=time.time())
+            return job
+        return None
+
+    def finish(self, job: dict, results: dict = None, error: str = None):
+        state = "failed" if error is not None else "done"
+        os.rename(
+            self._path("running", job["job_id"]), self._path(state, job["job_id"])
+        )
+        self.update_status(
+            job, state, finished_at=time.time(), results=results, error=error
+        )
+
+    def cancel(self, job_id: str) -> bool:
+        """Removes a job that has not started yet"""
+        try:
+            job = _read_json(self._path("incoming", job_id))
+            os.remove(self._path("incoming", job_id))
+        except FileNotFoundError:
+            return False
+        self.update_status(job, "cancelled", finished_at=time.time())
+        return True
+
+    def recover(self):
+        """Fails jobs left in running/ by a daemon that stopped mid-run"""
+        running_dir = os.path.join(self.spool_dir, "running")
+        for filename in os.listdir(running_dir):
+            if filename.endswith(".json"):
+                job = _read_json(os.path.join(running_dir, filename))
+                logger.warning(f"Job {job['job_id']} was interrupted")
+                self.finish(job, error="interrupted, the daemon stopped during the run")
+
+    def update_status(self, job: dict, state: str, **fields):
+        status_filename = self._path("status", job["job_id"])
+        try:
+            status = _read_json(status_filename)
+        except FileNotFoundError:
+            status = {
+                "job_id": job["job_id"],
+                "experiment_name": job["experiment_name"],
+                "priority": job["priority"],
+                "submitted_by": job["submitted_by"],
+                "submitted_at": job["submitted_at"],
+            }
+        status.update(fields)
+        status["state"] = state
+        status["updated_at"] = time.time()
+        _write_json(status_filename, status)
+
+    def status(self, job_id: str) -> dict:
+        return _read_json(self._path("status", job_id))
+
+    def wait(self, job_id: str, poll_interval_sec: float = 1.0, timeout: float = None):
+        """Follows a job until it finishes, logging every status change"""
+        start_time = time.time()
+        last_status = None
+        while True:
+            status = self.status(job_id)
+            if status != last_status:
+                logger.info(
+                    f"Job {job_id}: {status['state']} {status.get('stage', '')}".rstrip()
+                )
+                last_status = status
+            if status["state"] in FINISHED_STATES:
+                return status
+            if timeout is not None and time.time() - start_time > timeout:
+                raise TimeoutError(f"Job {job_id} did not finish in {timeout} s")
+            time.sleep(poll_interval_sec)
+
+
+class HardwareRunner:
+    """Runs jobs on ports that stay open for the lifetime of the daemon
+
+    Devices may be power cycled between jobs, so each job writes every
+    register. keep_register_cache skips writes of values set by earlier jobs;
+    the cache is still dropped after a failed job.
+    """
+
+    def __init__(
+        self,
+        gateway_port: str,
+        controller_port: str,
+        keep_register_cache: bool = False,
+    ):
+        # serial and analysis modules are imported here, so clients start fast
+        from loratestbed.controller import SerialInterface
+        from loratestbed.sweep import GatewayRecorder
+
+        self._recorder = GatewayRecorder(gateway_port)
+        self._interface = SerialInterface(controller_port)
+        # one DeviceManager (and register cache) per device list
+        self._device_managers = {}
+        self._last_device_list = None
+        self._keep_register_cache = keep_register_cache
+
+    def _device_manager(self, device_list):
+        from loratestbed.device_manager import DeviceManager
+
+        key = tuple(device_list)
+        if key not in self._device_managers:
+            self._device_managers[key] = DeviceManager(
+                list(device_list), self._interface, cache_registers=True
+            )
+        elif not self._keep_register_cache or key != self._last_device_list:
+            # other device lists may have written registers of the same devices
+            self._device_managers[key].invalidate_register_cache()
+        self._last_device_list = key
+        return self._device_managers[key]
+
+    def __call__(self, job: dict, report) -> dict:
+        from loratestbed.main_controller import prepare_config
+        from loratestbed.sweep import run_point
+
+        config = prepare_config(dict(job["config"]))
+        report("running experiment")
+        try:
+            expt_results_df, logbook_entry = run_point(
+                self._device_manager(config["device_list"]),
+                self._recorder,
+                config,
+                job["experiment_name"],
+                job["logbook_message"],
+            )
+        except Exception:
+            # e.g. a device missed the ping, it may come back with its defaults
+            self._last_device_list = None
+            raise
+        return {
+            "results_filename": logbook_entry["controller_filename"],
+            "gateway_filename": logbook_entry["gateway_filename"],
+            "metadata_filename": logbook_entry["metadata_filename"],
+            "total_offered_load": float(expt_results_df.normalized_offered_load.sum()),
+            "total_normalized_throughput": float(
+                expt_results_df.normalized_throughput.sum()
+            ),
+            "mean_packet_reception_ratio": float(
+                expt_results_df.packet_reception_ratio.mean()
+            ),
+        }
+
+    def close(self):
+        self._recorder.close()
+
+
+def run_pending(queue: JobQueue, run_job) -> int:
+    """Runs queued jobs until the queue is empty, returns the number of jobs run
+
+    run_job(job, report) returns the results dict, report(stage) updates the
+    job status while it runs. A failing job is marked failed and the next one runs.
+    """
+    num_jobs = 0
+    while True:
+        job = queue.take_next()
+        if job is None:
+            return num_jobs
+        logger.info(f"Running job {job['job_id']} ({job['experiment_name']})")
+
+        def report(stage: str):
+            queue.update_status(job, "running", stage=stage)
+
+        try:
+            results = run_job(job, report)
+        except Exception as exception_message:
+            logger.error(f"Job {job['job_id']} failed: {exception_message}")
+            queue.finish(job, error=str(exception_message))
+        else:
+            queue.finish(job, results=results)
+        num_jobs += 1
+
+
+def serve(queue: JobQueue, run_job, poll_interval_sec: float = 1.0):
+    queue.recover()
+    logger.info(f"Waiting for jobs in {queue.spool_dir}")
+    while True:
+        run_pending(queue, run_job)
+        time.sleep(poll_interval_sec)
+
+
+def make_parser():
+    ap = argparse.ArgumentParser(
+        description="Testbed daemon and its clients, jobs go through a spool directory."
+    )
+    ap.add_argument(
+        "-s",
+        "--spool",
+        default="./spool",
+        help="Spool directory shared by the daemon and clients. Default is ./spool.",
+    )
+    commands = ap.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Run the daemon")
+    serve_parser.add_argument(
+        "-g", "--gateway", required=True, help="Gateway Port Name"
+    )
+    serve_parser.add_argument(
+        "-c", "--controller", required=True, help="Controller Port Name"
+    )
+    serve_parser.add_argument(
+        "--keep_register_cache",
+        action="store_true",
+        help="Skip register writes of values set by earlier jobs, "
+        "only if devices are not reset between jobs",
+    )
+
+    submit_parser = commands.add_parser("submit", help="Queue an experiment")
+    submit_parser.add_argument(
+        "--config", required=True, help="Path to the YAML configuration file"
+    )
+    submit_parser.add_argument("--experiment_name", default="", help="Experiment Name")
+    submit_parser.add_argument(
+        "--logbook_message", default="", help="Message for logbook"
+    )
+    submit_parser.add_argument(
+        "--priority", type=int, default=0, help="Higher priorities run first"
+    )
+    submit_parser.add_argument(
+        "--wait", action="store_true", help="Follow the job until it finishes"
+    )
+
+    status_parser = commands.add_parser("status", help="Show queued and given jobs")
+    status_parser.add_argument("job_ids", nargs="*", help="Jobs to show")
+
+    wait_parser = commands.add_parser("wait", help="Follow a job until it finishes")
+    wait_parser.add_argument("job_id")
+
+    cancel_parser = commands.add_parser("cancel", help="Remove a queued job")
+    cancel_parser.add_argument("job_id")
+    return ap
+
+
+def main():
+    logging.basicConfig(
+        format="[%(asctime)s] [%(levelname)s] %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    args = make_parser().parse_args()
+    queue = JobQueue(args.spool)
+
+    if args.command == "serve":
+        runner = HardwareRunner(args.gateway, args.controller, args.keep_register_cache)
+        try:
+            serve(queue, runner)
+        except KeyboardInterrupt:
+            logger.info("Exiting... (keyboard interrupt)")
+        finally:
+            runner.close()
+    elif args.command == "submit":
+        from loratestbed.main_controller import prepare_config
+
+        with open(args.config, "r") as f:
+            config = yaml.safe_load(f)
+        # fail here rather than in the daemon
+        prepare_config(dict(config))
+        job_id = queue.submit(
+            config, args.experiment_name, args.logbook_message, args.priority
+        )
+        print(job_id)
+        if args.wait:
+            print(json.dumps(queue.wait(job_id), indent=2))
+    elif args.command == "status":
+        for position, job in enumerate(queue.queued_jobs()):
+            print(
+                f"{position + 1}. {job['job_id']} priority {job['priority']} {job['experiment_name']}"
+            )
+        for job_id in args.job_ids:
+            print(json.dumps(queue.status(job_id), indent=2))
+    elif args.command == "wait":
+        print(json.dumps(queue.wait(args.job_id), indent=2))
+    elif args.command == "cancel":
+        if not queue.cancel(args.job_id):
+            logger.error(f"Job {args.job_id} is not queued")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,8 @@ import logging
 import numpy as np
 from enum import Enum
 import time
-import pandas as pd
-import pdb
 from loratestbed.controller import SerialInterface
+from loratestbed.tracing import traced
 
 
 # Self describing MACRO
@@ -96,7 +95,10 @@ RESULT_REGISTERS = [
 
 class DeviceManager:
     def __init__(
-        self, device_idxs: List[int], serial_interface: SerialInterface
+        self,
+        device_idxs: List[int],
+        serial_interface: SerialInterface,
+        cache_registers: bool = False,
     ) -> None:
         self._logger = logging.getLogger(__name__)
 
@@ -111,6 +113,15 @@ class DeviceManager:
         )
         # self._read_all_device_regs(self._device_idxs)
 
+        # With cache_registers, writes of the value a device already holds are
+        # skipped. Registers are known once written, broadcasts forget them.
+        self._cache_registers = cache_registers
+        self._known_registers = np.zeros(
+            (self._num_devices, REG_ARRAY_LENGTH), dtype=bool
+        )
+        self.num_register_writes = 0
+        self.num_skipped_writes = 0
+
     def _message_to_device(self, device_idx: int, message: List[int]):
         # check if device_idx is valid
         if device_idx not in self._device_idxs and device_idx != 255:
@@ -166,13 +177,41 @@ class DeviceManager:
         return read_bytes_int
 
     def _write_device_reg(self, device_idx: int, reg: LoRaRegister, value: int) -> int:
+        if self._cache_registers and device_idx in self._device_idxs:
+            id = self._device_idxs.index(device_idx)
+            if (
+                self._known_registers[id, reg.value]
+                and self._device_states[id, reg.value] == value
+            ):
+                self.num_skipped_writes += 1
+                return None
+
         # convert input to bytes:
         message_to_send = [2, reg.value, value]
         read_bytes_int: List[int] = self._message_to_device(device_idx, message_to_send)
+        self.num_register_writes += 1
         if (read_bytes_int is not None) and read_bytes_int[-1] != value:
             self._logger.critical(f"Tried to write {value}, got {read_bytes_int[-1]}")
+        written = (read_bytes_int is not None) and read_bytes_int[-1] == value
+        self._remember_register(device_idx, reg, value, written)
         return read_bytes_int
 
+    def _remember_register(
+        self, device_idx: int, reg: LoRaRegister, value: int, written: bool
+    ):
+        if device_idx == 255:
+            # broadcasts are not acknowledged by every device
+            self._known_registers[:, reg.value] = False
+        elif device_idx in self._device_idxs:
+            id = self._device_idxs.index(device_idx)
+            self._device_states[id, reg.value] = value
+            self._known_registers[id, reg.value] = written
+
+    def invalidate_register_cache(self):
+        # e.g. after a device was power cycled and is back to its defaults
+        self._known_registers[:] = False
+
+    @traced()
     def _ping_devices(self, device_idxs: List[int]) -> None:
         # check if list, if not make into list:
         if not isinstance(device_idxs, list):
@@ -201,17 +240,20 @@ class DeviceManager:
                     )
                 self._device_states[id, reg_id.value] = ret_int_list[-1]
 
+    @traced()
     def disable_all_devices(self):
         # Disable all devices by broadcasting 0 experiment time
         self._write_device_reg(255, LoRaRegister.EXPERIMENT_TIME_SECONDS, 0)
         self._write_device_reg(255, LoRaRegister.EXPERIMENT_TIME_SECONDS, 0)
 
+    @traced()
     def trigger_all_devices(self):
         self._message_to_device(255, [10, 0, 0])
         self._message_to_device(255, [10, 0, 0])
         return self._message_to_device(255, [10, 0, 0])
 
     # Setting total experiment time in seconds
+    @traced()
     def _set_experiment_time_seconds(self, time_sec: int):
         expt_time_multiplier: int = time_sec // 256 + 1
         expt_time_seconds: int = int(time_sec / expt_time_multiplier)
@@ -241,6 +283,16 @@ class DeviceManager:
                 tx_interval_multiplier,
             )
 
+    # Setting per device transmit interval registers (interval = base * multiplier ms)
+    @traced()
+    def set_transmit_intervals(self, bases: List[int], multipliers: List[int]):
+        for device_idx, base, multiplier in zip(self._device_idxs, bases, multipliers):
+            self._write_device_reg(device_idx, LoRaRegister.TX_INTERVAL_GLOBAL, base)
+            self._write_device_reg(
+                device_idx, LoRaRegister.TX_INTERVAL_MULTIPLIER, multiplier
+            )
+
+    @traced()
     def set_mac_protocol(
         self, protocol: str, min_backoff_ms: int = 12, max_backoff_ms: int = 64 * 12
     ):
@@ -310,6 +362,7 @@ class DeviceManager:
                 raise ValueError(f"{protocol} is not supported")
 
     # Setting packet arrival model at node: periodic or poisson (if periodic add optional variance)
+    @traced()
     def _set_packet_arrival_model(self, arrival_model: str, variance_ms=None):
         if not isinstance(arrival_model, str):
             raise ValueError("Input must be a string")
@@ -361,6 +414,7 @@ class DeviceManager:
             )
 
     # Set SF for transmit and receive modes
+    @traced()
     def _set_transmit_and_receive_SF(self, transmit_SF: str, receive_SF: str):
         if not isinstance(transmit_SF, str) or not isinstance(receive_SF, str):
             raise ValueError("Both inputs must be a string")
@@ -401,6 +455,7 @@ class DeviceManager:
             )
 
     # Set BW for transmit and receive modes
+    @traced()
     def _set_transmit_and_receive_BW(self, transmit_BW: str, receive_BW: str):
         if not isinstance(transmit_BW, str) or not isinstance(receive_BW, str):
             raise ValueError("Both inputs must be a string")
@@ -436,6 +491,7 @@ class DeviceManager:
                 f"Given BW string '{BW_string}' not in valid BW strings: [{possible_BW_strings}]"
             )
 
+    @traced()
     def set_packet_size_bytes(self, packet_size_bytes: int):
         for device_idx in self._device_idxs:
             self._write_device_reg(
@@ -443,6 +499,7 @@ class DeviceManager:
             )
 
     # Set CR for transmit and receive modes
+    @traced()
     def _set_transmit_and_receive_CR(self, transmit_CR: str, receive_CR: str):
         if not isinstance(transmit_CR, str) or not isinstance(receive_CR, str):
             raise ValueError("Both inputs must be a string")
@@ -540,7 +597,11 @@ class DeviceManager:
                     f"Given node param '{node_param}' not in configurable node params list: [{configurable_node_params_list}]"
                 )
 
+    @traced()
     def results(self):
+        # pandas is only needed here, the controller starts without it
+        import pandas as pd
+
         results = self._result_registers_from_device()
         column_names = [
             "NodeAddress",
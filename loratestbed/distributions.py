@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+# Gateway SNR and RSSI are s1_t, so one bin per integer value of the int8
+# range gives exact histograms. Values outside it land in the edge bins.
+HISTOGRAM_MIN = -128
+HISTOGRAM_NUM_BINS = 256
+SUMMARY_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+VALUE_DTYPES = {"snr": np.int8, "rssi": np.int16}
+
+
+def histogram_bins() -> np.ndarray:
+    return np.arange(HISTOGRAM_MIN, HISTOGRAM_MIN + HISTOGRAM_NUM_BINS)
+
+
+def grouped_histograms(values, codes, num_groups: int) -> np.ndarray:
+    """Histogram of integer values per group code, shape (num_groups, bins)
+
+    Rows with a negative code (no group) are skipped.
+    """
+    codes = np.asarray(codes)
+    in_group = codes >= 0
+    bins = np.clip(
+        np.asarray(values)[in_group].astype(np.int64) - HISTOGRAM_MIN,
+        0,
+        HISTOGRAM_NUM_BINS - 1,
+    )
+    counts = np.bincount(
+        codes[in_group] * HISTOGRAM_NUM_BINS + bins,
+        minlength=num_groups * HISTOGRAM_NUM_BINS,
+    )
+    return counts.reshape(num_groups, HISTOGRAM_NUM_BINS)
+
+
+def sum_histograms(histograms) -> np.ndarray:
+    return np.sum(np.stack(list(histograms)), axis=0)
+
+
+def histogram_quantiles(histograms, quantiles=SUMMARY_QUANTILES) -> np.ndarray:
+    """Quantiles of every histogram row, like np.quantile(method="inverted_cdf")
+
+    Rows without samples give NaN.
+    """
+    histograms = np.atleast_2d(histograms)
+    cumulative = np.cumsum(histograms, axis=1)
+    totals = cumulative[:, -1:]
+    # first bin whose cumulative count reaches q * total
+    targets = np.maximum(np.ceil(np.asarray(quantiles)[None, :] * totals), 1)
+    bin_idx = (cumulative[:, None, :] < targets[:, :, None]).sum(axis=2)
+    result = (np.minimum(bin_idx, HISTOGRAM_NUM_BINS - 1) + HISTOGRAM_MIN).astype(
+        np.float64
+    )
+    result[totals[:, 0] == 0] = np.nan
+    return result
+
+
+def quantile_column_names(metric: str, quantiles=SUMMARY_QUANTILES):
+    return [f"{metric}_p{round(quantile * 100)}" for quantile in quantiles]
+
+
+def group_value_arrays(values, codes, num_groups: int, dtype):
+    """Values of every group as one compact array each, in arrival order"""
+    if num_groups == 0:
+        return []
+    codes = np.asarray(codes)
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes[codes >= 0], minlength=num_groups)
+    sorted_values = np.asarray(values)[order][len(codes) - counts.sum() :]
+    return np.split(sorted_values.astype(dtype), np.cumsum(counts)[:-1])
+
+
+def merged_quantiles(
+    expt_results_df: pd.DataFrame, by, metric: str = "snr", quantiles=SUMMARY_QUANTILES
+) -> pd.DataFrame:
+    """Quantiles of SNR or RSSI over result rows merged by the given columns
+
+    Works across nodes and runs, e.g. batch_analysis results grouped by
+    mac_protocol, because histograms add up exactly.
+    """
+    histograms = expt_results_df.groupby(by, sort=False)[f"{metric}_hist"].agg(
+        sum_histograms
+    )
+    return pd.DataFrame(
+        histogram_quantiles(np.stack(histograms.to_list()), quantiles),
+        index=histograms.index,
+        columns=quantile_column_names(metric, quantiles),
+    )
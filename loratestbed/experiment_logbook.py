@@ -1,46 +1,322 @@
-import pandas as pd
+import argparse
+import contextlib
+import csv
+import fnmatch
+import json
+import logging
+import os
+import pathlib
+import sqlite3
 from datetime import datetime
 
+import yaml
 
-def logbook_add_entry(logbook_file, expt_params):
+# pandas is imported by the functions that return DataFrames, so adding
+# entries and command line queries start fast
+logger = logging.getLogger(__name__)
+
+LOGBOOK_TIME_FORMAT = "%Y%m%d-%H%M%S"
+# entry columns, in the order of the CSV logbook
+LOGBOOK_COLUMNS = [
+    "timestamp",
+    "expt_name",
+    "expt_version",
+    "experiment_time_sec",
+    "controller_filename",
+    "gateway_filename",
+    "metadata_filename",
+    "comment",
+]
+
+# timestamps are LOGBOOK_TIME_FORMAT strings, which sort in time order.
+# Scalar config fields of every entry go to config_fields, so runs can be
+# selected by config without reading their metadata files.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    entry_id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    expt_name TEXT,
+    expt_version REAL,
+    experiment_time_sec REAL,
+    controller_filename TEXT,
+    gateway_filename TEXT,
+    metadata_filename TEXT,
+    comment TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_timestamp ON entries (timestamp);
+CREATE INDEX IF NOT EXISTS entries_expt_name ON entries (expt_name);
+CREATE TABLE IF NOT EXISTS config_fields (
+    entry_id INTEGER NOT NULL REFERENCES entries (entry_id),
+    field TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (entry_id, field)
+);
+CREATE INDEX IF NOT EXISTS config_fields_value ON config_fields (field, value);
+"""
+
+
+def _is_csv(logbook_file: str) -> bool:
+    return str(logbook_file).endswith(".csv")
+
+
+def _encode_value(value) -> str:
+    # JSON keeps types apart ("80" vs 80), whole floats match ints like in python
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return json.dumps(value)
+
+
+def _config_fields(config: dict) -> dict:
+    return {
+        field: _encode_value(value)
+        for field, value in config.items()
+        if isinstance(value, (str, int, float, bool)) or value is None
+    }
+
+
+@contextlib.contextmanager
+def open_logbook(logbook_file: str, create: bool = True):
+    """SQLite connection to the logbook, creating the tables on first use
+
+    Without create the logbook is opened read-only, a missing logbook raises
+    FileNotFoundError instead of being created empty.
+    """
+    if create:
+        connection = sqlite3.connect(logbook_file, timeout=30)
+    else:
+        if not os.path.isfile(logbook_file):
+            raise FileNotFoundError(f"No logbook {logbook_file}")
+        uri = pathlib.Path(logbook_file).absolute().as_uri() + "?mode=ro"
+        connection = sqlite3.connect(uri, timeout=30, uri=True)
     try:
-        logbook = pd.read_csv(logbook_file)
-    except Exception as exception_message:
-        print(f"Warning: {exception_message}, Initializing empty logbook...")
-        logbook = pd.DataFrame()
+        if create:
+            # readers do not block the writer, concurrent runs wait for each other
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+        yield connection
+    finally:
+        connection.close()
+
+
+def _insert_entry(connection, entry: dict, config: dict = None):
+    cursor = connection.execute(
+        f"INSERT INTO entries ({', '.join(LOGBOOK_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(LOGBOOK_COLUMNS))})",
+        [entry[column] for column in LOGBOOK_COLUMNS],
+    )
+    if config:
+        connection.executemany(
+            "INSERT INTO config_fields (entry_id, field, value) VALUES (?, ?, ?)",
+            [
+                (cursor.lastrowid, field, value)
+                for field, value in _config_fields(config).items()
+            ],
+        )
+
+
+def logbook_add_entry(logbook_file, expt_params, config: dict = None):
+    """Appends one experiment to the logbook
+
+    A .csv logbook gets one appended line, any other file is an SQLite
+    logbook where the entry and its scalar config fields (for queries) are
+    written in one transaction.
+    """
+    entry = {
+        "timestamp": expt_params["date_time_str"],
+        "expt_name": expt_params["expt_name"],
+        "expt_version": expt_params["expt_version"],
+        "experiment_time_sec": expt_params["experiment_time_sec"],
+        "controller_filename": expt_params["controller_filename"],
+        "gateway_filename": expt_params["gateway_filename"],
+        "metadata_filename": expt_params["metadata_filename"],
+        "comment": expt_params["logbook_message"],
+    }
+
+    if _is_csv(logbook_file):
+        write_header = not os.path.exists(logbook_file)
+        with open(logbook_file, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=LOGBOOK_COLUMNS)
+            if write_header:
+                writer.writeheader()
+            writer.writerow(entry)
+        return
+
+    with open_logbook(logbook_file) as connection:
+        with connection:
+            _insert_entry(connection, entry, config)
+
+
+def import_csv_logbook(logbook_file: str, csv_file: str) -> int:
+    """Copies the entries of a CSV logbook into an empty SQLite logbook
+
+    Config fields are indexed from the metadata files that still exist.
+    Returns the number of imported entries, 0 if the logbook has entries already.
+    """
+    import pandas as pd
 
-    new_entry = pd.DataFrame(
-        {
-            "timestamp": [expt_params["date_time_str"]],
-            "expt_name": [expt_params["expt_name"]],
-            "expt_version": [expt_params["expt_version"]],
-            "experiment_time_sec": [expt_params["experiment_time_sec"]],
-            "controller_filename": [expt_params["controller_filename"]],
-            "gateway_filename": [expt_params["gateway_filename"]],
-            "metadata_filename": [expt_params["metadata_filename"]],
-            "comment": [expt_params["logbook_message"]],
-        }
+    csv_logbook = pd.read_csv(csv_file, dtype={"timestamp": str})
+    csv_logbook = csv_logbook.astype(object).where(csv_logbook.notna(), None)
+    with open_logbook(logbook_file) as connection:
+        with connection:
+            # taken before the check, so two importers do not both import
+            connection.execute("BEGIN IMMEDIATE")
+            if connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]:
+                return 0
+            for entry in csv_logbook.to_dict("records"):
+                config = None
+                metadata_filename = entry.get("metadata_filename")
+                if metadata_filename and os.path.exists(metadata_filename):
+                    with open(metadata_filename, "r") as f:
+                        config = yaml.safe_load(f)
+                _insert_entry(connection, entry, config)
+    logger.info(f"Imported {len(csv_logbook)} entries from {csv_file}")
+    return len(csv_logbook)
+
+
+def query_logbook_entries(
+    logbook_file: str,
+    name: str = None,
+    start: datetime = None,
+    end: datetime = None,
+    config_filters: dict = None,
+):
+    """Logbook entries matching an experiment name pattern, a time range and config values
+
+    name is a shell-style pattern (e.g. "sweep-*"), start and end are
+    inclusive. config_filters maps config fields to the required value.
+    Returns entry dicts in the order they were added.
+    """
+    conditions = []
+    params = []
+    if name is not None:
+        conditions.append("expt_name GLOB ?")
+        params.append(name)
+    if start is not None:
+        conditions.append("timestamp >= ?")
+        params.append(start.strftime(LOGBOOK_TIME_FORMAT))
+    if end is not None:
+        conditions.append("timestamp <= ?")
+        params.append(end.strftime(LOGBOOK_TIME_FORMAT))
+    for field, value in (config_filters or {}).items():
+        conditions.append(
+            "EXISTS (SELECT 1 FROM config_fields WHERE config_fields.entry_id = "
+            "entries.entry_id AND field = ? AND value = ?)"
+        )
+        params.extend([field, _encode_value(value)])
+
+    query = f"SELECT {', '.join(LOGBOOK_COLUMNS)} FROM entries"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY entry_id"
+    with open_logbook(logbook_file, create=False) as connection:
+        connection.row_factory = sqlite3.Row
+        return [dict(row) for row in connection.execute(query, params)]
+
+
+def query_logbook(logbook_file: str, *args, **kwargs):
+    """query_logbook_entries as a DataFrame"""
+    import pandas as pd
+
+    return pd.DataFrame(
+        query_logbook_entries(logbook_file, *args, **kwargs), columns=LOGBOOK_COLUMNS
     )
 
-    logbook = logbook._append(new_entry, ignore_index=True)
-    logbook.to_csv(logbook_file, index=False)
 
+def _filter_csv_logbook(
+    logbook, name: str = None, start=None, end=None, config_filters: dict = None
+):
+    # query_logbook_entries filters on a CSV logbook, which has no config fields
+    if config_filters:
+        raise ValueError(
+            "config_filters need an SQLite logbook, import the CSV logbook first"
+        )
+    keep = logbook["timestamp"].notna()
+    if name is not None:
+        keep &= logbook["expt_name"].map(
+            lambda expt_name: fnmatch.fnmatchcase(str(expt_name), name)
+        )
+    if start is not None:
+        keep &= logbook["timestamp"] >= start.strftime(LOGBOOK_TIME_FORMAT)
+    if end is not None:
+        keep &= logbook["timestamp"] <= end.strftime(LOGBOOK_TIME_FORMAT)
+    return logbook[keep].reset_index(drop=True)
+
+
+def logbook_load_entry(logbook_file, entry_index=-1, **filters):
+    """One entry of the logbook and all entries matching the filters
+
+    entry_index counts from the start (or the end, if negative) of the
+    entries matching the query_logbook filters, e.g. name="sweep-*".
+    """
+    import pandas as pd
 
-def logbook_load_entry(logbook_file, entry_index):
-    # Load the logbook from the CSV file
     try:
-        logbook = pd.read_csv(logbook_file)
+        if _is_csv(logbook_file):
+            logbook = pd.read_csv(logbook_file, dtype={"timestamp": str})
+        else:
+            logbook = query_logbook(logbook_file, **filters)
     except Exception as exception_message:
-        print(
-            f"Error: {exception_message} \nPlease provide correct filename with full path"
+        logger.error(
+            f"{exception_message} \nPlease provide correct filename with full path"
         )
         return
+    if _is_csv(logbook_file):
+        logbook = _filter_csv_logbook(logbook, **filters)
 
-    # Get the specified entry
-    if entry_index >= 0:
-        requested_entry = logbook.iloc[entry_index]
-    else:
-        requested_entry = logbook.iloc[entry_index]
-
-    requested_entry = requested_entry.to_dict()
+    requested_entry = logbook.iloc[entry_index].to_dict()
     return requested_entry, logbook
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="[%(asctime)s] [%(levelname)s] %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description="Query the experiment logbook.")
+    parser.add_argument(
+        "-l",
+        "--logbook",
+        default="./results/experiment_logbook.sqlite",
+        help="Logbook file. Default is ./results/experiment_logbook.sqlite.",
+    )
+    parser.add_argument(
+        "--import_csv", help="Import a CSV logbook into an empty logbook first"
+    )
+    parser.add_argument("-n", "--name", help='Experiment name pattern, e.g. "sweep-*"')
+    parser.add_argument(
+        "--start",
+        type=lambda value: datetime.strptime(value, LOGBOOK_TIME_FORMAT),
+        help="First run time, e.g. 20240101-000000",
+    )
+    parser.add_argument(
+        "--end",
+        type=lambda value: datetime.strptime(value, LOGBOOK_TIME_FORMAT),
+        help="Last run time, e.g. 20240131-235959",
+    )
+    parser.add_argument(
+        "-c",
+        "--config_filter",
+        nargs="*",
+        default=[],
+        help="Config field values runs must have, e.g. mac_protocol=csma transmit_SF=SF8",
+    )
+
+    args = parser.parse_args()
+    if not args.import_csv and not os.path.isfile(args.logbook):
+        parser.error(f"No logbook {args.logbook}")
+    if args.import_csv:
+        import_csv_logbook(args.logbook, args.import_csv)
+    # field=value, the value is parsed as YAML so numbers stay numbers
+    config_filters = {
+        field: yaml.safe_load(value)
+        for field, value in (
+            config_filter.split("=", 1) for config_filter in args.config_filter
+        )
+    }
+    entries = query_logbook_entries(
+        args.logbook, args.name, args.start, args.end, config_filters
+    )
+    print("\t".join(LOGBOOK_COLUMNS))
+    for entry in entries:
+        print("\t".join(str(entry[column]) for column in LOGBOOK_COLUMNS))
@@ -0,0 +1,208 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from loratestbed.utils import LORA_MAX_PAYLOAD_BYTES
+
+# Gateway line format (gateway_reference.ino): <payload hex>, <rssi>, <snr>, <crc error>\n
+NEWLINE = ord("\n")
+CARRIAGE_RETURN = ord("\r")
+COMMA = ord(",")
+SPACE = ord(" ")
+MINUS = ord("-")
+
+# Lookup from ASCII code to nibble value, 255 marks a non-hex character
+HEX_NIBBLE_TABLE = np.full(256, 255, dtype=np.uint8)
+HEX_NIBBLE_TABLE[np.frombuffer(b"0123456789", dtype=np.uint8)] = np.arange(10)
+HEX_NIBBLE_TABLE[np.frombuffer(b"ABCDEF", dtype=np.uint8)] = np.arange(10, 16)
+HEX_NIBBLE_TABLE[np.frombuffer(b"abcdef", dtype=np.uint8)] = np.arange(10, 16)
+
+# Integer fields are short (RSSI/SNR are s1_t, CRC is a flag)
+MAX_INT_FIELD_CHARS = 8
+
+
+class ParsedLines(NamedTuple):
+    payload: np.ndarray  # (n, max_payload_bytes) uint8, zero padded
+    payload_length: np.ndarray  # int16
+    rssi: np.ndarray  # int16
+    snr: np.ndarray  # int16
+    crc_status: np.ndarray  # uint8
+    node_address: np.ndarray  # uint8
+    counter: np.ndarray  # uint32
+    num_malformed: int
+
+    def __len__(self):
+        return len(self.rssi)
+
+
+def _gather(buf: np.ndarray, positions: np.ndarray, valid: np.ndarray, fill: int):
+    # buf[positions] where valid, fill elsewhere (positions may be out of range there)
+    safe_positions = np.where(valid, positions, 0)
+    return np.where(valid, buf[safe_positions], fill).astype(np.uint8)
+
+
+def decode_hex_fields(
+    buf: np.ndarray, starts, ends, max_bytes: int, min_bytes: int = 0
+):
+    """Decode hex fields buf[starts[i]:ends[i]] into a zero padded uint8 matrix
+
+    Odd length fields get an implicit leading zero. Returns the matrix (at
+    least min_bytes wide), the decoded length of each field and a mask of
+    fields that are valid hex of at most max_bytes bytes.
+    """
+    num_chars = ends - starts
+    odd = num_chars % 2
+    num_bytes = (num_chars + 1) // 2
+    width = int(max(min(max_bytes, num_bytes.max(initial=0)), min_bytes))
+
+    byte_idx = np.arange(width)
+    in_field = byte_idx[None, :] < num_bytes[:, None]
+    hi_pos = starts[:, None] + 2 * byte_idx[None, :] - odd[:, None]
+    # leading nibble of an odd field is the implicit zero
+    hi_valid = in_field & (hi_pos >= starts[:, None])
+    hi = HEX_NIBBLE_TABLE[_gather(buf, hi_pos, hi_valid, ord("0"))]
+    lo = HEX_NIBBLE_TABLE[_gather(buf, hi_pos + 1, in_field, ord("0"))]
+
+    valid = ~((hi == 255) | (lo == 255)).any(axis=1) & (num_chars > 0)
+    # longer fields would come out cut, their tail is not even checked
+    valid &= num_bytes <= max_bytes
+    payload = ((hi << 4) | lo).astype(np.uint8)
+    payload[~in_field] = 0
+    return payload, num_bytes.astype(np.int16), valid
+
+
+def decode_int_fields(buf: np.ndarray, starts, ends):
+    """Decode signed decimal fields buf[starts[i]:ends[i]], allowing spaces around
+
+    Returns int32 values and a mask of fields that hold a single valid number.
+    """
+    num_chars = ends - starts
+    values = np.zeros(len(starts), dtype=np.int32)
+    negative = np.zeros(len(starts), dtype=bool)
+    num_digits = np.zeros(len(starts), dtype=np.int32)
+    after_digits = np.zeros(len(starts), dtype=bool)
+    after_minus = np.zeros(len(starts), dtype=bool)
+    valid = (num_chars > 0) & (num_chars <= MAX_INT_FIELD_CHARS)
+
+    for char_idx in range(MAX_INT_FIELD_CHARS):
+        in_field = char_idx < num_chars
+        chars = _gather(buf, starts + char_idx, in_field, SPACE).astype(np.int32)
+        is_digit = (chars >= ord("0")) & (chars <= ord("9"))
+        is_minus = chars == MINUS
+        # a sign is only allowed in front of the digits
+        valid &= is_digit | (chars == SPACE) | (chars == CARRIAGE_RETURN) | is_minus
+        valid &= ~(is_minus & ((num_digits > 0) | negative))
+        # the digits follow the sign and are not split by spaces ("1 2")
+        valid &= ~(after_minus & ~is_digit)
+        valid &= ~(after_digits & is_digit)
+        after_digits |= (num_digits > 0) & ~is_digit
+        after_minus = is_minus
+        negative |= is_minus
+        values = np.where(is_digit, values * 10 + (chars - ord("0")), values)
+        num_digits += is_digit
+
+    valid &= num_digits > 0
+    return np.where(negative, -values, values), valid
+
+
+def parse_gateway_buffer(
+    data, max_payload_bytes: int = LORA_MAX_PAYLOAD_BYTES
+) -> ParsedLines:
+    """Parse complete gateway lines from a raw bytes buffer in one vectorized pass
+
+    Any bytes after the last newline are ignored, use GatewayLineParser to
+    carry them across reads. Payloads longer than max_payload_bytes count as
+    malformed lines.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    newlines = np.flatnonzero(buf == NEWLINE)
+    num_lines = len(newlines)
+
+    line_starts = np.empty(num_lines, dtype=np.int64)
+    line_starts[:1] = 0
+    line_starts[1:] = newlines[:-1] + 1
+    line_ends = newlines.astype(np.int64)
+
+    # exactly three commas per line
+    commas = np.flatnonzero(buf[: line_ends[-1] if num_lines else 0] == COMMA)
+    comma_line = np.searchsorted(newlines, commas)
+    commas_per_line = np.bincount(comma_line, minlength=num_lines)
+    well_formed = commas_per_line == 3
+
+    if len(commas):
+        first_comma = np.searchsorted(comma_line, np.arange(num_lines))
+        comma_idx = np.where(well_formed, first_comma, 0)[:, None] + np.arange(3)
+        comma_pos = commas[np.minimum(comma_idx, len(commas) - 1)]
+    else:
+        comma_pos = np.zeros((num_lines, 3), dtype=np.int64)
+
+    line_starts = line_starts[well_formed]
+    line_ends = line_ends[well_formed]
+    comma_pos = comma_pos[well_formed]
+
+    payload, payload_length, valid = decode_hex_fields(
+        buf, line_starts, comma_pos[:, 0], max_payload_bytes, min_bytes=4
+    )
+    field_ends = np.column_stack([comma_pos[:, 1], comma_pos[:, 2], line_ends])
+    int_fields = []
+    for field in range(3):
+        values, field_valid = decode_int_fields(
+            buf, comma_pos[:, field] + 1, field_ends[:, field]
+        )
+        int_fields.append(values)
+        valid &= field_valid
+
+    # address and counter need the first four payload bytes
+    valid &= payload_length >= 4
+    payload = payload[valid]
+    rssi, snr, crc_status = (values[valid] for values in int_fields)
+
+    # payload: {address, counter byte 0, counter byte 1, counter byte 2, zeros...}
+    counter = (
+        payload[:, 1].astype(np.uint32)
+        | (payload[:, 2].astype(np.uint32) << 8)
+        | (payload[:, 3].astype(np.uint32) << 16)
+    )
+    return ParsedLines(
+        payload=payload,
+        payload_length=payload_length[valid],
+        rssi=rssi.astype(np.int16),
+        snr=snr.astype(np.int16),
+        crc_status=crc_status.astype(np.uint8),
+        node_address=payload[:, 0].copy(),
+        counter=counter,
+        num_malformed=int(num_lines - valid.sum()),
+    )
+
+
+class GatewayLineParser:
+    """Incremental parser for raw gateway serial data
+
+    Bytes after the last newline of a read are kept and prepended to the next
+    one, so lines split across reads are parsed once they are complete.
+    """
+
+    def __init__(self, max_payload_bytes: int = LORA_MAX_PAYLOAD_BYTES):
+        self._max_payload_bytes = max_payload_bytes
+        self._remainder = b""
+
+    def feed(self, data: bytes) -> ParsedLines:
+        last_newline = data.rfind(b"\n")
+        if last_newline < 0:
+            self._remainder += data
+            return parse_gateway_buffer(b"", self._max_payload_bytes)
+
+        if self._remainder:
+            data = self._remainder + data
+            last_newline += len(self._remainder)
+        self._remainder = data[last_newline + 1 :]
+        return parse_gateway_buffer(
+            memoryview(data)[: last_newline + 1], self._max_payload_bytes
+        )
+
+    def flush(self) -> ParsedLines:
+        # parse whatever is left as a final line (capture ended without newline)
+        data, self._remainder = self._remainder, b""
+        return parse_gateway_buffer(
+            data + b"\n" if data else b"", self._max_payload_bytes
+        )
@@ -0,0 +1,151 @@
+import functools
+import logging
+
+import numpy as np
+
+from loratestbed.utils import (
+    lookup_lora_airtime,
+    parse_bw_hz,
+    parse_cr,
+    parse_sf,
+)
+
+logger = logging.getLogger(__name__)
+
+# Devices transmit every TX_INTERVAL_GLOBAL * TX_INTERVAL_MULTIPLIER ms, both
+# are one byte registers
+MAX_INTERVAL_BASE = 255
+MAX_INTERVAL_MULTIPLIER = 255
+
+
+@functools.lru_cache(maxsize=None)
+def interval_encodings(
+    max_base: int = MAX_INTERVAL_BASE, max_multiplier: int = MAX_INTERVAL_MULTIPLIER
+):
+    """Every interval the registers can encode, sorted, with one (base, multiplier) each"""
+    base, multiplier = np.meshgrid(
+        np.arange(1, max_base + 1), np.arange(1, max_multiplier + 1), indexing="ij"
+    )
+    intervals = (base * multiplier).ravel()
+    intervals, first = np.unique(intervals, return_index=True)
+    return intervals, base.ravel()[first], multiplier.ravel()[first]
+
+
+def encode_intervals(
+    target_interval_msec,
+    max_base: int = MAX_INTERVAL_BASE,
+    max_multiplier: int = MAX_INTERVAL_MULTIPLIER,
+):
+    """Closest encodable interval to every target, in terms of offered load
+
+    Load is airtime / interval, so candidates are compared by relative error.
+    Returns (base, multiplier, interval_msec) arrays.
+    """
+    target = np.asarray(target_interval_msec, dtype=np.float64)
+    intervals, bases, multipliers = interval_encodings(max_base, max_multiplier)
+
+    upper = np.clip(np.searchsorted(intervals, target), 0, len(intervals) - 1)
+    lower = np.maximum(upper - 1, 0)
+    # load error of an interval x for a target t is |t / x - 1|
+    lower_error = np.abs(target / intervals[lower] - 1)
+    upper_error = np.abs(target / intervals[upper] - 1)
+    best = np.where(lower_error <= upper_error, lower, upper)
+    return bases[best], multipliers[best], intervals[best]
+
+
+def node_airtimes(
+    num_devices: int, packet_size_bytes, transmit_SF, transmit_BW, transmit_CR
+):
+    """Per-node airtime in seconds, each setting is one value or one per node"""
+
+    def per_node(values, parse=None):
+        values = np.broadcast_to(np.asarray(values, dtype=object), (num_devices,))
+        return np.array([parse(value) if parse else value for value in values])
+
+    return lookup_lora_airtime(
+        per_node(packet_size_bytes).astype(np.int64),
+        per_node(transmit_SF, parse_sf),
+        per_node(transmit_BW, parse_bw_hz),
+        per_node(transmit_CR, parse_cr),
+    )
+
+
+def plan_intervals(
+    airtime_sec,
+    offered_load_percent: float = None,
+    node_offered_load_percent=None,
+    max_base: int = MAX_INTERVAL_BASE,
+    max_multiplier: int = MAX_INTERVAL_MULTIPLIER,
+) -> dict:
+    """Per-node transmit interval registers for a target offered load
+
+    Either offered_load_percent is split evenly over the nodes, or
+    node_offered_load_percent gives each node's own load. Offered load is
+    airtime / interval of the channel, like get_transmit_interval_msec.
+    Returns per-node arrays of the register values and the requested and
+    achieved load, the columns of plan_offered_load.
+    """
+    airtime_sec = np.atleast_1d(np.asarray(airtime_sec, dtype=np.float64))
+    num_nodes = len(airtime_sec)
+    if node_offered_load_percent is None:
+        if offered_load_percent is None:
+            raise ValueError("Give offered_load_percent or node_offered_load_percent")
+        node_offered_load_percent = np.full(num_nodes, offered_load_percent / num_nodes)
+    node_offered_load_percent = np.broadcast_to(
+        np.asarray(node_offered_load_percent, dtype=np.float64), (num_nodes,)
+    )
+    if np.any(node_offered_load_percent <= 0):
+        raise ValueError("Offered load must be greater than zero for every node")
+
+    target_interval_msec = airtime_sec * 1000 * 100 / node_offered_load_percent
+    bases, multipliers, interval_msec = encode_intervals(
+        target_interval_msec, max_base, max_multiplier
+    )
+    achieved_load_percent = airtime_sec * 1000 * 100 / interval_msec
+
+    plan = {
+        "airtime_sec": airtime_sec,
+        "requested_load_percent": node_offered_load_percent,
+        "target_interval_msec": target_interval_msec,
+        "tx_interval_base": bases,
+        "tx_interval_multiplier": multipliers,
+        "interval_msec": interval_msec,
+        "achieved_load_percent": achieved_load_percent,
+        "load_error_percent": achieved_load_percent - node_offered_load_percent,
+    }
+
+    out_of_range = (target_interval_msec < 1) | (
+        target_interval_msec > max_base * max_multiplier
+    )
+    if out_of_range.any():
+        logger.warning(
+            f"Intervals of nodes {np.flatnonzero(out_of_range).tolist()} are outside the register range"
+        )
+    logger.info(
+        f"Planned offered load: {achieved_load_percent.sum():.3f}% "
+        f"(requested {node_offered_load_percent.sum():.3f}%), "
+        f"max node error {np.abs(plan['load_error_percent']).max():.4f}%"
+    )
+    return plan
+
+
+def plan_offered_load(
+    airtime_sec,
+    offered_load_percent: float = None,
+    node_offered_load_percent=None,
+    max_base: int = MAX_INTERVAL_BASE,
+    max_multiplier: int = MAX_INTERVAL_MULTIPLIER,
+):
+    """plan_intervals as a DataFrame with one row per node"""
+    # pandas is imported here, the controller plans with plan_intervals
+    import pandas as pd
+
+    return pd.DataFrame(
+        plan_intervals(
+            airtime_sec,
+            offered_load_percent,
+            node_offered_load_percent,
+            max_base,
+            max_multiplier,
+        )
+    )
@@ -0,0 +1,371 @@
+import argparse
+import heapq
+import logging
+
+import numpy as np
+import pandas as pd
+
+from loratestbed.load_planner import node_airtimes
+from loratestbed.metrics import compute_experiment_results
+from loratestbed.utils import parse_bw_hz, parse_sf
+
+logger = logging.getLogger(__name__)
+
+# LMIC os ticks, 1 ms is 62.5 ticks
+OSTICKS_PER_MS = 62.5
+# A CAD on the SX127x listens for about two symbols
+CAD_SYMBOLS = 2
+ARRIVAL_MODELS = ["periodic", "poisson"]
+
+
+def mac_parameters(
+    protocol: str, min_backoff_ms: int = 12, max_backoff_ms: int = 64 * 12
+) -> dict:
+    """Contention settings DeviceManager.set_mac_protocol writes to the devices"""
+    if not isinstance(protocol, str):
+        raise ValueError("Input must be a string")
+    protocol = protocol.lower()
+    if protocol == "aloha":
+        return {"protocol": protocol, "carrier_sense": False}
+    if protocol not in ["csma", "fsma"]:
+        raise ValueError(f"{protocol} is not supported")
+    return {
+        "protocol": protocol,
+        "carrier_sense": True,
+        "difs_cads": 3 if protocol == "csma" else 2,
+        "backoff_unit_ms": min_backoff_ms,
+        "max_backoff_multiplier": max_backoff_ms // min_backoff_ms,
+        "lbt_ms": 8 * 16 / OSTICKS_PER_MS,
+        # LBT_MAX_RSSI_S1_T for CSMA, LBT_MIN_RSSI_S1_T for FSMA, transmissions
+        # received above it make the channel busy
+        "lbt_rssi_dbm": -90 if protocol == "csma" else -116,
+        "exponential_backoff": False,
+    }
+
+
+def arrival_intervals_ms(
+    rng: np.random.Generator,
+    interval_msec: int,
+    num_intervals: int,
+    arrival_model: str = "poisson",
+    variance_ms: int = None,
+) -> np.ndarray:
+    """Waits between packet arrivals like the firmware's get_wait_time_ms
+
+    The firmware draws one random byte per interval and floors to whole ms.
+    """
+    arrival_model = arrival_model.lower()
+    if arrival_model not in ARRIVAL_MODELS:
+        raise ValueError("Input string must be either 'poisson' or 'periodic'")
+    if arrival_model == "poisson":
+        random_byte = rng.integers(0, 256, num_intervals)
+        return np.floor(interval_msec * -np.log((random_byte + 0.1) / 255.1))
+    if variance_ms is None:
+        return np.full(num_intervals, float(interval_msec))
+    # periodic with variance, set in steps of 10 ms
+    random_byte = rng.integers(0, 256, num_intervals)
+    jitter = 10 * (random_byte - 127.5) / 255 * (variance_ms // 10)
+    return np.maximum(np.floor(interval_msec + jitter), 0)
+
+
+class _NodeArrivals:
+    # packet arrival times of one node, drawn in blocks as the simulation needs them
+    def __init__(self, rng, interval_msec, experiment_time_sec, **arrival_kwargs):
+        self._rng = rng
+        self._interval_msec = interval_msec
+        self._arrival_kwargs = arrival_kwargs
+        self._block_size = int(experiment_time_sec * 1000 / max(interval_msec, 1)) + 16
+        self._times = np.empty(0)
+        self._last_msec = 0.0
+
+    def __getitem__(self, counter: int) -> float:
+        while counter >= len(self._times):
+            intervals = arrival_intervals_ms(
+                self._rng, self._interval_msec, self._block_size, **self._arrival_kwargs
+            )
+            times = self._last_msec + np.cumsum(intervals)
+            self._last_msec = times[-1]
+            self._times = np.concatenate([self._times, times / 1000])
+        return self._times[counter]
+
+
+def _collisions(start: np.ndarray, end: np.ndarray, channel: np.ndarray):
+    """Transmissions that overlap another one on the same channel"""
+    collided = np.zeros(len(start), dtype=bool)
+    for channel_code in np.unique(channel):
+        idx = np.flatnonzero(channel == channel_code)
+        idx = idx[np.argsort(start[idx], kind="stable")]
+        channel_start, channel_end = start[idx], end[idx]
+        # starts are sorted, so the next transmission is the only later one to check
+        overlaps_later = np.append(channel_start[1:] < channel_end[:-1], False)
+        earlier_end = np.maximum.accumulate(channel_end)[:-1]
+        overlaps_earlier = np.insert(channel_start[1:] < earlier_end, 0, False)
+        collided[idx] = overlaps_later | overlaps_earlier
+    return collided
+
+
+def simulate_transmissions(
+    experiment_time_sec: float,
+    interval_msec,
+    airtime_sec,
+    mac_protocol: str = "aloha",
+    packet_arrival_model: str = "poisson",
+    channel=None,
+    symbol_time_sec=None,
+    periodic_variance_ms: int = None,
+    min_backoff_ms: int = 12,
+    max_backoff_ms: int = 64 * 12,
+    seed: int = None,
+    link_rssi_dbm=None,
+) -> pd.DataFrame:
+    """Discrete-event simulation of the devices' transmit loop on one channel
+
+    interval_msec and airtime_sec are per node. Like the firmware's
+    timed_executor, arrivals follow their own schedule and a packet that is
+    due while the node is still busy goes out right after. With carrier sense,
+    a node runs difs_cads CADs plus listen before talk before sending; a CAD
+    misses a transmission that started within its own listening time, and
+    sensing misses transmissions received below the protocol's LBT RSSI
+    threshold. link_rssi_dbm is the received power of each node's
+    transmissions at the others, per node or as a (sender, listener) matrix;
+    without it every transmission is received above the threshold. CSMA
+    backs off a random number of backoff units when the channel is busy, FSMA
+    waits for the channel to free up before its random backoff. Nodes stop
+    once a transmission ends after experiment_time_sec.
+
+    Returns one row per transmission: node (index into the node arrays),
+    counter, start_sec, end_sec, backoffs and collided. Transmissions on the
+    same channel (SF/BW) that overlap in time are collided, without capture.
+    """
+    rng = np.random.default_rng(seed)
+    interval_msec = np.atleast_1d(np.asarray(interval_msec))
+    num_nodes = len(interval_msec)
+    airtime_sec = np.broadcast_to(np.asarray(airtime_sec, dtype=np.float64), num_nodes)
+    channel = np.broadcast_to(np.asarray(0 if channel is None else channel), num_nodes)
+    if symbol_time_sec is None:
+        # SF8 at 125 kHz
+        symbol_time_sec = 2.0**8 / 125000
+    symbol_time_sec = np.broadcast_to(
+        np.asarray(symbol_time_sec, dtype=np.float64), num_nodes
+    )
+    mac = mac_parameters(mac_protocol, min_backoff_ms, max_backoff_ms)
+
+    arrivals = [
+        _NodeArrivals(
+            rng,
+            int(interval_msec[node]),
+            experiment_time_sec,
+            arrival_model=packet_arrival_model,
+            variance_ms=periodic_variance_ms,
+        )
+        for node in range(num_nodes)
+    ]
+    counters = [0] * num_nodes
+    backoffs = [0] * num_nodes
+    max_airtime_sec = float(airtime_sec.max())
+
+    if mac["carrier_sense"]:
+        cad_sec = CAD_SYMBOLS * symbol_time_sec
+        sense_sec = mac["difs_cads"] * cad_sec + mac["lbt_ms"] / 1000
+        backoff_unit_sec = mac["backoff_unit_ms"] / 1000
+        max_multiplier = mac["max_backoff_multiplier"]
+        # whether a node senses the transmissions of another, [sender, listener]
+        if link_rssi_dbm is None:
+            detectable = np.ones((num_nodes, num_nodes), dtype=bool)
+        else:
+            link_rssi_dbm = np.asarray(link_rssi_dbm, dtype=np.float64)
+            if link_rssi_dbm.ndim == 1:
+                link_rssi_dbm = link_rssi_dbm[:, None]
+            detectable = np.broadcast_to(
+                link_rssi_dbm > mac["lbt_rssi_dbm"], (num_nodes, num_nodes)
+            )
+
+    # transmissions in start order: node, counter, start, end, backoffs
+    tx_node, tx_counter, tx_start, tx_end, tx_backoffs = [], [], [], [], []
+
+    def busy_until(node: int, sense_start: float, sense_end: float) -> float:
+        # end of the latest transmission a node sensing in this window detects
+        detect_before = sense_end - cad_sec[node]
+        latest_end = 0.0
+        for tx_idx in range(len(tx_start) - 1, -1, -1):
+            if tx_start[tx_idx] < sense_start - max_airtime_sec:
+                break
+            if (
+                channel[tx_node[tx_idx]] == channel[node]
+                and detectable[tx_node[tx_idx], node]
+                and tx_start[tx_idx] <= detect_before
+                and tx_end[tx_idx] > sense_start
+            ):
+                latest_end = max(latest_end, tx_end[tx_idx])
+        return latest_end
+
+    # events: (time, sequence, node, sense_start), sense_start None for a new attempt
+    events = [(arrivals[node][0], node, node, None) for node in range(num_nodes)]
+    heapq.heapify(events)
+    sequence = num_nodes
+    while events:
+        time_sec, _, node, sense_start = heapq.heappop(events)
+        if mac["carrier_sense"] and sense_start is None:
+            heapq.heappush(
+                events, (time_sec + sense_sec[node], sequence, node, time_sec)
+            )
+            sequence += 1
+            continue
+
+        if mac["carrier_sense"]:
+            busy_end = busy_until(node, sense_start, time_sec)
+            if busy_end > 0:
+                backoffs[node] += 1
+                window = max_multiplier
+                if mac["exponential_backoff"]:
+                    window = min(2 ** backoffs[node], max_multiplier)
+                retry_sec = time_sec
+                if mac["protocol"] == "fsma":
+                    retry_sec = busy_end
+                    backoff_units = rng.integers(0, window)
+                else:
+                    backoff_units = rng.integers(1, window + 1)
+                retry_sec += backoff_units * backoff_unit_sec
+                heapq.heappush(events, (retry_sec, sequence, node, None))
+                sequence += 1
+                continue
+
+        end_sec = time_sec + airtime_sec[node]
+        tx_node.append(node)
+        tx_counter.append(counters[node])
+        tx_start.append(time_sec)
+        tx_end.append(end_sec)
+        tx_backoffs.append(backoffs[node])
+        counters[node] += 1
+        backoffs[node] = 0
+        if end_sec <= experiment_time_sec:
+            next_sec = max(arrivals[node][counters[node]], end_sec)
+            heapq.heappush(events, (next_sec, sequence, node, None))
+            sequence += 1
+
+    transmissions = pd.DataFrame(
+        {
+            "node": np.asarray(tx_node, dtype=np.int64),
+            "counter": np.asarray(tx_counter, dtype=np.int64),
+            "start_sec": np.asarray(tx_start),
+            "end_sec": np.asarray(tx_end),
+            "backoffs": np.asarray(tx_backoffs, dtype=np.int64),
+        }
+    )
+    transmissions["collided"] = _collisions(
+        transmissions["start_sec"].to_numpy(),
+        transmissions["end_sec"].to_numpy(),
+        channel[transmissions["node"].to_numpy()],
+    )
+    return transmissions
+
+
+def simulate_experiment(
+    config: dict, seed: int = None, reception_ratio: float = 1.0
+) -> pd.DataFrame:
+    """Experiment results for a controller config without the hardware
+
+    config is the output of main_controller.load_config. Collided packets
+    are lost and the others are received with probability reception_ratio.
+    SNR/RSSI come from a random link quality per node, its RSSI is also the
+    power the other nodes sense its transmissions with. Returns the
+    compute_experiment_results columns.
+    """
+    rng = np.random.default_rng(seed)
+    device_list = list(config["device_list"])
+    num_nodes = len(device_list)
+    interval_msec = np.asarray(config["tx_interval_base"]) * np.asarray(
+        config["tx_interval_multiplier"]
+    )
+    airtime_sec = node_airtimes(
+        num_nodes,
+        config["packet_size_bytes"],
+        config["transmit_SF"],
+        config["transmit_BW"],
+        config["transmit_CR"],
+    )
+    sf = np.broadcast_to(
+        np.asarray([parse_sf(value) for value in np.ravel(config["transmit_SF"])]),
+        num_nodes,
+    )
+    bw_hz = np.broadcast_to(
+        np.asarray([parse_bw_hz(value) for value in np.ravel(config["transmit_BW"])]),
+        num_nodes,
+    )
+
+    # per node link quality, in the gateway's RSSI/SNR units
+    rssi_mean = rng.uniform(-45, -5, num_nodes)
+    snr_mean = rng.uniform(5, 12, num_nodes)
+
+    transmissions = simulate_transmissions(
+        config["experiment_time_sec"],
+        interval_msec,
+        airtime_sec,
+        config["mac_protocol"],
+        config["packet_arrival_model"],
+        channel=sf * 1000000 + bw_hz,
+        symbol_time_sec=2.0**sf / bw_hz,
+        periodic_variance_ms=config.get("periodic_variance_ms"),
+        seed=rng.integers(2**32),
+        link_rssi_dbm=rssi_mean,
+    )
+    logger.info(
+        f"Simulated {len(transmissions)} transmissions, "
+        f"{transmissions['collided'].mean() * 100:.1f}% collided"
+    )
+
+    received = transmissions[
+        ~transmissions["collided"].to_numpy()
+        & (rng.random(len(transmissions)) < reception_ratio)
+    ]
+    node = received["node"].to_numpy()
+    transmitted = np.bincount(transmissions["node"], minlength=num_nodes)
+    node_metrics_df = pd.DataFrame(
+        {
+            "NodeAddress": np.asarray(device_list)[node],
+            "Counter": received["counter"].to_numpy(),
+            "SNR": np.round(snr_mean[node] + rng.normal(0, 2, len(node))),
+            "RSSI": np.round(rssi_mean[node] + rng.normal(0, 3, len(node))),
+            "TransmittedPackets": transmitted[node],
+        }
+    )
+    return compute_experiment_results(node_metrics_df, **config)
+
+
+if __name__ == "__main__":
+    from loratestbed.main_controller import load_config
+
+    logging.basicConfig(
+        format="[%(asctime)s] [%(levelname)s] %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(
+        description="Predict experiment results of a controller config by simulation."
+    )
+    parser.add_argument(
+        "-c", "--config", required=True, help="Path to the YAML configuration file"
+    )
+    parser.add_argument("--seed", type=int, help="Random seed")
+    parser.add_argument(
+        "-o", "--output", help="Save the results, .csv or .pkl. Default prints them."
+    )
+
+    args = parser.parse_args()
+    expt_results_df = simulate_experiment(load_config(args.config), args.seed)
+    if args.output is None:
+        print(
+            expt_results_df[
+                [
+                    "node_indices",
+                    "total_packets",
+                    "packet_reception_ratio",
+                    "normalized_throughput",
+                    "normalized_offered_load",
+                ]
+            ].to_string(index=False)
+        )
+    elif args.output.endswith(".csv"):
+        expt_results_df.to_csv(args.output, index=False)
+    else:
+        expt_results_df.to_pickle(args.output)
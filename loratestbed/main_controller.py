@@ -2,14 +2,18 @@ import argparse
 import logging
 
 logger = logging.getLogger(__name__)
-import pdb
 import time
 import yaml
 
 from loratestbed.controller import SerialInterface
 from loratestbed.device_manager import DeviceManager
+from loratestbed.load_planner import node_airtimes, plan_intervals
+from loratestbed.tracing import traced, tracing_to
 from loratestbed.utils import get_transmit_interval_msec
 
+# devices are read this long after the experiment time
+EXPERIMENT_MARGIN_SEC = 10
+
 
 def make_parser():
     ap = argparse.ArgumentParser()
@@ -17,12 +21,28 @@ def make_parser():
     ap.add_argument(
         "-c", "--config", required=True, help="Path to the YAML configuration file"
     )
+    ap.add_argument("--trace", help="Write a Chrome trace of the run to this file")
     return ap
 
 
+@traced()
 def load_config(yaml_path):
     with open(yaml_path, "r") as f:
         config = yaml.safe_load(f)
+    return prepare_config(config)
+
+
+@traced()
+def prepare_config(config: dict) -> dict:
+    """Adds the derived fields (airtime, interval registers) to a config"""
+    if "node_offered_load_percent" in config:
+        total_load_percent = sum(config["node_offered_load_percent"])
+        config.setdefault("offered_load_percent", total_load_percent)
+        if abs(config["offered_load_percent"] - total_load_percent) > 1e-6:
+            raise ValueError(
+                f"offered_load_percent {config['offered_load_percent']} is not the sum "
+                f"of node_offered_load_percent ({total_load_percent})"
+            )
 
     # Compute interval from offered load
     transmit_interval_msec, packet_airtime_sec = get_transmit_interval_msec(
@@ -39,6 +59,22 @@ def load_config(yaml_path):
         f"Interval is {transmit_interval_msec} ms for {config['offered_load_percent']}% load and {len(config['device_list'])} devices"
     )
 
+    # per device interval registers, nodes may have their own offered load
+    plan = plan_intervals(
+        node_airtimes(
+            len(config["device_list"]),
+            config["packet_size_bytes"],
+            config["transmit_SF"],
+            config["transmit_BW"],
+            config["transmit_CR"],
+        ),
+        config["offered_load_percent"],
+        config.get("node_offered_load_percent"),
+    )
+    config["tx_interval_base"] = plan["tx_interval_base"].tolist()
+    config["tx_interval_multiplier"] = plan["tx_interval_multiplier"].tolist()
+    config["achieved_offered_load_percent"] = float(plan["achieved_load_percent"].sum())
+
     return config
 
 
@@ -52,28 +88,13 @@ def main():
 
     parser = make_parser()
     args = parser.parse_args()
-    run_controller(args.port, args.config)
-
+    with tracing_to(args.trace):
+        run_controller(args.port, args.config)
 
-def run_controller(port, config):
-    config = load_config(config)
-
-    interface = SerialInterface(port)
-    logger.info("Setting up DeviceManager")
-    device_manager = DeviceManager(config["device_list"], interface)
-
-    # TODO: fix this?
-    # device_manager.update_node_params(
-    #     EXPT_TIME=[experiment_time_sec],
-    #     # TX_INTERVAL=[transmit_interval_msec],
-    #     # ARRIVAL_MODEL=[packet_arrival_model],
-    #     # ARRIVAL_MODEL=[packet_arrival_model, periodic_variance_x10_msec],
-    #     # LORA_SF=[transmit_SF, receive_SF],
-    #     LORA_BW=[transmit_BW, receive_BW],
-    #     # LORA_CR=[transmit_CR, receive_CR],
-    # )
-    # device_manager.update_node_params(**config)
 
+@traced()
+def configure_devices(device_manager: DeviceManager, config: dict):
+    """Disables the devices and writes the experiment registers of a config"""
     device_manager.disable_all_devices()
 
     # pre-experiment: updating parameters
@@ -81,14 +102,19 @@ def run_controller(port, config):
     device_manager._set_experiment_time_seconds(config["experiment_time_sec"])
 
     logger.info(
-        f"Setting transmit interval time to {config['transmit_interval_msec']} milliseconds"
+        f"Setting transmit intervals to {config['tx_interval_base']} x {config['tx_interval_multiplier']} milliseconds"
+    )
+    device_manager.set_transmit_intervals(
+        config["tx_interval_base"], config["tx_interval_multiplier"]
     )
-    device_manager._set_transmit_interval_milliseconds(config["transmit_interval_msec"])
 
+    # periodic arrivals may get a random variance, mac_simulator applies the same
     logger.info(
         f"Setting scheduler transmit interval mode to {config['packet_arrival_model']}"
     )
-    device_manager._set_packet_arrival_model(config["packet_arrival_model"])
+    device_manager._set_packet_arrival_model(
+        config["packet_arrival_model"], config.get("periodic_variance_ms")
+    )
 
     logger.info(
         f"Setting transmit SF to {config['transmit_SF']} and receive SF to {config['receive_SF']}"
@@ -117,14 +143,22 @@ def run_controller(port, config):
     logger.info(f"Setting MAC protocol to {config['mac_protocol']}")
     device_manager.set_mac_protocol(config["mac_protocol"])
 
-    # %% running experiment
+
+@traced()
+def start_experiment(device_manager: DeviceManager):
     logger.info("Triggering all devices")
     device_manager.trigger_all_devices()
 
+
+@traced()
+def wait_for_experiment(config: dict):
     logger.info("Waiting for experiment to finish...")
-    time.sleep(config["experiment_time_sec"] + 10)
+    time.sleep(config["experiment_time_sec"] + EXPERIMENT_MARGIN_SEC)
 
-    # post-experiment: pinging devices and get results
+
+@traced()
+def read_results(device_manager: DeviceManager, config: dict):
+    """Pings the devices after the experiment and reads their result registers"""
     logger.info("Pinging devices")
     pingable_devices = device_manager._ping_devices(config["device_list"])
     assert (
@@ -136,6 +170,38 @@ def run_controller(port, config):
 
     logger.debug(f"{result_df}")
 
+    return result_df
+
+
+def run_experiment(device_manager: DeviceManager, config: dict):
+    """Triggers the configured devices, waits for the experiment and reads the results"""
+    start_experiment(device_manager)
+    wait_for_experiment(config)
+    return read_results(device_manager, config)
+
+
+def run_controller(port, config):
+    config = load_config(config)
+
+    interface = SerialInterface(port)
+    logger.info("Setting up DeviceManager")
+    device_manager = DeviceManager(config["device_list"], interface)
+
+    # TODO: fix this?
+    # device_manager.update_node_params(
+    #     EXPT_TIME=[experiment_time_sec],
+    #     # TX_INTERVAL=[transmit_interval_msec],
+    #     # ARRIVAL_MODEL=[packet_arrival_model],
+    #     # ARRIVAL_MODEL=[packet_arrival_model, periodic_variance_x10_msec],
+    #     # LORA_SF=[transmit_SF, receive_SF],
+    #     LORA_BW=[transmit_BW, receive_BW],
+    #     # LORA_CR=[transmit_CR, receive_CR],
+    # )
+    # device_manager.update_node_params(**config)
+
+    configure_devices(device_manager, config)
+    result_df = run_experiment(device_manager, config)
+
     return result_df, config
 
 
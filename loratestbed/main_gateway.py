@@ -3,34 +3,53 @@ import sys
 import argparse
 import time
 
+from loratestbed.gateway_parser import GatewayLineParser
+
 
 class SerialReader:
     def __init__(self, port, baudrate=9600, timeout=1):
         self.ser = serial.Serial(port, baudrate, timeout=timeout)
-        self.output = sys.stdout
+        self.output = sys.stdout.buffer
         self.file = None
+        # raw bytes are written as received, the parser only keeps live counts
+        self.parser = GatewayLineParser()
+        self.num_bytes = 0
+        self.num_packets = 0
+        self.num_crc_errors = 0
+        self.num_malformed = 0
 
     def set_output_to_console(self):
         if self.file:
             self.file.close()
-        self.output = sys.stdout
+        self.output = sys.stdout.buffer
 
     def set_output_to_file(self, filename):
         if self.file:
             self.file.close()
-        self.file = open(filename, "w", encoding="utf-8")
+        self.file = open(filename, "wb")
         self.output = self.file
 
+    def _count_packets(self, parsed):
+        self.num_packets += len(parsed)
+        self.num_crc_errors += int(parsed.crc_status.astype(bool).sum())
+        self.num_malformed += parsed.num_malformed
+
+    def read_once(self):
+        # read whatever is buffered (blocks up to the port timeout for 1 byte)
+        data = self.ser.read(self.ser.in_waiting or 1)
+        if data:
+            self.num_bytes += len(data)
+            self.output.write(data)
+            self.output.flush()
+            self._count_packets(self.parser.feed(data))
+        return data
+
     def read_serial(self, timeout=None):
         start_time = time.time()
         print(f"Reading form gateway serial monitor")
         while True:
             try:
-                line = self.ser.readline()
-                if line:
-                    decoded_line = line.decode("utf-8", errors="replace")
-                    self.output.write(decoded_line)
-                    self.output.flush()
+                self.read_once()
             except KeyboardInterrupt:
                 self.close()
                 print("Exiting... (keyboard interrupt)")   
@@ -43,6 +62,10 @@ class SerialReader:
 
     def close(self):
         if self.ser and self.ser.is_open:
+            self._count_packets(self.parser.flush())
+            print(
+                f"Received {self.num_packets} packets ({self.num_crc_errors} CRC errors, {self.num_malformed} malformed lines)"
+            )
             self.ser.close()
         if self.file:
             self.file.close()
@@ -1,13 +1,24 @@
 import numpy as np
 import pandas as pd
 import struct
-import matplotlib.pyplot as plt
-from tabulate import tabulate
-import pdb
-import math
+import warnings
 
 import logging
 
+from loratestbed.distributions import (
+    HISTOGRAM_NUM_BINS,
+    VALUE_DTYPES,
+    group_value_arrays,
+    grouped_histograms,
+    histogram_quantiles,
+    quantile_column_names,
+    sum_histograms,
+)
+from loratestbed.gateway_parser import HEX_NIBBLE_TABLE
+from loratestbed.sequence import sequence_stats
+from loratestbed.trace_cache import CachedTrace, TraceCache, file_digest
+from loratestbed.tracing import span, traced
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,41 +32,209 @@ def parse_byte_string(data):
     return address, packet_counter
 
 
-def filter_packet_trace(packet_trace: pd.DataFrame):
-    # Remove packets with CRCStatus not zero
-    packet_trace = packet_trace[packet_trace["CRCStatus"] == 0]
-
-    # Remove packets with negative NodeAddress
-    packet_trace = packet_trace[packet_trace["NodeAddress"] > 23]
-    packet_trace = packet_trace[packet_trace["NodeAddress"] < 45]
-
-    packet_trace = packet_trace[packet_trace["RSSI"] > -50]
+def decode_payload_hex(payload_hex: pd.Series):
+    """Decode a column of hex payload strings into a zero padded uint8 matrix
+
+    Returns the matrix (as wide as the longest payload, at least 4 bytes), the
+    payload length in bytes and a mask of rows that hold valid hex.
+    """
+    # fixed width unicode array, one uint32 code point per character
+    chars = payload_hex.to_numpy(dtype=str)
+    width = chars.dtype.itemsize // 4
+    code_points = chars.view(np.uint32).reshape(len(chars), width)
+    num_chars = (code_points != 0).sum(axis=1)
+    num_bytes = (num_chars + 1) // 2
+    num_columns = 2 * max((width + 1) // 2, 4)
+
+    # anything outside ASCII is not hex (code 1 is rejected by the nibble table)
+    ascii_chars = np.where(code_points < 128, code_points, 1).astype(np.uint8)
+
+    # odd length payloads get a leading zero nibble, the padding decodes to zero
+    odd = (num_chars % 2).astype(bool)
+    aligned = np.full((len(chars), num_columns + 1), ord("0"), dtype=np.uint8)
+    aligned[~odd, :width] = ascii_chars[~odd]
+    aligned[odd, 1 : width + 1] = ascii_chars[odd]
+    aligned = aligned[:, :num_columns]
+    aligned[aligned == 0] = ord("0")
+
+    nibbles = HEX_NIBBLE_TABLE[aligned]
+    valid = ~(nibbles == 255).any(axis=1) & (num_chars > 0)
+    payload_bytes = (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+    return payload_bytes, num_bytes.astype(np.int16), valid
+
+
+PACKET_TRACE_COLUMNS = ["Payload", "RSSI", "SNR", "CRCStatus"]
+
+# Filters in the order they are applied, rejections count against the first
+# filter a packet fails
+PACKET_FILTERS = ["crc", "node_address", "rssi", "zero_padding"]
+
+
+def packet_filter_mask(
+    packet_trace: pd.DataFrame,
+    payload_bytes: np.ndarray = None,
+    check_crc: bool = True,
+    min_node_address: int = 24,
+    max_node_address: int = 44,
+    rssi_threshold: float = -50,
+    check_zero_padding: bool = True,
+):
+    """Build one mask of packets that pass every filter
+
+    Thresholds set to None (or checks set to False) disable that filter.
+    payload_bytes is the decoded payload matrix aligned with packet_trace, it is
+    decoded from the Payload column when not given. Returns the mask and the
+    number of packets rejected by each filter in PACKET_FILTERS.
+    """
+    num_packets = len(packet_trace)
+    masks = {}
+    if check_crc:
+        masks["crc"] = packet_trace["CRCStatus"].to_numpy() == 0
+
+    node_address = packet_trace["NodeAddress"].to_numpy()
+    if min_node_address is not None or max_node_address is not None:
+        masks["node_address"] = np.ones(num_packets, dtype=bool)
+        if min_node_address is not None:
+            masks["node_address"] &= node_address >= min_node_address
+        if max_node_address is not None:
+            masks["node_address"] &= node_address <= max_node_address
+
+    if rssi_threshold is not None:
+        masks["rssi"] = packet_trace["RSSI"].to_numpy() > rssi_threshold
+
+    # devices pad the payload after {address, counter} with zeros
+    if check_zero_padding:
+        if payload_bytes is None:
+            payload_bytes, _, _ = decode_payload_hex(packet_trace["Payload"])
+        masks["zero_padding"] = ~payload_bytes[:, 4:].any(axis=1)
+
+    keep = np.ones(num_packets, dtype=bool)
+    rejections = {}
+    for filter_name in PACKET_FILTERS:
+        if filter_name in masks:
+            rejections[filter_name] = int(np.count_nonzero(keep & ~masks[filter_name]))
+            keep &= masks[filter_name]
+        else:
+            rejections[filter_name] = 0
+
+    return keep, rejections
+
+
+@traced()
+def filter_packet_trace(
+    packet_trace: pd.DataFrame,
+    payload_bytes: np.ndarray = None,
+    return_rejections: bool = False,
+    **filter_kwargs,
+):
+    keep, rejections = packet_filter_mask(packet_trace, payload_bytes, **filter_kwargs)
 
-    # Remove packets where all bytes of payload are zero
-    packet_trace = packet_trace[
-        packet_trace["Payload"].apply(lambda x: all(byte == 0 for byte in x[4:]))
-    ]
+    rejections_str = ", ".join(f"{name}: {count}" for name, count in rejections.items())
+    logger.info(
+        f"Packet filter kept {np.count_nonzero(keep)} of {len(keep)} packets, rejected by {rejections_str}"
+    )
 
+    packet_trace = packet_trace[keep]
+    if return_rejections:
+        return packet_trace, rejections
     return packet_trace
 
 
-def read_packet_trace(filename: str):
-    column_names = ["Payload", "RSSI", "SNR", "CRCStatus"]
-
-    packet_trace = pd.read_csv(filename, names=column_names, index_col=False)
-    packet_trace["Payload"] = packet_trace["Payload"].apply(
-        lambda x: bytes.fromhex(x if len(x) % 2 == 0 else "0" + x)
+@traced()
+def decode_packet_trace(packet_trace: pd.DataFrame):
+    """Decode raw trace columns into typed packets
+
+    Returns the packets that parsed (with NodeAddress and Counter) and their
+    payload bytes as a uint8 matrix aligned with the returned rows.
+    """
+    packet_trace = packet_trace.copy()
+    # banner and cut-off lines leave non-numeric or missing fields
+    for column in PACKET_TRACE_COLUMNS[1:]:
+        packet_trace[column] = pd.to_numeric(packet_trace[column], errors="coerce")
+    payload_bytes, payload_length, valid = decode_payload_hex(packet_trace["Payload"])
+
+    # address and counter need the first four payload bytes
+    valid &= payload_length >= 4
+    valid &= packet_trace[PACKET_TRACE_COLUMNS[1:]].notna().all(axis=1).to_numpy()
+    packet_trace = packet_trace[valid].astype(
+        {"RSSI": np.int64, "SNR": np.int64, "CRCStatus": np.int64}
     )
-
-    packet_trace["NodeAddress"], packet_trace["Counter"] = zip(
-        *packet_trace["Payload"].apply(lambda x: parse_byte_string(x[:4]))
+    payload_bytes = payload_bytes[valid]
+    header = payload_bytes[:, :4].astype(np.int64)
+
+    # payload: {address, counter byte 0, counter byte 1, counter byte 2, zeros...}
+    packet_trace["NodeAddress"] = header[:, 0]
+    packet_trace["Counter"] = header[:, 1] | (header[:, 2] << 8) | (header[:, 3] << 16)
+
+    return packet_trace, payload_bytes
+
+
+def _read_raw_packet_trace(filename: str, chunksize: int = None):
+    # captures hold the raw serial bytes, which may include line noise. Banner
+    # and cut-off lines make numeric columns mixed, they are coerced on decode
+    return pd.read_csv(
+        filename,
+        names=PACKET_TRACE_COLUMNS,
+        index_col=False,
+        dtype={"Payload": str},
+        encoding_errors="replace",
+        on_bad_lines="skip",
+        chunksize=chunksize,
     )
 
-    packet_trace = filter_packet_trace(packet_trace)
+
+def _decode_and_cache(filename: str, cache: TraceCache, cache_key: str):
+    with span("metrics.parse_csv"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", pd.errors.DtypeWarning)
+        packet_trace = _read_raw_packet_trace(filename)
+    packet_trace, payload_bytes = decode_packet_trace(packet_trace)
+    if cache is not None:
+        with span("trace_cache.store"):
+            cache.store(cache_key, packet_trace, payload_bytes)
+    return packet_trace, payload_bytes
+
+
+@traced()
+def read_packet_trace(filename: str, use_cache: bool = True, **filter_kwargs):
+    # the decoded trace is cached before filtering, so filters can change
+    cache = TraceCache() if use_cache else None
+    cache_key = None
+    cached = None
+    if cache is not None:
+        with span("trace_cache.lookup") as lookup:
+            cache_key = file_digest(filename)
+            cached = cache.load(cache_key)
+            lookup.set(hit=cached is not None)
+
+    if cached is not None:
+        packet_trace, payload_bytes = cached
+    else:
+        packet_trace, payload_bytes = _decode_and_cache(filename, cache, cache_key)
+
+    packet_trace = filter_packet_trace(packet_trace, payload_bytes, **filter_kwargs)
 
     return packet_trace
 
 
+def open_packet_trace(filename: str) -> CachedTrace:
+    """Memory-mapped view of a trace for per-node and counter range queries
+
+    The trace is decoded and cached on first use. Queries return unfiltered
+    packets with their payload bytes, ready for filter_packet_trace.
+    """
+    cache = TraceCache()
+    cache_key = file_digest(filename)
+    cached_trace = cache.open(cache_key)
+    if cached_trace is None:
+        _decode_and_cache(filename, cache, cache_key)
+        cached_trace = cache.open(cache_key)
+    if cached_trace is None:
+        # only another process evicting the new entry right away gets here
+        raise RuntimeError(f"The cached trace of {filename} was evicted before use")
+    return cached_trace
+
+
+@traced()
 def extract_required_metrics_from_trace(
     gateway_df: pd.DataFrame, controller_df: pd.DataFrame
 ):
@@ -79,6 +258,253 @@ def extract_required_metrics_from_trace(
     return node_metrics_df
 
 
+HISTOGRAM_COLUMNS = ["snr_hist", "rssi_hist"]
+
+# How per-node partial stats combine, across chunks of one trace ("node") and
+# across the nodes of a group ("group")
+PACKET_STAT_AGGREGATIONS = {
+    "received_packets": ("sum", "sum"),
+    "total_packets": ("max", "sum"),
+    "snr_sum": ("sum", "sum"),
+    "snr_sq_sum": ("sum", "sum"),
+    "snr_min": ("min", "min"),
+    "snr_max": ("max", "max"),
+    "rssi_sum": ("sum", "sum"),
+    "rssi_sq_sum": ("sum", "sum"),
+    "rssi_min": ("min", "min"),
+    "rssi_max": ("max", "max"),
+    "counter_min": ("min", "min"),
+    "counter_max": ("max", "max"),
+}
+
+
+def _resolve_group_keys(dataframe: pd.DataFrame, group_keys):
+    # column names or Series aligned with the dataframe (SF group per node...)
+    if group_keys is None:
+        group_keys = ["NodeAddress"]
+    keys = []
+    for idx, key in enumerate(group_keys):
+        if isinstance(key, str):
+            key = dataframe[key]
+        elif key.name is None:
+            key = key.rename(f"group_{idx}")
+        keys.append(key)
+    return keys
+
+
+def aggregate_packet_stats(node_metrics_df: pd.DataFrame, group_keys=None):
+    """Per-node partial sums of received packets and SNR/RSSI in one grouped pass
+
+    The result is indexed by the group keys plus NodeAddress. Stats of several
+    chunks of a trace can be merged with combine_packet_stats.
+    """
+    keys = _resolve_group_keys(node_metrics_df, group_keys)
+    if "NodeAddress" not in [key.name for key in keys]:
+        keys.append(node_metrics_df["NodeAddress"])
+
+    snr = node_metrics_df["SNR"].to_numpy(dtype=np.float64)
+    rssi = node_metrics_df["RSSI"].to_numpy(dtype=np.float64)
+    packets = pd.DataFrame(
+        {
+            "SNR": snr,
+            "SNR_sq": snr * snr,
+            "RSSI": rssi,
+            "RSSI_sq": rssi * rssi,
+            "TransmittedPackets": node_metrics_df["TransmittedPackets"].to_numpy(),
+            "Counter": node_metrics_df["Counter"].to_numpy(),
+        },
+        index=node_metrics_df.index,
+    )
+    groups = packets.groupby(keys, sort=False)
+    packet_stats = groups.agg(
+        received_packets=("SNR", "size"),
+        total_packets=("TransmittedPackets", "first"),
+        snr_sum=("SNR", "sum"),
+        snr_sq_sum=("SNR_sq", "sum"),
+        snr_min=("SNR", "min"),
+        snr_max=("SNR", "max"),
+        rssi_sum=("RSSI", "sum"),
+        rssi_sq_sum=("RSSI_sq", "sum"),
+        rssi_min=("RSSI", "min"),
+        rssi_max=("RSSI", "max"),
+        counter_min=("Counter", "min"),
+        counter_max=("Counter", "max"),
+    )
+
+    # exact value histograms, they merge across chunks, nodes and runs
+    codes = groups.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    for metric, values in [("snr", snr), ("rssi", rssi)]:
+        histograms = grouped_histograms(values, codes, len(packet_stats))
+        packet_stats[f"{metric}_hist"] = list(histograms)
+    return packet_stats
+
+
+def _aggregate_stats(groups, how_idx: int):
+    aggregations = {
+        column: how[how_idx] for column, how in PACKET_STAT_AGGREGATIONS.items()
+    }
+    stats = groups.agg(aggregations)
+    for column in HISTOGRAM_COLUMNS:
+        stats[column] = groups[column].agg(sum_histograms)
+    return stats
+
+
+def combine_packet_stats(packet_stats_list):
+    packet_stats = pd.concat(packet_stats_list)
+    return _aggregate_stats(
+        packet_stats.groupby(level=list(packet_stats.index.names), sort=False), 0
+    )
+
+
+def finalize_grouped_metrics(
+    packet_stats: pd.DataFrame,
+    experiment_time_sec: float,
+    packet_airtime_sec: float,
+    packet_size_bytes: int,
+    offered_load_percent: float,
+    group_names=None,
+    node_offered_load_percent: dict = None,
+    group_time_sec: float = None,
+):
+    """Reception metrics per group from per-node stats
+
+    Groups of whole nodes (node, SF group) count the TransmittedPackets of
+    their nodes. Keys that split nodes across groups (gateway, time window)
+    count the counter range of each node's packets in a group instead, first
+    to last received. Every node is offered an equal share of
+    offered_load_percent in each of its groups, unless
+    node_offered_load_percent maps each NodeAddress to its own load.
+    Throughput is over group_time_sec, the time a group covers (e.g. the
+    window length), which defaults to experiment_time_sec.
+    """
+    if group_names is None:
+        group_names = ["NodeAddress"]
+    if group_time_sec is None:
+        group_time_sec = experiment_time_sec
+    node_addresses = packet_stats.index.get_level_values("NodeAddress")
+    # an empty trace has no groups, its results have no rows
+    num_nodes = max(node_addresses.nunique(), 1)
+
+    if node_addresses.duplicated().any():
+        packet_stats = packet_stats.assign(
+            total_packets=packet_stats["counter_max"] - packet_stats["counter_min"] + 1
+        )
+
+    groups = packet_stats.groupby(level=group_names, sort=False)
+    stats = _aggregate_stats(groups, 1)
+    stats["num_nodes"] = groups.size()
+
+    received_packets = stats["received_packets"]
+    total_packets = stats["total_packets"]
+    packet_bits = packet_size_bytes * 8
+    network_capacity = packet_bits / packet_airtime_sec
+    throughput = received_packets * packet_bits / group_time_sec
+    if node_offered_load_percent is None:
+        group_offered_load_percent = (
+            offered_load_percent / num_nodes * stats["num_nodes"]
+        )
+    else:
+        node_loads = pd.Series(
+            node_addresses.map(node_offered_load_percent), index=packet_stats.index
+        )
+        if node_loads.isna().any():
+            missing_nodes = sorted(set(node_addresses[node_loads.isna().to_numpy()]))
+            raise ValueError(f"No offered load for nodes {missing_nodes}")
+        group_offered_load_percent = node_loads.groupby(
+            level=group_names, sort=False
+        ).sum()
+
+    results = pd.DataFrame(index=stats.index)
+    results["total_packets"] = total_packets
+    results["missing_packets"] = total_packets - received_packets
+    results["packet_reception_ratio"] = received_packets / total_packets
+    results["offered_load_bps"] = network_capacity * group_offered_load_percent / 100
+    results["throughput_bps"] = throughput
+    results["network_capacity_bps"] = network_capacity
+    results["normalized_throughput"] = throughput / network_capacity
+    results["normalized_offered_load"] = group_offered_load_percent / 100
+    results["received_packets"] = received_packets
+    results["num_nodes"] = stats["num_nodes"]
+
+    for metric in ["snr", "rssi"]:
+        mean = stats[f"{metric}_sum"] / received_packets
+        variance = stats[f"{metric}_sq_sum"] / received_packets - mean * mean
+        results[f"{metric}_mean"] = mean
+        results[f"{metric}_std"] = np.sqrt(variance.clip(lower=0))
+        results[f"{metric}_min"] = stats[f"{metric}_min"]
+        results[f"{metric}_max"] = stats[f"{metric}_max"]
+        histograms = stats[f"{metric}_hist"]
+        quantile_columns = quantile_column_names(metric)
+        results[quantile_columns] = histogram_quantiles(
+            np.stack(histograms.to_list())
+            if len(histograms)
+            else np.zeros((0, HISTOGRAM_NUM_BINS), dtype=np.int64)
+        )
+        results[f"{metric}_hist"] = histograms
+
+    # groups without transmitted packets have no meaningful metrics
+    no_transmissions = total_packets == 0
+    if no_transmissions.any():
+        logger.warning(
+            f"No transmitted packets in groups: {list(stats.index[no_transmissions])}"
+        )
+        results = results[~no_transmissions]
+
+    return results
+
+
+def compute_grouped_metrics(
+    node_metrics_df: pd.DataFrame,
+    experiment_time_sec: float,
+    packet_airtime_sec: float,
+    packet_size_bytes: int,
+    offered_load_percent: float,
+    group_keys=None,
+    keep_values: bool = False,
+    node_offered_load_percent: dict = None,
+    group_time_sec: float = None,
+    **kwargs,
+):
+    """Reception metrics for every group of the trace in one grouped pass
+
+    group_keys are column names of node_metrics_df or named Series aligned with
+    it, e.g. an SF group per node, a gateway or a time window. Defaults to one
+    group per node. keep_values adds the per-packet SNR/RSSI lists.
+    node_offered_load_percent and group_time_sec are passed on to
+    finalize_grouped_metrics.
+    """
+    keys = _resolve_group_keys(node_metrics_df, group_keys)
+    group_names = [key.name for key in keys]
+
+    packet_stats = aggregate_packet_stats(node_metrics_df, keys)
+    results = finalize_grouped_metrics(
+        packet_stats,
+        experiment_time_sec,
+        packet_airtime_sec,
+        packet_size_bytes,
+        offered_load_percent,
+        group_names,
+        node_offered_load_percent,
+        group_time_sec,
+    )
+
+    if keep_values:
+        # one compact int8/int16 array per group instead of python lists
+        groups = node_metrics_df.groupby(keys, sort=False)
+        codes = groups.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        group_index = groups.size().index
+        for metric, column in [("snr", "SNR"), ("rssi", "RSSI")]:
+            values = group_value_arrays(
+                node_metrics_df[column].to_numpy(),
+                codes,
+                len(group_index),
+                VALUE_DTYPES[metric],
+            )
+            results[f"{metric}_values"] = pd.Series(values, index=group_index)
+
+    return results.reset_index()
+
+
 def compute_node_metrics(
     dataframe: pd.DataFrame,
     total_experiment_time: int,
@@ -94,74 +520,140 @@ def compute_node_metrics(
     elif not isinstance(desired_node_indices, list):
         desired_node_indices = [desired_node_indices]
 
-    # extracted metrics
-    dataframe = dataframe[
-        dataframe["NodeAddress"].isin(desired_node_indices)
-    ]  # desired node_indices must be a list
-    received_packets = dataframe.shape[0]
-    snr_values = dataframe["SNR"].tolist()
-    rssi_values = dataframe["RSSI"].tolist()
-    total_transmitted_packets = sum(dataframe["TransmittedPackets"].unique())
+    # desired node_indices are one group offered offered_load_percent in total
+    dataframe = dataframe[dataframe["NodeAddress"].isin(desired_node_indices)]
+    node_group = pd.Series(0, index=dataframe.index, name="node_group")
+    results = compute_grouped_metrics(
+        dataframe,
+        total_experiment_time,
+        packet_airtime_sec,
+        packet_size_bytes,
+        offered_load_percent,
+        group_keys=[node_group],
+        keep_values=True,
+    )
 
-    if total_transmitted_packets == 0:
+    if results.empty:
         print(f"No transmitted packets with node_indices: {desired_node_indices}")
         return {}
 
-    # computed metrics
-    missing_packets = total_transmitted_packets - received_packets
-    packet_reception_ratio = 1 - (missing_packets / total_transmitted_packets)
-    packet_bits = packet_size_bytes * 8
-    throughput = received_packets * packet_bits / total_experiment_time
-    network_capacity = packet_bits / packet_airtime_sec
-    normalized_throughput = throughput / network_capacity
-
-    offered_load_bps = network_capacity * offered_load_percent / 100
-    normalized_offered_load = offered_load_percent / 100
-
     node_metrics_dict = {}
     if len(desired_node_indices) == 1:
         node_metrics_dict["node_indices"] = desired_node_indices[0]
-    node_metrics_dict["total_packets"] = total_transmitted_packets
-    node_metrics_dict["missing_packets"] = missing_packets
-    node_metrics_dict["packet_reception_ratio"] = packet_reception_ratio
-    node_metrics_dict["offered_load_bps"] = offered_load_bps
-    node_metrics_dict["throughput_bps"] = throughput
-    node_metrics_dict["network_capacity_bps"] = network_capacity
-    node_metrics_dict["normalized_throughput"] = normalized_throughput
-    node_metrics_dict["normalized_offered_load"] = normalized_offered_load
-    node_metrics_dict["snr_values"] = snr_values
-    node_metrics_dict["rssi_values"] = rssi_values
+    node_metrics_dict.update(results.iloc[0].drop("node_group").to_dict())
     return node_metrics_dict
 
 
+def node_load_map(device_list, node_offered_load_percent):
+    """NodeAddress to offered load of a config's per-device loads, None without them"""
+    if node_offered_load_percent is None:
+        return None
+    if device_list is None or len(device_list) != len(node_offered_load_percent):
+        raise ValueError(
+            "node_offered_load_percent needs one load per device_list entry"
+        )
+    return dict(zip(device_list, node_offered_load_percent))
+
+
+@traced()
 def compute_experiment_results(
     node_metrics_df: pd.DataFrame,
     experiment_time_sec: float,
     packet_airtime_sec: float,
     packet_size_bytes: int,
     offered_load_percent: float,
+    group_keys=None,
+    device_list=None,
+    node_offered_load_percent=None,
     **kwargs,
 ):
-    desired_node_indices = node_metrics_df["NodeAddress"].unique()
-    num_nodes = len(desired_node_indices)
-    per_node_offered_load_percent = offered_load_percent / num_nodes
-
-    expt_results_df = pd.DataFrame()
-    for node_ind in desired_node_indices:
-        desired_node_metrics_dict = compute_node_metrics(
-            node_metrics_df,
-            experiment_time_sec,
-            packet_airtime_sec,
-            packet_size_bytes,
-            per_node_offered_load_percent,
-            node_ind,
-        )
-        expt_results_df = expt_results_df._append(
-            desired_node_metrics_dict, ignore_index=True
-        )
-
-    expt_results_df["snr_mean"] = expt_results_df["snr_values"].apply(
-        lambda x: np.mean(np.asarray(x, dtype=np.float32))
+    # configs with per-device loads give node_offered_load_percent in
+    # device_list order
+    expt_results_df = compute_grouped_metrics(
+        node_metrics_df,
+        experiment_time_sec,
+        packet_airtime_sec,
+        packet_size_bytes,
+        offered_load_percent,
+        group_keys=group_keys,
+        keep_values=True,
+        node_offered_load_percent=node_load_map(device_list, node_offered_load_percent),
     )
 
+    # one row per node keeps the historical column name
+    if group_keys is None:
+        expt_results_df = expt_results_df.rename(
+            columns={"NodeAddress": "node_indices"}
+        ).join(sequence_stats(node_metrics_df), on="node_indices")
+
     return expt_results_df
+
+
+@traced()
+def stream_experiment_results(
+    filename: str,
+    controller_df: pd.DataFrame,
+    experiment_time_sec: float,
+    packet_airtime_sec: float,
+    packet_size_bytes: int,
+    offered_load_percent: float,
+    chunk_size: int = 500000,
+    packet_filter: dict = None,
+    device_list=None,
+    node_offered_load_percent=None,
+    **kwargs,
+):
+    """Experiment results of a gateway trace read in fixed-size chunks
+
+    Each chunk is decoded, filtered and folded into the per-node stats, so
+    memory is bounded by chunk_size instead of the trace length. Matches
+    read_packet_trace + extract_required_metrics_from_trace +
+    compute_experiment_results, without the per-packet snr/rssi_values arrays
+    and the counter sequence columns.
+    """
+    if packet_filter is None:
+        packet_filter = {}
+
+    # an empty capture yields no chunks and gives the results of an empty trace
+    empty_trace, _ = decode_packet_trace(pd.DataFrame(columns=PACKET_TRACE_COLUMNS))
+    packet_stats = aggregate_packet_stats(
+        extract_required_metrics_from_trace(empty_trace, controller_df)
+    )
+    num_packets = 0
+    num_kept = 0
+    rejections = dict.fromkeys(PACKET_FILTERS, 0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", pd.errors.DtypeWarning)
+        with _read_raw_packet_trace(filename, chunksize=chunk_size) as reader:
+            for raw_chunk in reader:
+                packet_trace, payload_bytes = decode_packet_trace(raw_chunk)
+                keep, chunk_rejections = packet_filter_mask(
+                    packet_trace, payload_bytes, **packet_filter
+                )
+                num_packets += len(keep)
+                num_kept += int(np.count_nonzero(keep))
+                for filter_name, count in chunk_rejections.items():
+                    rejections[filter_name] += count
+
+                node_metrics_df = extract_required_metrics_from_trace(
+                    packet_trace[keep], controller_df
+                )
+                # fold into the running stats, they hold one row per node
+                packet_stats = combine_packet_stats(
+                    [packet_stats, aggregate_packet_stats(node_metrics_df)]
+                )
+
+    rejections_str = ", ".join(f"{name}: {count}" for name, count in rejections.items())
+    logger.info(
+        f"Packet filter kept {num_kept} of {num_packets} packets, rejected by {rejections_str}"
+    )
+
+    expt_results_df = finalize_grouped_metrics(
+        packet_stats,
+        experiment_time_sec,
+        packet_airtime_sec,
+        packet_size_bytes,
+        offered_load_percent,
+        node_offered_load_percent=node_load_map(device_list, node_offered_load_percent),
+    )
+    return expt_results_df.reset_index().rename(columns={"NodeAddress": "node_indices"})
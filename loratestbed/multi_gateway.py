@@ -0,0 +1,350 @@
+import argparse
+import collections
+import logging
+import selectors
+import signal
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import serial
+
+from loratestbed.gateway_parser import (
+    GatewayLineParser,
+    ParsedLines,
+    parse_gateway_buffer,
+)
+
+logger = logging.getLogger(__name__)
+
+# Merged output keeps the gateway_reference.ino line format, so the file can be
+# read with metrics.read_packet_trace like a single gateway capture
+GATEWAY_STAT_FIELDS = [
+    "received",
+    "crc_errors",
+    "malformed",
+    "heard",
+    "unique",
+    "selected",
+    "late_duplicates",
+]
+
+
+class GatewayPacket(NamedTuple):
+    timestamp: float
+    gateway: str
+    payload: bytes
+    rssi: int
+    snr: int
+    crc_status: int
+    node_address: int
+    counter: int
+
+
+def packets_from_parsed(parsed: ParsedLines, gateway: str = "", timestamp: float = 0.0):
+    return [
+        GatewayPacket(timestamp, gateway, payload[:length].tobytes(), *fields)
+        for payload, length, *fields in zip(
+            parsed.payload,
+            parsed.payload_length.tolist(),
+            parsed.rssi.tolist(),
+            parsed.snr.tolist(),
+            parsed.crc_status.tolist(),
+            parsed.node_address.tolist(),
+            parsed.counter.tolist(),
+        )
+    ]
+
+
+def parse_gateway_line(line: bytes, gateway: str = "", timestamp: float = 0.0):
+    # Line format: <payload hex>, <rssi>, <snr>, <crc error>
+    packets = packets_from_parsed(
+        parse_gateway_buffer(line + b"\n"), gateway, timestamp
+    )
+    return packets[0] if packets else None
+
+
+def format_gateway_line(packet: GatewayPacket) -> str:
+    return f"{packet.payload.hex().upper()}, {packet.rssi}, {packet.snr}, {packet.crc_status}\n"
+
+
+def format_tagged_line(packet: GatewayPacket) -> str:
+    return f"{packet.timestamp:.6f}, {packet.gateway}, {format_gateway_line(packet)}"
+
+
+class PacketMerger:
+    """Merge packets heard by several gateways into one deduplicated stream
+
+    Receptions are keyed on (NodeAddress, Counter). A key is held for
+    hold_time_sec after its first reception, then the best copy (CRC ok first,
+    then highest SNR, then highest RSSI) is released.
+
+    The key of a CRC-failed reception may be corrupted, so it only counts as a
+    reception of that key once a CRC ok copy confirms it. A CRC-failed copy is
+    released only if no gateway received the key intact, and then neither
+    marks the key as released nor counts as heard.
+    """
+
+    def __init__(self, hold_time_sec: float = 0.5, max_released_keys: int = 65536):
+        self._hold_time_sec = hold_time_sec
+        self._max_released_keys = max_released_keys
+        # key -> [first seen time, best packet, gateways that heard it with CRC ok]
+        self._pending: Dict[Tuple[int, int], list] = {}
+        self._released_keys = collections.OrderedDict()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def _rank(packet: GatewayPacket):
+        return (packet.crc_status == 0, packet.snr, packet.rssi)
+
+    def _gateway_stats(self, gateway: str) -> Dict[str, int]:
+        if gateway not in self._stats:
+            self._stats[gateway] = {field: 0 for field in GATEWAY_STAT_FIELDS}
+        return self._stats[gateway]
+
+    def add_malformed(self, gateway: str, count: int = 1):
+        self._gateway_stats(gateway)["malformed"] += count
+
+    def add(self, packet: GatewayPacket):
+        stats = self._gateway_stats(packet.gateway)
+        stats["received"] += 1
+        if packet.crc_status != 0:
+            stats["crc_errors"] += 1
+
+        key = (packet.node_address, packet.counter)
+        if key in self._released_keys:
+            stats["late_duplicates"] += 1
+            return
+
+        gateways = {packet.gateway} if packet.crc_status == 0 else set()
+        entry = self._pending.get(key)
+        if entry is None:
+            self._pending[key] = [packet.timestamp, packet, gateways]
+            return
+
+        entry[2].update(gateways)
+        if self._rank(packet) > self._rank(entry[1]):
+            entry[1] = packet
+
+    def _release(self, key) -> Tuple[GatewayPacket, int]:
+        # the number of gateways is 0 for a packet no gateway received intact
+        _, best_packet, gateways = self._pending.pop(key)
+        self._gateway_stats(best_packet.gateway)["selected"] += 1
+        if not gateways:
+            return best_packet, 0
+
+        for gateway in gateways:
+            stats = self._gateway_stats(gateway)
+            stats["heard"] += 1
+            if len(gateways) == 1:
+                stats["unique"] += 1
+
+        self._released_keys[key] = None
+        if len(self._released_keys) > self._max_released_keys:
+            self._released_keys.popitem(last=False)
+
+        return best_packet, len(gateways)
+
+    def pop_ready(self, now: Optional[float] = None) -> List[Tuple[GatewayPacket, int]]:
+        if now is None:
+            now = time.time()
+        # dicts keep insertion order, so pending keys are ordered by first reception
+        ready_keys = []
+        for key, entry in self._pending.items():
+            if now - entry[0] < self._hold_time_sec:
+                break
+            ready_keys.append(key)
+        return [self._release(key) for key in ready_keys]
+
+    def flush(self) -> List[Tuple[GatewayPacket, int]]:
+        return [self._release(key) for key in list(self._pending)]
+
+    def gateway_stats(self) -> Dict[str, Dict[str, int]]:
+        return {gateway: dict(stats) for gateway, stats in self._stats.items()}
+
+
+class MultiGatewayReader:
+    """Read any number of gateway serial ports from a single selector loop"""
+
+    def __init__(self, ports: List[str], baudrate=2000000, hold_time_sec=0.5):
+        self._selector = selectors.DefaultSelector()
+        self._ports = []
+        for port in ports:
+            ser = serial.Serial(port, baudrate, timeout=0)
+            self._ports.append(ser)
+            self._selector.register(ser.fileno(), selectors.EVENT_READ, (port, ser))
+        self._parsers = {port: GatewayLineParser() for port in ports}
+
+        self.merger = PacketMerger(hold_time_sec)
+        self.output = sys.stdout
+        self.file = None
+        self.tagged_file = None
+
+    def set_output_to_console(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+        self.output = sys.stdout
+
+    def set_output_to_file(self, filename):
+        if self.file:
+            self.file.close()
+        self.file = open(filename, "w", encoding="utf-8")
+        self.output = self.file
+
+    def set_tagged_output_to_file(self, filename):
+        # Every reception (before deduplication) with its timestamp and gateway
+        if self.tagged_file:
+            self.tagged_file.close()
+        self.tagged_file = open(filename, "w", encoding="utf-8")
+
+    def _read_port(self, port: str, ser: serial.Serial, now: float):
+        data = ser.read(ser.in_waiting or 1)
+        if not data:
+            return
+
+        # lines split across reads are completed by the per-port parser
+        parsed = self._parsers[port].feed(data)
+        self.merger.add_malformed(port, parsed.num_malformed)
+        for packet in packets_from_parsed(parsed, port, now):
+            self.merger.add(packet)
+            if self.tagged_file:
+                self.tagged_file.write(format_tagged_line(packet))
+
+    def _write_merged(self, released):
+        for packet, _ in released:
+            self.output.write(format_gateway_line(packet))
+        if released:
+            self.output.flush()
+            if self.tagged_file:
+                self.tagged_file.flush()
+
+    def read_serial(self, timeout=None):
+        start_time = time.time()
+        print(f"Reading from {len(self._ports)} gateway serial monitors")
+        try:
+            while True:
+                for key, _ in self._selector.select(timeout=0.1):
+                    port, ser = key.data
+                    self._read_port(port, ser, time.time())
+                self._write_merged(self.merger.pop_ready())
+
+                if timeout is not None and time.time() - start_time > timeout:
+                    print("Exiting... (timeout)")
+                    break
+        except KeyboardInterrupt:
+            print("Exiting... (keyboard interrupt)")
+        finally:
+            self._write_merged(self.merger.flush())
+            self.close()
+
+    def close(self):
+        for ser in self._ports:
+            if ser.is_open:
+                self._selector.unregister(ser.fileno())
+                ser.close()
+        if self.file:
+            self.file.close()
+            self.file = None
+        if self.tagged_file:
+            self.tagged_file.close()
+            self.tagged_file = None
+
+
+def log_gateway_stats(gateway_stats: Dict[str, Dict[str, int]]):
+    for gateway, stats in gateway_stats.items():
+        stats_str = ", ".join(
+            f"{field}: {stats[field]}" for field in GATEWAY_STAT_FIELDS
+        )
+        logger.info(f"Gateway {gateway}: {stats_str}")
+
+
+def _exit_on_sigterm(signum, frame):
+    # run_testbed stops the gateway process with terminate(), turn that into a
+    # clean exit so pending packets get flushed to the output file
+    raise KeyboardInterrupt
+
+
+def run_multi_gateway(
+    baudrate=2000000,
+    ports=None,
+    filename=None,
+    timeout=None,
+    tagged_filename=None,
+    hold_time_sec=0.5,
+):
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    reader = MultiGatewayReader(ports, baudrate, hold_time_sec)
+
+    if filename:
+        reader.set_output_to_file(filename)
+        print(f"Merged output is written in file: {filename}")
+    else:
+        reader.set_output_to_console()
+        print(f"Merged output is written to console")
+
+    if tagged_filename:
+        reader.set_tagged_output_to_file(tagged_filename)
+        print(f"Per-gateway receptions are written in file: {tagged_filename}")
+
+    reader.read_serial(timeout)
+    log_gateway_stats(reader.merger.gateway_stats())
+    return reader.merger.gateway_stats()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="[%(asctime)s] [%(levelname)s] %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(
+        description="Read several gateway serial interfaces and write a merged, deduplicated trace."
+    )
+    parser.add_argument(
+        "-b",
+        "--baudrate",
+        type=int,
+        default=2000000,
+        help="Baud rate for the serial interfaces. Default is 2000000.",
+    )
+    parser.add_argument(
+        "-p",
+        "--ports",
+        required=True,
+        nargs="+",
+        help="Ports for the gateway serial interfaces, e.g., /dev/ttyACM0 /dev/ttyACM2.",
+    )
+    parser.add_argument(
+        "-f",
+        "--filename",
+        type=str,
+        help="Filename for the merged trace. If not provided, data is written to stdout.",
+    )
+    parser.add_argument(
+        "--tagged_filename",
+        type=str,
+        help="Filename for every reception tagged with timestamp and gateway.",
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        type=float,
+        help="Timeout(in sec) to stop reading from serial monitors, e.g: 60 sec",
+    )
+    parser.add_argument(
+        "--hold_time",
+        type=float,
+        default=0.5,
+        help="Seconds to wait for duplicates from other gateways. Default is 0.5.",
+    )
+
+    args = parser.parse_args()
+    run_multi_gateway(
+        args.baudrate,
+        args.ports,
+        args.filename,
+        args.timeout,
+        args.tagged_filename,
+        args.hold_time,
+    )
@@ -0,0 +1,368 @@
+import argparse
+import errno
+import logging
+import os
+import select
+import threading
+import time
+import tty
+from typing import NamedTuple, Optional
+
+import numpy as np
+import yaml
+
+from loratestbed.main_gateway import SerialReader
+from loratestbed.tracing import span, tracing_to
+
+logger = logging.getLogger(__name__)
+
+# bytes per write at max speed, the reader gets them in reads of up to this size
+REPLAY_CHUNK_BYTES = 4096
+
+
+class Capture(NamedTuple):
+    # gateway serial output in the gateway_reference.ino line format
+    data: bytes
+    # end offset of every line in data
+    line_ends: np.ndarray
+    # reception time of every line, only tagged captures have them
+    timestamps: Optional[np.ndarray]
+
+
+def _line_ends(data: bytes) -> np.ndarray:
+    line_ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord("\n")) + 1
+    if data and (len(line_ends) == 0 or line_ends[-1] != len(data)):
+        # the capture ended in the middle of a line
+        line_ends = np.append(line_ends, len(data))
+    return line_ends
+
+
+def _is_tagged(line: bytes) -> bool:
+    # "<timestamp>, <gateway>, <payload hex>, <rssi>, <snr>, <crc error>"
+    fields = line.split(b",")
+    if len(fields) != 6:
+        return False
+    try:
+        float(fields[0])
+    except ValueError:
+        return False
+    return True
+
+
+def load_capture(
+    filename: str,
+    gateway: str = None,
+    skip_lines: int = 0,
+    max_lines: int = None,
+) -> Capture:
+    """Reads a capture as the bytes a gateway port would deliver
+
+    Plain captures (gateway-*.csv) are the raw serial output and are kept as
+    they are, including banner and malformed lines. Tagged captures
+    (multi_gateway.py --tagged_filename) lose their timestamp and gateway
+    columns, which give the line timestamps; gateway keeps the receptions of
+    one gateway. skip_lines and max_lines select a segment of the capture.
+    """
+    with open(filename, "rb") as f:
+        data = f.read()
+    line_ends = _line_ends(data)
+
+    timestamps = None
+    if len(line_ends) and _is_tagged(data[: line_ends[0]]):
+        lines = []
+        timestamps = []
+        line_starts = np.concatenate(([0], line_ends[:-1]))
+        for start, end in zip(line_starts.tolist(), line_ends.tolist()):
+            timestamp, line_gateway, line = data[start:end].split(b",", 2)
+            if gateway is not None and line_gateway.strip().decode() != gateway:
+                continue
+            timestamps.append(float(timestamp))
+            lines.append(line.lstrip())
+        data = b"".join(lines)
+        line_ends = np.cumsum([len(line) for line in lines], dtype=np.int64)
+        timestamps = np.array(timestamps)
+    elif gateway is not None:
+        raise ValueError(f"{filename} is not a tagged capture, it has one gateway")
+
+    stop = len(line_ends)
+    if max_lines is not None:
+        stop = min(skip_lines + max_lines, stop)
+    stop = max(stop, skip_lines)
+    begin = int(line_ends[skip_lines - 1]) if 0 < skip_lines <= len(line_ends) else 0
+    end = int(line_ends[stop - 1]) if stop > skip_lines else begin
+    return Capture(
+        data[begin:end],
+        line_ends[skip_lines:stop] - begin,
+        None if timestamps is None else timestamps[skip_lines:stop],
+    )
+
+
+def replay_schedule(
+    capture: Capture, speed: float = 1.0, duration_sec: float = None
+) -> Optional[np.ndarray]:
+    """Seconds after the start at which each line is written, None for max speed
+
+    Tagged captures keep the original spacing of their lines. Plain captures
+    have no timestamps, their lines are spread evenly over duration_sec (e.g.
+    the experiment time of the run). speed scales the timing, 2.0 replays
+    twice as fast and None as fast as the reader takes the bytes.
+    """
+    if speed is None:
+        return None
+    num_lines = len(capture.line_ends)
+    if capture.timestamps is not None:
+        if num_lines == 0:
+            return np.zeros(0)
+        # receptions of several gateways may interleave slightly out of order
+        offsets = np.maximum.accumulate(capture.timestamps) - capture.timestamps[0]
+    elif duration_sec is not None:
+        offsets = np.arange(num_lines) * (duration_sec / max(num_lines, 1))
+    else:
+        raise ValueError(
+            "The capture has no timestamps, give its duration or replay at max speed"
+        )
+    return offsets / speed
+
+
+class PtyReplaySource:
+    """Pseudo terminal that plays a capture like a gateway port
+
+    Readers open slave_name like a serial port, as with
+    synthetic.PtyTrafficSource. On a schedule, writes are non-blocking and the
+    bytes the reader has no room for are dropped and counted, like a gateway
+    whose serial output stalls. At max speed writes wait for the reader, so
+    nothing is dropped and the reader sets the pace.
+    """
+
+    def __init__(self, capture: Capture):
+        self._capture = capture
+        self._master_fd, self._slave_fd = os.openpty()
+        tty.setraw(self._slave_fd)
+        os.set_blocking(self._master_fd, False)
+        self.slave_name = os.ttyname(self._slave_fd)
+        self.num_bytes_written = 0
+        self.num_bytes_dropped = 0
+        # how late the source wrote a line, above a few ms the source itself lags
+        self.max_lag_sec = 0.0
+
+    def _write(self, data: bytes, block: bool):
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(self._master_fd, view)
+            except OSError as exception:
+                if exception.errno != errno.EAGAIN:
+                    raise
+                if not block:
+                    self.num_bytes_dropped += len(view)
+                    return
+                select.select([], [self._master_fd], [])
+                continue
+            self.num_bytes_written += written
+            view = view[written:]
+
+    def run(
+        self, release_sec: np.ndarray = None, chunk_bytes: int = REPLAY_CHUNK_BYTES
+    ):
+        """Writes the capture, each line at its release_sec or all at max speed"""
+        data = self._capture.data
+        if release_sec is None:
+            for start in range(0, len(data), chunk_bytes):
+                self._write(data[start : start + chunk_bytes], block=True)
+            return
+
+        line_ends = self._capture.line_ends
+        start_time = time.monotonic()
+        num_sent = 0
+        while num_sent < len(line_ends):
+            elapsed = time.monotonic() - start_time
+            num_due = int(np.searchsorted(release_sec, elapsed, side="right"))
+            if num_due > num_sent:
+                begin = int(line_ends[num_sent - 1]) if num_sent else 0
+                self._write(data[begin : int(line_ends[num_due - 1])], block=False)
+                lag_sec = elapsed - release_sec[num_sent]
+                self.max_lag_sec = max(self.max_lag_sec, lag_sec)
+                num_sent = num_due
+            else:
+                time.sleep(release_sec[num_sent] - elapsed)
+
+    def close(self):
+        os.close(self._master_fd)
+        os.close(self._slave_fd)
+
+
+def replay_capture(
+    capture: Capture,
+    release_sec: np.ndarray = None,
+    filename: str = None,
+    baudrate: int = 2000000,
+) -> dict:
+    """Plays a capture through a SerialReader, returns the replay statistics
+
+    The reader opens the pty of a PtyReplaySource like a gateway port and
+    writes filename as main_gateway.py would, with its live packet counts.
+    The replay ends when the reader has read every byte that was written.
+    """
+    source = PtyReplaySource(capture)
+    reader = SerialReader(source.slave_name, baudrate)
+    if filename:
+        reader.set_output_to_file(filename)
+    else:
+        reader.set_output_to_console()
+    writer = threading.Thread(
+        target=source.run, args=(release_sec,), name="replay-source", daemon=True
+    )
+
+    start_time = time.monotonic()
+    source_end_time = None
+    with span("replay.capture", num_lines=len(capture.line_ends)):
+        writer.start()
+        while True:
+            if source_end_time is None and not writer.is_alive():
+                source_end_time = time.monotonic()
+                backlog_bytes = source.num_bytes_written - reader.num_bytes
+            if source_end_time is not None and (
+                reader.num_bytes >= source.num_bytes_written
+            ):
+                break
+            data = reader.read_once()
+            if source_end_time is not None and not data:
+                # a read timed out after the source finished, nothing is coming
+                break
+    end_time = time.monotonic()
+    writer.join()
+
+    stats = {
+        "num_lines": len(capture.line_ends),
+        "num_bytes_written": source.num_bytes_written,
+        "num_bytes_dropped": source.num_bytes_dropped,
+        "num_bytes_read": reader.num_bytes,
+        "num_packets": reader.num_packets,
+        "num_crc_errors": reader.num_crc_errors,
+        "num_malformed": reader.num_malformed,
+        "replay_sec": end_time - start_time,
+        "scheduled_sec": (
+            float(release_sec[-1])
+            if release_sec is not None and len(release_sec)
+            else 0.0
+        ),
+        "max_source_lag_sec": source.max_lag_sec,
+        # bytes the reader still had to read when the source finished
+        "backlog_bytes": backlog_bytes,
+        "drain_sec": end_time - source_end_time,
+    }
+    reader.close()
+    source.close()
+    return stats
+
+
+def archived_run_files(capture_filename: str):
+    """Config and controller results saved with an archived gateway-<time>.csv
+
+    Returns their filenames, None for files that do not exist.
+    """
+    folder, name = os.path.split(capture_filename)
+    if not (name.startswith("gateway-") and name.endswith(".csv")):
+        return None, None
+    run_time = name[len("gateway-") : -len(".csv")]
+    config_filename = os.path.join(folder, f"config-{run_time}.yaml")
+    controller_filename = os.path.join(folder, f"controller-{run_time}.csv")
+    return (
+        config_filename if os.path.exists(config_filename) else None,
+        controller_filename if os.path.exists(controller_filename) else None,
+    )
+
+
+def make_parser():
+    ap = argparse.ArgumentParser(
+        description="Replay an archived gateway capture through the gateway reader."
+    )
+    ap.add_argument(
+        "-i",
+        "--capture",
+        required=True,
+        help="Archived capture, a gateway-*.csv or a tagged multi gateway capture",
+    )
+    ap.add_argument(
+        "-f",
+        "--filename",
+        help="Filename for the reader output. If not provided, it is written to stdout.",
+    )
+    ap.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Replay speed relative to the capture, 2 replays twice as fast",
+    )
+    ap.add_argument(
+        "--max_speed",
+        action="store_true",
+        help="Replay as fast as the reader takes the bytes",
+    )
+    ap.add_argument(
+        "--duration_sec",
+        type=float,
+        help="Duration to spread a capture without timestamps over. "
+        "Defaults to the experiment time of the archived run.",
+    )
+    ap.add_argument("--gateway", help="Only replay this gateway of a tagged capture")
+    ap.add_argument("--skip_lines", type=int, default=0, help="Capture lines to skip")
+    ap.add_argument("--max_lines", type=int, help="Capture lines to replay")
+    ap.add_argument(
+        "--analyze",
+        action="store_true",
+        help="Analyze the reader output with the config and controller results "
+        "archived with the capture",
+    )
+    ap.add_argument("--trace", help="Write a Chrome trace of the replay to this file")
+    return ap
+
+
+def main():
+    logging.basicConfig(
+        format="[%(asctime)s] [%(levelname)s] %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = make_parser()
+    args = parser.parse_args()
+
+    config_filename, controller_filename = archived_run_files(args.capture)
+    if args.analyze and (args.filename is None or controller_filename is None):
+        parser.error(
+            "--analyze needs --filename and a gateway-<time>.csv archived "
+            "with its config and controller results"
+        )
+    config = None
+    if config_filename is not None:
+        with open(config_filename, "r") as f:
+            config = yaml.safe_load(f)
+
+    capture = load_capture(args.capture, args.gateway, args.skip_lines, args.max_lines)
+    duration_sec = args.duration_sec
+    if duration_sec is None and config is not None:
+        duration_sec = config["experiment_time_sec"]
+    release_sec = replay_schedule(
+        capture, None if args.max_speed else args.speed, duration_sec
+    )
+
+    with tracing_to(args.trace):
+        stats = replay_capture(capture, release_sec, args.filename)
+        logger.info(
+            f"Replayed {stats['num_lines']} lines in {stats['replay_sec']:.2f} s "
+            f"({stats['num_lines'] / max(stats['replay_sec'], 1e-9):.0f} lines/s), "
+            f"{stats['num_bytes_dropped']} bytes dropped, "
+            f"reader {stats['backlog_bytes']} bytes behind at the end"
+        )
+        if args.analyze:
+            import pandas as pd
+
+            from loratestbed.run_testbed import analyze_run
+
+            result_df = pd.read_csv(controller_filename)
+            # logs the network statistics and per-node results like run_testbed
+            analyze_run(args.filename, result_df, config)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from loratestbed.experiment_logbook import LOGBOOK_TIME_FORMAT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARTITIONS = ("date", "mac_protocol")
+FRAGMENT_PREFIX = "run-"
+
+
+def flatten_config(config: dict, prefix: str = "") -> dict:
+    """Scalar config fields, nested fields joined with a dot (packet_filter.check_crc)"""
+    fields = {}
+    for field, value in config.items():
+        if isinstance(value, dict):
+            fields.update(flatten_config(value, f"{prefix}{field}."))
+        elif isinstance(value, (str, int, float, bool)):
+            fields[f"{prefix}{field}"] = value
+    return fields
+
+
+def _column_arrays(name: str, values: pd.Series) -> dict:
+    # .npy files of one column: scalars as they are, equal length arrays (the
+    # histograms) as a matrix, ragged arrays (per-packet values) flat with offsets
+    if values.dtype != object:
+        return {name: values.to_numpy()}
+    first = values.iloc[0]
+    if isinstance(first, str):
+        return {name: values.to_numpy(dtype=str)}
+    if not isinstance(first, (np.ndarray, list)):
+        return {}
+    arrays = [np.asarray(value) for value in values]
+    if len({len(array) for array in arrays}) == 1:
+        return {name: np.stack(arrays)}
+    offsets = np.cumsum([0] + [len(array) for array in arrays])
+    return {name: np.concatenate(arrays), f"{name}.offsets": offsets}
+
+
+class ResultsFragment:
+    """Per-node results of one run, a directory with one .npy file per column"""
+
+    def __init__(self, path: str, partition_values: dict):
+        self.path = path
+        self.partition_values = partition_values
+        with open(os.path.join(path, "columns.txt")) as f:
+            self.columns = f.read().split()
+        self.num_rows = int(np.load(os.path.join(path, "num_rows.npy")))
+
+    def column(self, name: str, rows=None):
+        if name in self.partition_values:
+            num_rows = self.num_rows if rows is None else int(rows.sum())
+            return np.full(num_rows, self.partition_values[name], dtype=object)
+        values = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        offsets_filename = os.path.join(self.path, f"{name}.offsets.npy")
+        if os.path.exists(offsets_filename):
+            offsets = np.load(offsets_filename)
+            indices = np.arange(self.num_rows) if rows is None else np.flatnonzero(rows)
+            arrays = np.empty(len(indices), dtype=object)
+            arrays[:] = [
+                np.asarray(values[offsets[row] : offsets[row + 1]]) for row in indices
+            ]
+            return arrays
+        values = np.asarray(values if rows is None else values[rows])
+        if values.ndim == 2:
+            arrays = np.empty(len(values), dtype=object)
+            arrays[:] = list(values)
+            return arrays
+        return values
+
+    def has_column(self, name: str) -> bool:
+        return name in self.partition_values or name in self.columns
+
+
+class ResultsStore:
+    """Per-node results of every run in one dataset, partitioned by directory
+
+    Runs are stored under <dataset_dir>/date=2024-01-01/mac_protocol=csma/
+    run-<timestamp>/ (by default), one .npy file per column with the result
+    columns, the flattened config fields and the run summary. A query only
+    opens the partitions that can match its filters and only loads the
+    columns it filters on or returns.
+    """
+
+    def __init__(self, dataset_dir: str, partition_by=DEFAULT_PARTITIONS):
+        self.dataset_dir = dataset_dir
+        self.partition_by = tuple(partition_by)
+
+    def _partition_values(self, row: dict) -> dict:
+        return {field: str(row.get(field, "unknown")) for field in self.partition_by}
+
+    def append_run(
+        self,
+        expt_results_df: pd.DataFrame,
+        config: dict,
+        timestamp: str,
+        expt_name: str = "",
+    ) -> str:
+        """Adds the results of one run, returns the fragment path"""
+        table = pd.DataFrame(
+            {"timestamp": timestamp, "expt_name": expt_name},
+            index=expt_results_df.index,
+        )
+        run_fields = flatten_config(config)
+        # run summary, repeated on every node row of the run
+        run_fields.update(
+            {
+                "date": datetime.strptime(timestamp, LOGBOOK_TIME_FORMAT).strftime(
+                    "%Y-%m-%d"
+                ),
+                "total_offered_load": expt_results_df.normalized_offered_load.sum(),
+                "total_normalized_throughput": expt_results_df.normalized_throughput.sum(),
+                "mean_packet_reception_ratio": expt_results_df.packet_reception_ratio.mean(),
+            }
+        )
+        partition_values = self._partition_values(run_fields)
+        for field, value in run_fields.items():
+            # result columns win over config fields of the same name
+            if field not in expt_results_df and field not in partition_values:
+                table[field] = value
+        table = pd.concat([table, expt_results_df], axis=1)
+
+        arrays = {}
+        for name in table:
+            arrays.update(_column_arrays(name, table[name]))
+        columns = [name for name in table if name in arrays]
+
+        partition_dir = os.path.join(
+            self.dataset_dir,
+            *(f"{field}={value}" for field, value in partition_values.items()),
+        )
+        os.makedirs(partition_dir, exist_ok=True)
+        fragment_path = os.path.join(partition_dir, f"{FRAGMENT_PREFIX}{timestamp}")
+        # write then rename, readers never see a partial run
+        tmp_path = tempfile.mkdtemp(dir=partition_dir, prefix=".tmp-")
+        try:
+            for name, values in arrays.items():
+                np.save(os.path.join(tmp_path, f"{name}.npy"), values)
+            np.save(os.path.join(tmp_path, "num_rows.npy"), len(table))
+            with open(os.path.join(tmp_path, "columns.txt"), "w") as f:
+                f.write("\n".join(columns))
+            os.rename(tmp_path, fragment_path)
+        except OSError:
+            if not os.path.isdir(fragment_path):
+                raise
+            logger.warning(f"Results of {timestamp} are already in {fragment_path}")
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return fragment_path
+
+    def _partition_dirs(self, partition_filters: dict):
+        # directories of the partitions that match, with their values
+        partitions = [(self.dataset_dir, {})]
+        for field in self.partition_by:
+            matching = []
+            for path, values in partitions:
+                if not os.path.isdir(path):
+                    continue
+                for name in os.listdir(path):
+                    key, _, value = name.partition("=")
+                    if key != field:
+                        continue
+                    if field in partition_filters and not partition_filters[field](
+                        value
+                    ):
+                        continue
+                    matching.append(
+                        (os.path.join(path, name), dict(values, **{key: value}))
+                    )
+            partitions = matching
+        return partitions
+
+    def fragments(self, filters: dict = None, start=None, end=None):
+        """Runs that can match the filters, in time order"""
+        partition_filters = {
+            field: _partition_matcher(value)
+            for field, value in (filters or {}).items()
+            if field in self.partition_by
+        }
+        if start is not None or end is not None:
+            partition_filters["date"] = _date_matcher(
+                partition_filters.get("date"), start, end
+            )
+
+        fragments = []
+        for path, values in self._partition_dirs(partition_filters):
+            for name in os.listdir(path):
+                if not name.startswith(FRAGMENT_PREFIX):
+                    continue
+                timestamp = name[len(FRAGMENT_PREFIX) :]
+                run_time = datetime.strptime(timestamp, LOGBOOK_TIME_FORMAT)
+                if (start is not None and run_time < start) or (
+                    end is not None and run_time > end
+                ):
+                    continue
+                fragments.append(ResultsFragment(os.path.join(path, name), values))
+        return sorted(fragments, key=lambda fragment: os.path.basename(fragment.path))
+
+    def read(
+        self, columns=None, filters: dict = None, start=None, end=None
+    ) -> pd.DataFrame:
+        """Rows of the runs and nodes matching the filters
+
+        filters maps a column (result, config field or partition) to the
+        required value or to a list of accepted values, start and end limit
+        the run time (inclusive). columns=None returns every column.
+        """
+        filters = {
+            field: list(value) if isinstance(value, (list, tuple, set)) else [value]
+            for field, value in (filters or {}).items()
+        }
+        tables = []
+        for fragment in self.fragments(filters, start, end):
+            if not all(fragment.has_column(field) for field in filters):
+                continue
+            rows = np.ones(fragment.num_rows, dtype=bool)
+            for field, values in filters.items():
+                if field in fragment.partition_values:
+                    continue
+                rows &= np.isin(fragment.column(field), values)
+            if not rows.any():
+                continue
+
+            names = fragment.columns + list(fragment.partition_values)
+            if columns is not None:
+                names = [name for name in columns if fragment.has_column(name)]
+            tables.append(
+                pd.DataFrame({name: fragment.column(name, rows) for name in names})
+            )
+
+        if not tables:
+            return pd.DataFrame(columns=columns)
+        table = pd.concat(tables, ignore_index=True)
+        if columns is not None:
+            table = table.reindex(columns=columns)
+        return table
+
+
+def _partition_matcher(values):
+    accepted = {
+        str(value)
+        for value in (values if isinstance(values, (list, tuple, set)) else [values])
+    }
+    return lambda value: value in accepted
+
+
+def _date_matcher(matcher, start, end):
+    def matches(value):
+        date = datetime.strptime(value, "%Y-%m-%d").date()
+        if start is not None and date < start.date():
+            return False
+        if end is not None and date > end.date():
+            return False
+        return matcher is None or matcher(value)
+
+    return matches
+
+
+def import_logbook(store: ResultsStore, logbook_file: str, **selection) -> int:
+    """Adds the archived runs of a logbook, returns the number of runs added
+
+    selection takes the select_logbook_entries filters (name, start, ...).
+    """
+    # batch_analysis pulls in the trace analysis, queries do not need it
+    from loratestbed.batch_analysis import load_entry_config, select_logbook_entries
+
+    num_runs = 0
+    for entry in select_logbook_entries(logbook_file, **selection):
+        try:
+            expt_results_df = pd.read_pickle(entry["controller_filename"])
+            config = load_entry_config(entry)
+        except OSError as exception_message:
+            logger.error(f"Skipping {entry['timestamp']}: {exception_message}")
+            continue
+        store.append_run(
+            expt_results_df, config, entry["timestamp"], str(entry["expt_name"])
+        )
+        num_runs += 1
+    return num_runs
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="[%(asctime)s] [%(levelname)s] %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(
+        description="Query the results dataset, or add archived runs to it."
+    )
+    parser.add_argument(
+        "-d",
+        "--dataset",
+        default="./results/dataset",
+        help="Dataset directory. Default is ./results/dataset.",
+    )
+    parser.add_argument(
+        "--import_logbook", help="Add the runs of this logbook to the dataset first"
+    )
+    parser.add_argument(
+        "-c",
+        "--filter",
+        nargs="*",
+        default=[],
+        help="Column values rows must have, e.g. mac_protocol=csma transmit_SF=SF8",
+    )
+    parser.add_argument("--columns", nargs="*", help="Columns to read. Default is all.")
+    parser.add_argument(
+        "--start",
+        type=lambda value: datetime.strptime(value, LOGBOOK_TIME_FORMAT),
+        help="First run time, e.g. 20240101-000000",
+    )
+    parser.add_argument(
+        "--end",
+        type=lambda value: datetime.strptime(value, LOGBOOK_TIME_FORMAT),
+        help="Last run time, e.g. 20240131-235959",
+    )
+    parser.add_argument("-o", "--output", help="Output table, .csv or .pkl")
+
+    args = parser.parse_args()
+    store = ResultsStore(args.dataset)
+    if args.import_logbook:
+        num_runs = import_logbook(store, args.import_logbook)
+        logger.info(f"Added {num_runs} runs to {args.dataset}")
+
+    # field=value, the value is parsed as YAML so numbers stay numbers
+    filters = {
+        field: yaml.safe_load(value)
+        for field, value in (
+            column_filter.split("=", 1) for column_filter in args.filter
+        )
+    }
+    results_df = store.read(args.columns, filters, args.start, args.end)
+    if args.output is None:
+        print(results_df.to_string(index=False))
+    elif args.output.endswith(".csv"):
+        results_df.to_csv(args.output, index=False)
+    else:
+        results_df.to_pickle(args.output)
@@ -1,21 +1,18 @@
 import argparse
 import logging
-import pdb
 import time
 import yaml
 import multiprocessing
 import os
-import datetime
 import shutil
 
 from loratestbed.main_controller import run_controller
 from loratestbed.main_gateway import run_gateway
-from loratestbed.metrics import (
-    read_packet_trace,
-    extract_required_metrics_from_trace,
-    compute_experiment_results,
-)
-from loratestbed.experiment_logbook import logbook_add_entry
+from loratestbed.multi_gateway import run_multi_gateway
+from loratestbed.tracing import span, traced, tracing_to
+
+# the analysis and results modules (pandas) are imported by the functions
+# that use them, so the gateway process starts without them
 
 logging.basicConfig(
     format="[%(asctime)s] [%(levelname)s] %(message)s",
@@ -26,7 +23,13 @@ logging.basicConfig(
 
 def make_parser():
     ap = argparse.ArgumentParser()
-    ap.add_argument("-g", "--gateway", required=True, help="Gateway Port Name")
+    ap.add_argument(
+        "-g",
+        "--gateway",
+        required=True,
+        nargs="+",
+        help="Gateway Port Name(s), more than one merges and deduplicates the gateways",
+    )
     ap.add_argument("-c", "--controller", required=True, help="Controller Port Name")
     ap.add_argument(
         "--config", required=True, help="Path to the YAML configuration file"
@@ -42,37 +45,41 @@ def make_parser():
         default="LoRa hardware experiments",
         help="Message for logbook",
     )
+    ap.add_argument("--trace", help="Write a Chrome trace of the run to this file")
     return ap
 
 
-def run_testbed(
-    gateway_port: str,
-    controller_port: str,
-    config_filename: str,
-    experiment_name: str = "",
-    logbook_message: str = "",
-):
-    gateway_trace_filename: str = "/tmp/gateway.csv"
+GATEWAY_TRACE_FILENAME = "/tmp/gateway.csv"
+RESULTS_FOLDER = "./results"
+RUN_TIME_FORMAT = "%Y%m%d-%H%M%S"
 
-    p1 = multiprocessing.Process(
-        target=run_gateway,
-        args=(
-            2000000,
-            gateway_port,
-            gateway_trace_filename,
-        ),
-    )
-    p1.start()
-
-    result_df, config = run_controller(controller_port, config_filename)
-
-    p1.terminate()
 
-    packet_trace = read_packet_trace(gateway_trace_filename)
-    node_metrics_dataframe = extract_required_metrics_from_trace(
-        packet_trace, result_df
+@traced()
+def analyze_run(gateway_trace_filename: str, result_df, config: dict):
+    """Experiment results of a gateway capture and the controller results"""
+    from loratestbed.metrics import (
+        read_packet_trace,
+        extract_required_metrics_from_trace,
+        compute_experiment_results,
+        stream_experiment_results,
     )
-    expt_results_df = compute_experiment_results(node_metrics_dataframe, **config)
+
+    if config.get("analysis_chunk_size"):
+        # long captures are folded chunk by chunk, without per-packet values
+        expt_results_df = stream_experiment_results(
+            gateway_trace_filename,
+            result_df,
+            chunk_size=config["analysis_chunk_size"],
+            **config,
+        )
+    else:
+        packet_trace = read_packet_trace(
+            gateway_trace_filename, **config.get("packet_filter", {})
+        )
+        node_metrics_dataframe = extract_required_metrics_from_trace(
+            packet_trace, result_df
+        )
+        expt_results_df = compute_experiment_results(node_metrics_dataframe, **config)
 
     total_offered_load = expt_results_df.normalized_offered_load.sum()
     total_normalized_throughput = expt_results_df.normalized_throughput.sum()
@@ -98,10 +105,32 @@ def run_testbed(
             ]
         ]
     )
+    return expt_results_df
+
+
+@traced()
+def save_run(
+    expt_results_df,
+    result_df,
+    config: dict,
+    gateway_trace_filename: str,
+    experiment_name: str = "",
+    logbook_message: str = "",
+    results_folder: str = RESULTS_FOLDER,
+    current_time: str = None,
+):
+    """Archives the results, config, controller results and capture, adds the results
+    to the results dataset and adds a logbook entry
+
+    current_time (default: now) names the files and the logbook entry.
+    Returns the logbook entry.
+    """
+    from loratestbed.experiment_logbook import import_csv_logbook, logbook_add_entry
+    from loratestbed.results_store import ResultsStore
 
     # First code: Saving results and config files
-    current_time = time.strftime("%Y%m%d-%H%M%S")
-    results_folder = "./results"
+    if current_time is None:
+        current_time = time.strftime(RUN_TIME_FORMAT)
     if not os.path.exists(results_folder):
         os.makedirs(results_folder)
     results_filename = f"{results_folder}/results-{current_time}.pkl"
@@ -110,12 +139,23 @@ def run_testbed(
     with open(config_filename, "w") as f:
         yaml.dump(config, f)
     logging.info(f"Saved results to {results_filename}, configs to {config_filename}")
+    # controller counters, so archived runs can be re-analysed from the trace
+    controller_results_filename = f"{results_folder}/controller-{current_time}.csv"
+    result_df.to_csv(controller_results_filename, index=False)
     gateway_filename = f"{results_folder}/gateway-{current_time}.csv"
     # copy gateway_trace_filename to gateway_filename
     shutil.copy(gateway_trace_filename, gateway_filename)
+    # per-node results of all runs in one dataset for cross-run queries
+    ResultsStore(f"{results_folder}/dataset").append_run(
+        expt_results_df, config, current_time, experiment_name
+    )
 
     # Second code: Logbook functionality
-    logbook_filename = f"{results_folder}/experiment_logbook.csv"
+    logbook_filename = f"{results_folder}/experiment_logbook.sqlite"
+    csv_logbook_filename = f"{results_folder}/experiment_logbook.csv"
+    if not os.path.exists(logbook_filename) and os.path.exists(csv_logbook_filename):
+        # results folders from before the SQLite logbook keep their history
+        import_csv_logbook(logbook_filename, csv_logbook_filename)
 
     # Update the experiment parameters to include filenames of results and config
     expt_params = {
@@ -128,20 +168,72 @@ def run_testbed(
         "metadata_filename": config_filename,  # Updated to include the config filename
         "logbook_message": logbook_message,
     }
-    logbook_add_entry(logbook_filename, expt_params)
+    logbook_add_entry(logbook_filename, expt_params, config)
+    return expt_params
+
+
+def run_testbed(
+    gateway_port,
+    controller_port: str,
+    config_filename: str,
+    experiment_name: str = "",
+    logbook_message: str = "",
+):
+    gateway_trace_filename: str = GATEWAY_TRACE_FILENAME
+
+    # a single port keeps the plain reader, several ports go through the merger
+    if isinstance(gateway_port, str):
+        gateway_port = [gateway_port]
+    if len(gateway_port) == 1:
+        p1 = multiprocessing.Process(
+            target=run_gateway,
+            args=(
+                2000000,
+                gateway_port[0],
+                gateway_trace_filename,
+            ),
+        )
+    else:
+        p1 = multiprocessing.Process(
+            target=run_multi_gateway,
+            args=(
+                2000000,
+                gateway_port,
+                gateway_trace_filename,
+            ),
+        )
+    with span("run_testbed.gateway_start"):
+        p1.start()
+
+    result_df, config = run_controller(controller_port, config_filename)
+
+    with span("run_testbed.gateway_stop"):
+        p1.terminate()
+        p1.join()
+
+    expt_results_df = analyze_run(gateway_trace_filename, result_df, config)
+    save_run(
+        expt_results_df,
+        result_df,
+        config,
+        gateway_trace_filename,
+        experiment_name,
+        logbook_message,
+    )
 
 
 def main():
     parser = make_parser()
     args = parser.parse_args()
 
-    run_testbed(
-        args.gateway,
-        args.controller,
-        args.config,
-        args.experiment_name,
-        args.logbook_message,
-    )
+    with tracing_to(args.trace):
+        run_testbed(
+            args.gateway,
+            args.controller,
+            args.config,
+            args.experiment_name,
+            args.logbook_message,
+        )
 
 
 if __name__ == "__main__":
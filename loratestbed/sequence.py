@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+
+# Per-node columns added to the experiment results
+SEQUENCE_STAT_COLUMNS = [
+    "duplicate_packets",
+    "out_of_order_packets",
+    "loss_runs",
+    "mean_loss_run",
+    "max_loss_run",
+    "loss_after_loss_ratio",
+]
+
+
+def _node_sequences(node_metrics_df: pd.DataFrame):
+    # nodes in order of first arrival, like the grouped metrics
+    codes, nodes = pd.factorize(node_metrics_df["NodeAddress"], sort=False)
+    counter = node_metrics_df["Counter"].to_numpy(dtype=np.int64)
+    transmitted = np.zeros(len(nodes), dtype=np.int64)
+    transmitted[codes] = node_metrics_df["TransmittedPackets"].to_numpy(dtype=np.int64)
+
+    # a counter heard again from the same node is a duplicate
+    span = int(counter.max(initial=0)) + 1
+    first_reception = ~pd.Series(codes * span + counter).duplicated().to_numpy()
+    return np.asarray(nodes), codes, counter, transmitted, first_reception
+
+
+def _received_counters(codes, counter, transmitted, first_reception):
+    # distinct counters within 0..TransmittedPackets - 1 of every node
+    in_range = first_reception & (counter < transmitted[codes])
+    return codes[in_range], counter[in_range]
+
+
+def _loss_runs(codes, counter, transmitted):
+    """Node code and length of every run of consecutive missing counters
+
+    Counters of a node run from 0 to TransmittedPackets - 1, so losses before
+    the first and after the last received counter are runs too.
+    """
+    num_nodes = len(transmitted)
+    # sentinels at -1 and TransmittedPackets close the runs at both ends
+    positions = np.concatenate(
+        [counter, np.full(num_nodes, -1, dtype=np.int64), transmitted]
+    )
+    groups = np.concatenate([codes, np.arange(num_nodes), np.arange(num_nodes)])
+
+    # one sort of a combined (node, counter) key
+    span = int(transmitted.max(initial=0)) + 2
+    keys = np.sort(groups * span + positions + 1)
+    groups, positions = np.divmod(keys, span)
+    positions -= 1
+
+    gaps = np.diff(positions) - 1
+    is_run = (gaps > 0) & (groups[1:] == groups[:-1])
+    return groups[1:][is_run], gaps[is_run]
+
+
+def sequence_stats(node_metrics_df: pd.DataFrame) -> pd.DataFrame:
+    """Duplicates, reordering and loss runs of every node's counter sequence
+
+    Indexed by NodeAddress, in order of first arrival. An arrival is out of
+    order when a higher counter of the same node arrived before it.
+    loss_after_loss_ratio is the fraction of lost packets followed by
+    another loss, high values mean losses come in bursts.
+    """
+    nodes, codes, counter, transmitted, first_reception = _node_sequences(
+        node_metrics_df
+    )
+    num_nodes = len(nodes)
+
+    running_max = pd.Series(counter).groupby(codes).cummax()
+    previous_max = running_max.groupby(codes).shift(1).to_numpy()
+    out_of_order = first_reception & (counter < previous_max)
+
+    run_groups, run_lengths = _loss_runs(
+        *_received_counters(codes, counter, transmitted, first_reception), transmitted
+    )
+    loss_runs = np.bincount(run_groups, minlength=num_nodes)
+    lost = np.bincount(run_groups, weights=run_lengths, minlength=num_nodes)
+    max_loss_run = np.zeros(num_nodes, dtype=np.int64)
+    np.maximum.at(max_loss_run, run_groups, run_lengths)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return pd.DataFrame(
+            {
+                "duplicate_packets": np.bincount(
+                    codes[~first_reception], minlength=num_nodes
+                ),
+                "out_of_order_packets": np.bincount(
+                    codes[out_of_order], minlength=num_nodes
+                ),
+                "loss_runs": loss_runs,
+                "mean_loss_run": lost / loss_runs,
+                "max_loss_run": max_loss_run,
+                "loss_after_loss_ratio": (lost - loss_runs) / lost,
+            },
+            index=pd.Index(nodes, name="NodeAddress"),
+        )
+
+
+def loss_run_lengths(node_metrics_df: pd.DataFrame) -> pd.DataFrame:
+    """Distribution of loss run lengths, one row per (NodeAddress, run_length)"""
+    nodes, codes, counter, transmitted, first_reception = _node_sequences(
+        node_metrics_df
+    )
+    run_groups, run_lengths = _loss_runs(
+        *_received_counters(codes, counter, transmitted, first_reception), transmitted
+    )
+    runs = pd.DataFrame({"NodeAddress": nodes[run_groups], "run_length": run_lengths})
+    return (
+        runs.groupby(["NodeAddress", "run_length"])
+        .size()
+        .rename("num_runs")
+        .reset_index()
+    )
+
+
+def windowed_prr(
+    node_metrics_df: pd.DataFrame, window_packets: int = 100, stride: int = None
+) -> pd.DataFrame:
+    """Packet reception ratio in sliding windows of the counter space
+
+    Windows of window_packets counters start every stride counters (default:
+    back to back). The last window of a node ends at TransmittedPackets.
+    """
+    if stride is None:
+        stride = window_packets
+    nodes, codes, counter, transmitted, first_reception = _node_sequences(
+        node_metrics_df
+    )
+    received_codes, received_counter = _received_counters(
+        codes, counter, transmitted, first_reception
+    )
+
+    # received flags of all nodes back to back, prefix sums count per window
+    offsets = np.cumsum(transmitted) - transmitted
+    received = np.zeros(int(transmitted.sum()), dtype=np.int64)
+    received[offsets[received_codes] + received_counter] = 1
+    received_before = np.concatenate([[0], np.cumsum(received)])
+
+    num_windows = -(-transmitted // stride)
+    window_codes = np.repeat(np.arange(len(nodes)), num_windows)
+    window_first = np.cumsum(num_windows) - num_windows
+    window_start = (np.arange(len(window_codes)) - window_first[window_codes]) * stride
+    window_end = np.minimum(window_start + window_packets, transmitted[window_codes])
+    num_received = (
+        received_before[offsets[window_codes] + window_end]
+        - received_before[offsets[window_codes] + window_start]
+    )
+
+    return pd.DataFrame(
+        {
+            "NodeAddress": nodes[window_codes],
+            "window_start": window_start,
+            "window_end": window_end,
+            "received_packets": num_received,
+            "packet_reception_ratio": num_received / (window_end - window_start),
+        }
+    )
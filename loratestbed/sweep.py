@@ -0,0 +1,534 @@
+import argparse
+import copy
+import itertools
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import serial
+import yaml
+
+from loratestbed.campaign import CampaignState
+from loratestbed.controller import SerialInterface
+from loratestbed.device_manager import DeviceManager
+from loratestbed.gateway_parser import GatewayLineParser
+from loratestbed.main_controller import (
+    configure_devices,
+    prepare_config,
+    read_results,
+    run_experiment,
+    start_experiment,
+    wait_for_experiment,
+)
+from loratestbed.run_testbed import (
+    GATEWAY_TRACE_FILENAME,
+    RUN_TIME_FORMAT,
+    analyze_run,
+    save_run,
+)
+from loratestbed.tracing import span, traced, tracing_to
+
+logger = logging.getLogger(__name__)
+
+# sweeping a transmit setting also sets the matching receive setting, unless
+# the receive setting is swept itself
+LINKED_FIELDS = {
+    "transmit_SF": "receive_SF",
+    "transmit_BW": "receive_BW",
+    "transmit_CR": "receive_CR",
+}
+
+
+def expand_grid(base_config: dict, grid: dict):
+    """One config per point of the grid (field -> list of values), in grid order"""
+    if "device_list" in grid:
+        raise ValueError("device_list cannot be swept, the devices stay configured")
+    fields = list(grid)
+    configs = []
+    for values in itertools.product(*(grid[field] for field in fields)):
+        config = copy.deepcopy(base_config)
+        for field, value in zip(fields, values):
+            config[field] = value
+            if (
+                LINKED_FIELDS.get(field) is not None
+                and LINKED_FIELDS[field] not in grid
+            ):
+                config[LINKED_FIELDS[field]] = value
+        configs.append(prepare_config(config))
+    return configs
+
+
+class _EchoInterface:
+    # stands in for the controller port, every device acknowledges every write
+    def _write_read_bytes(self, data: bytes):
+        return data
+
+
+def _dry_run_configure(device_manager: DeviceManager, config: dict) -> int:
+    # configure_devices on an echo interface, returns the number of writes
+    writes_before = device_manager.num_register_writes
+    logging.disable(logging.INFO)
+    try:
+        configure_devices(device_manager, config)
+    finally:
+        logging.disable(logging.NOTSET)
+    return device_manager.num_register_writes - writes_before
+
+
+def register_image(config: dict) -> np.ndarray:
+    """Register values configure_devices writes for a config, -1 where it writes nothing"""
+    device_manager = DeviceManager(
+        config["device_list"], _EchoInterface(), cache_registers=True
+    )
+    _dry_run_configure(device_manager, config)
+    return np.where(
+        device_manager._known_registers,
+        device_manager._device_states.astype(np.int16),
+        -1,
+    ).ravel()
+
+
+def order_runs(configs):
+    """Run order that keeps register changes between consecutive points small
+
+    Greedy nearest neighbour from the first grid point: the next run is the one
+    that changes the fewest registers after the current one. Returns the order
+    and the number of register writes of every run in that order.
+    """
+    images = np.stack([register_image(config) for config in configs])
+    written = images >= 0
+    # changes going from run a to run b: registers b writes with another value
+    changes = (written[None, :, :] & (images[:, None, :] != images[None, :, :])).sum(
+        axis=2
+    )
+
+    order = [0]
+    remaining = set(range(1, len(configs)))
+    while remaining:
+        current = order[-1]
+        next_run = min(remaining, key=lambda run: (changes[current, run], run))
+        order.append(next_run)
+        remaining.remove(next_run)
+
+    # exact counts, including what disable_all_devices makes stale every run
+    device_manager = DeviceManager(
+        configs[0]["device_list"], _EchoInterface(), cache_registers=True
+    )
+    num_writes = [_dry_run_configure(device_manager, configs[run]) for run in order]
+    return order, num_writes
+
+
+class GatewayRecorder:
+    """Keeps a gateway port open across runs and records each run to its own file
+
+    A thread reads the port all the time, bytes outside a run are dropped.
+    """
+
+    def __init__(self, port: str, baudrate: int = 2000000):
+        self._serial = serial.Serial(port, baudrate, timeout=0.1)
+        self._lock = threading.Lock()
+        self._file = None
+        self._parser = GatewayLineParser()
+        self.num_packets = 0
+        self.num_crc_errors = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _count_packets(self, parsed):
+        self.num_packets += len(parsed)
+        self.num_crc_errors += int(parsed.crc_status.astype(bool).sum())
+
+    def _read(self):
+        while not self._stop.is_set():
+            data = self._serial.read(self._serial.in_waiting or 1)
+            with self._lock:
+                if data and self._file is not None:
+                    self._file.write(data)
+                    self._count_packets(self._parser.feed(data))
+
+    def start_run(self, filename: str):
+        with self._lock:
+            self._file = open(filename, "wb")
+            self._parser = GatewayLineParser()
+            self.num_packets = 0
+            self.num_crc_errors = 0
+
+    def stop_run(self):
+        with self._lock:
+            self._count_packets(self._parser.flush())
+            self._file.close()
+            self._file = None
+        logger.info(
+            f"Gateway received {self.num_packets} packets ({self.num_crc_errors} CRC errors)"
+        )
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self._serial.close()
+
+
+@traced()
+def record_point(
+    device_manager: DeviceManager,
+    recorder: GatewayRecorder,
+    config: dict,
+    trace_filename: str,
+):
+    """Configures the devices and runs one experiment, recording the gateway
+
+    Returns the controller results.
+    """
+    writes_before = device_manager.num_register_writes
+    configure_devices(device_manager, config)
+    logger.info(f"Wrote {device_manager.num_register_writes - writes_before} registers")
+
+    recorder.start_run(trace_filename)
+    try:
+        return run_experiment(device_manager, config)
+    finally:
+        recorder.stop_run()
+
+
+@traced()
+def finish_point(
+    trace_filename: str,
+    result_df,
+    config: dict,
+    experiment_name: str = "",
+    logbook_message: str = "",
+):
+    """Analyzes and saves a recorded run, returns the results and the logbook entry"""
+    expt_results_df = analyze_run(trace_filename, result_df, config)
+    logbook_entry = save_run(
+        expt_results_df,
+        result_df,
+        config,
+        trace_filename,
+        experiment_name,
+        logbook_message,
+    )
+    return expt_results_df, logbook_entry
+
+
+def run_point(
+    device_manager: DeviceManager,
+    recorder: GatewayRecorder,
+    config: dict,
+    experiment_name: str = "",
+    logbook_message: str = "",
+):
+    """One experiment on open ports: configure, record, analyze and save
+
+    Returns the experiment results and the logbook entry.
+    """
+    result_df = record_point(device_manager, recorder, config, GATEWAY_TRACE_FILENAME)
+    return finish_point(
+        GATEWAY_TRACE_FILENAME, result_df, config, experiment_name, logbook_message
+    )
+
+
+@traced()
+def record_checkpointed(
+    state: CampaignState,
+    point: int,
+    device_manager: DeviceManager,
+    recorder: GatewayRecorder,
+    config: dict,
+):
+    """Hardware phases of a campaign run, checkpointed up to results_read
+
+    A run that was captured before only reads the results again (the devices
+    keep them until they are configured again), earlier phases are redone
+    from the configuration since a crash leaves the devices in an unknown state.
+    """
+    run_dir = state.run_dir(point)
+    if not state.completed(point, "captured"):
+        writes_before = device_manager.num_register_writes
+        configure_devices(device_manager, config)
+        logger.info(
+            f"Wrote {device_manager.num_register_writes - writes_before} registers"
+        )
+        state.set_phase(point, "configured")
+
+        recorder.start_run(os.path.join(run_dir, "gateway.csv"))
+        try:
+            start_experiment(device_manager)
+            state.set_phase(point, "triggered")
+            wait_for_experiment(config)
+        finally:
+            recorder.stop_run()
+        # the run is saved under the time its capture ended
+        state.set_phase(point, "captured", current_time=time.strftime(RUN_TIME_FORMAT))
+    else:
+        logger.info(f"Run {point} was captured before, reading its results again")
+
+    result_df = read_results(device_manager, config)
+    result_df.to_csv(os.path.join(run_dir, "controller.csv"), index=False)
+    state.set_phase(point, "results_read")
+
+
+@traced()
+def finish_checkpointed(
+    experiment_name: str,
+    state: CampaignState,
+    point: int,
+    config: dict,
+    logbook_message: str = "",
+):
+    """Analysis and logging phases of a campaign run, like finish_point
+
+    The analysis results are checkpointed, so a run that fails while saving is
+    not analysed again. Once logged, the run directory is removed.
+    """
+    run_dir = state.run_dir(point)
+    trace_filename = os.path.join(run_dir, "gateway.csv")
+    result_df = pd.read_csv(os.path.join(run_dir, "controller.csv"))
+    analysis_filename = os.path.join(run_dir, "results.pkl")
+    if state.completed(point, "analysed"):
+        expt_results_df = pd.read_pickle(analysis_filename)
+    else:
+        expt_results_df = analyze_run(trace_filename, result_df, config)
+        expt_results_df.to_pickle(analysis_filename)
+        state.set_phase(point, "analysed")
+
+    logbook_entry = save_run(
+        expt_results_df,
+        result_df,
+        config,
+        trace_filename,
+        experiment_name,
+        logbook_message,
+        current_time=state.run(point)["current_time"],
+    )
+    state.set_phase(point, "logged")
+    shutil.rmtree(run_dir)
+    return expt_results_df, logbook_entry
+
+
+class AnalysisPipeline:
+    """Analyzes and saves finished runs in a worker thread while the next run records
+
+    process(*args, **kwargs) of each submit() analyzes and saves a run (e.g.
+    finish_checkpointed) and returns its results and logbook entry. submit()
+    blocks while max_pending runs are waiting, which bounds the memory and
+    disk held by unanalyzed runs. Runs are processed one at a time
+    in submission order, so logbook entries keep the run order. A failing run
+    is logged and skipped.
+    """
+
+    def __init__(self, process, max_pending: int = 2):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._process = process
+        self.logbook_entries = []
+        self.num_failed = 0
+        self._thread = threading.Thread(
+            target=self._work, name="analysis-pipeline", daemon=True
+        )
+        self._thread.start()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            args, kwargs = item
+            try:
+                _, logbook_entry = self._process(*args, **kwargs)
+                self.logbook_entries.append(logbook_entry)
+            except Exception as exception_message:
+                self.num_failed += 1
+                logger.error(f"Analysis of {args[0]} failed: {exception_message}")
+
+    def submit(self, *args, **kwargs):
+        """Queues the arguments of a run, waits while the queue is full"""
+        with span("sweep.pipeline_submit", pending=self._queue.qsize()):
+            self._queue.put((args, kwargs))
+
+    def close(self):
+        """Waits until every submitted run is processed"""
+        self._queue.put(None)
+        self._thread.join()
+
+
+def run_sweep(
+    gateway_port: str,
+    controller_port: str,
+    configs,
+    experiment_name: str = "sweep",
+    logbook_message: str = "",
+    cache_registers: bool = True,
+    pipeline_depth: int = 2,
+    campaign_dir: str = None,
+):
+    """Runs every config with one gateway recorder and one DeviceManager
+
+    Runs are reordered to change few registers between them, and only changed
+    registers are written. Each run is saved and logged like run_testbed, as
+    <experiment_name>-<grid point>. With pipeline_depth > 0 the analysis of a
+    run overlaps the next runs, with at most pipeline_depth runs waiting.
+
+    The phase of every run is checkpointed in campaign_dir (a temporary
+    directory if not given). Running the same configs with the same
+    campaign_dir again skips logged runs and goes on from the last completed
+    phase of the others, the ports are only opened if a run needs the hardware.
+    """
+    device_lists = {tuple(config["device_list"]) for config in configs}
+    if len(device_lists) != 1:
+        raise ValueError("All sweep configs must use the same device_list")
+
+    order, num_writes = order_runs(configs)
+    logger.info(
+        f"Running {len(configs)} points, {sum(num_writes)} register writes in sweep order"
+    )
+    temporary_campaign = campaign_dir is None
+    if temporary_campaign:
+        campaign_dir = tempfile.mkdtemp(prefix="sweep-")
+    state = CampaignState(campaign_dir, configs, experiment_name)
+    remaining = [point for point in order if state.phase(point) != "logged"]
+
+    recorder = None
+    device_manager = None
+    if any(not state.completed(point, "results_read") for point in remaining):
+        recorder = GatewayRecorder(gateway_port)
+    pipeline = None
+    if pipeline_depth > 0:
+        pipeline = AnalysisPipeline(finish_checkpointed, pipeline_depth)
+    try:
+        for point in remaining:
+            run_idx = order.index(point)
+            logger.info(f"Sweep run {run_idx + 1}/{len(order)}: grid point {point}")
+            if not state.completed(point, "results_read"):
+                if device_manager is None:
+                    device_manager = DeviceManager(
+                        configs[0]["device_list"],
+                        SerialInterface(controller_port),
+                        cache_registers=cache_registers,
+                    )
+                with span("sweep.run", point=point, run_idx=run_idx):
+                    record_checkpointed(
+                        state, point, device_manager, recorder, configs[point]
+                    )
+
+            point_name = f"{experiment_name}-{point:03d}"
+            if pipeline is None:
+                finish_checkpointed(
+                    point_name, state, point, configs[point], logbook_message
+                )
+            else:
+                pipeline.submit(
+                    point_name, state, point, configs[point], logbook_message
+                )
+    finally:
+        if pipeline is not None:
+            pipeline.close()
+        if recorder is not None:
+            recorder.close()
+        if state.remaining():
+            logger.error(
+                f"{len(state.remaining())} runs did not finish, "
+                f"rerun with --campaign_dir {campaign_dir} to resume"
+            )
+        elif temporary_campaign:
+            shutil.rmtree(campaign_dir)
+
+
+def load_sweep(config_filename: str, grid_filename: str = None):
+    """Base config and grid YAML files to the sweep configs and the grid"""
+    with open(config_filename, "r") as f:
+        base_config = yaml.safe_load(f)
+    grid = {}
+    if grid_filename is not None:
+        with open(grid_filename, "r") as f:
+            grid = yaml.safe_load(f)
+    return expand_grid(base_config, grid), grid
+
+
+def make_parser():
+    ap = argparse.ArgumentParser(
+        description="Run a parameter sweep, keeping the ports open between runs."
+    )
+    ap.add_argument("-g", "--gateway", help="Gateway Port Name")
+    ap.add_argument("-c", "--controller", help="Controller Port Name")
+    ap.add_argument(
+        "--config", required=True, help="Path to the base YAML configuration file"
+    )
+    ap.add_argument(
+        "--grid",
+        help="YAML file mapping config fields to the list of values to sweep. "
+        "Without it the base configuration is run once.",
+    )
+    ap.add_argument("--experiment_name", default="sweep", help="Experiment Name")
+    ap.add_argument(
+        "--logbook_message",
+        default="LoRa hardware experiments",
+        help="Message for logbook",
+    )
+    ap.add_argument(
+        "--no_register_cache",
+        action="store_true",
+        help="Write every register for every run, e.g. if devices may reset mid-sweep",
+    )
+    ap.add_argument(
+        "--pipeline_depth",
+        type=int,
+        default=2,
+        help="Finished runs that may wait for analysis while the next runs, 0 analyzes before the next run",
+    )
+    ap.add_argument(
+        "--campaign_dir",
+        help="Directory to checkpoint the runs in, rerunning with it resumes the campaign",
+    )
+    ap.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Only print the run order and register writes per run",
+    )
+    ap.add_argument("--trace", help="Write a Chrome trace of the sweep to this file")
+    return ap
+
+
+def main():
+    logging.basicConfig(
+        format="[%(asctime)s] [%(levelname)s] %(message)s",
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    args = make_parser().parse_args()
+    configs, grid = load_sweep(args.config, args.grid)
+
+    if args.dry_run:
+        order, num_writes = order_runs(configs)
+        for point, writes in zip(order, num_writes):
+            values = ", ".join(f"{field}={configs[point][field]}" for field in grid)
+            print(f"{point:3d}: {writes:4d} register writes, {values}")
+        return
+
+    if args.gateway is None or args.controller is None:
+        raise ValueError("--gateway and --controller are required unless --dry_run")
+    with tracing_to(args.trace):
+        run_sweep(
+            args.gateway,
+            args.controller,
+            configs,
+            args.experiment_name,
+            args.logbook_message,
+            cache_registers=not args.no_register_cache,
+            pipeline_depth=args.pipeline_depth,
+            campaign_dir=args.campaign_dir,
+        )
+
+
+if __name__ == "__main__":
+    main()
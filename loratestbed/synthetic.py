@@ -0,0 +1,218 @@
+import argparse
+import errno
+import os
+import time
+import tty
+from typing import List, Optional
+
+import numpy as np
+
+# Uppercase hex digits, gateway_reference.ino prints every byte as two digits
+HEX_DIGITS = np.frombuffer(b"0123456789ABCDEF", dtype=np.uint8)
+GATEWAY_BANNER = b"Hi, this is gateway rx\n"
+# device NODE_IDX are 24-44
+DEVICE_ADDRESSES = list(range(24, 45))
+
+
+class SyntheticGatewayTraffic:
+    """Generate gateway serial output in the gateway_reference.ino format
+
+    Each node keeps its own 24-bit packet counter. Packets are lost on air
+    with probability 1 - reception_ratio (the counter still advances), a
+    fraction of the received packets has CRC errors with corrupted payload
+    bytes, and a fraction of lines is cut short like a partial serial write.
+    """
+
+    def __init__(
+        self,
+        num_nodes: int = 10,
+        packet_size_bytes: int = 16,
+        reception_ratio: float = 0.9,
+        crc_error_rate: float = 0.02,
+        short_line_rate: float = 0.005,
+        node_addresses: Optional[List[int]] = None,
+        seed: Optional[int] = None,
+    ):
+        if node_addresses is None:
+            if num_nodes > len(DEVICE_ADDRESSES):
+                raise ValueError(
+                    f"Only {len(DEVICE_ADDRESSES)} device addresses, "
+                    "give node_addresses for more nodes"
+                )
+            node_addresses = DEVICE_ADDRESSES[:num_nodes]
+        # each address has one counter, the ground truth is kept per address
+        if len(set(node_addresses)) != len(node_addresses):
+            raise ValueError("Node addresses must be unique")
+        if not all(0 <= address <= 255 for address in node_addresses):
+            raise ValueError("Node addresses must fit in one payload byte")
+        if packet_size_bytes < 4:
+            raise ValueError("Packet size must be at least 4 bytes")
+
+        self._rng = np.random.default_rng(seed)
+        self._node_addresses = np.asarray(node_addresses, dtype=np.uint8)
+        self._num_nodes = len(node_addresses)
+        self._packet_size_bytes = packet_size_bytes
+        self._reception_ratio = reception_ratio
+        self._crc_error_rate = crc_error_rate
+        self._short_line_rate = short_line_rate
+
+        # per node link quality, in the gateway's RSSI/SNR units
+        self._rssi_mean = self._rng.uniform(-45, -5, self._num_nodes)
+        self._snr_mean = self._rng.uniform(15, 32, self._num_nodes)
+        self._counters = np.zeros(self._num_nodes, dtype=np.int64)
+        self.num_transmitted = np.zeros(self._num_nodes, dtype=np.int64)
+
+    def transmitted_packets(self):
+        # matches the controller result format (NodeAddress, TransmittedPackets)
+        return dict(zip(self._node_addresses.tolist(), self.num_transmitted.tolist()))
+
+    def _transmit(self, num_packets: int):
+        # each transmission is from a random node, its counter is the running count
+        node_idx = self._rng.integers(0, self._num_nodes, num_packets)
+        order = np.argsort(node_idx, kind="stable")
+        counts = np.bincount(node_idx, minlength=self._num_nodes)
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        counter = np.empty(num_packets, dtype=np.int64)
+        counter[order] = (
+            np.arange(num_packets) - first + self._counters[node_idx[order]]
+        )
+        self._counters += counts
+        self.num_transmitted += counts
+        return node_idx, counter
+
+    def next_chunk(self, num_packets: int) -> bytes:
+        """Bytes for the next num_packets transmissions (lost ones are not printed)"""
+        node_idx, counter = self._transmit(num_packets)
+        received = self._rng.random(num_packets) < self._reception_ratio
+        node_idx, counter = node_idx[received], counter[received]
+        num_lines = len(node_idx)
+
+        payload = np.zeros((num_lines, self._packet_size_bytes), dtype=np.uint8)
+        payload[:, 0] = self._node_addresses[node_idx]
+        payload[:, 1] = counter & 0xFF
+        payload[:, 2] = (counter >> 8) & 0xFF
+        payload[:, 3] = (counter >> 16) & 0xFF
+
+        crc_error = self._rng.random(num_lines) < self._crc_error_rate
+        noise = self._rng.integers(0, 256, payload.shape, dtype=np.uint8)
+        flip = self._rng.random(payload.shape) < 0.1
+        payload[crc_error[:, None] & flip] ^= noise[crc_error[:, None] & flip]
+
+        rssi = np.round(self._rssi_mean[node_idx] + self._rng.normal(0, 3, num_lines))
+        snr = np.round(self._snr_mean[node_idx] + self._rng.normal(0, 2, num_lines))
+        rssi = np.clip(rssi, -128, 127).astype(np.int64)
+        snr = np.clip(snr, -128, 127).astype(np.int64)
+
+        hex_payload = np.empty((num_lines, 2 * self._packet_size_bytes), dtype=np.uint8)
+        hex_payload[:, 0::2] = HEX_DIGITS[payload >> 4]
+        hex_payload[:, 1::2] = HEX_DIGITS[payload & 0x0F]
+        hex_rows = hex_payload.view(f"S{2 * self._packet_size_bytes}").ravel()
+
+        lines = [
+            b"%s, %d, %d, %d\n" % fields
+            for fields in zip(
+                hex_rows.tolist(), rssi.tolist(), snr.tolist(), crc_error.tolist()
+            )
+        ]
+
+        # partial serial writes: the line is cut at a random point
+        short_lines = np.flatnonzero(
+            self._rng.random(num_lines) < self._short_line_rate
+        )
+        for line_idx in short_lines.tolist():
+            cut = int(self._rng.integers(1, len(lines[line_idx]) - 1))
+            lines[line_idx] = lines[line_idx][:cut] + b"\n"
+
+        return b"".join(lines)
+
+
+def write_synthetic_trace(
+    filename: str, num_packets: int, chunk_size: int = 1000000, **traffic_kwargs
+):
+    """Write a synthetic gateway capture, returns the transmitted packets per node"""
+    traffic = SyntheticGatewayTraffic(**traffic_kwargs)
+    with open(filename, "wb") as f:
+        f.write(GATEWAY_BANNER)
+        for start in range(0, num_packets, chunk_size):
+            f.write(traffic.next_chunk(min(chunk_size, num_packets - start)))
+    return traffic.transmitted_packets()
+
+
+class PtyTrafficSource:
+    """Pseudo terminal that emits synthetic gateway traffic like a gateway port
+
+    Readers open slave_name like a serial port. Writes are non-blocking: when
+    the reader falls behind and the pty buffer fills up, the remaining bytes
+    of that tick are dropped and counted, like a gateway whose serial output
+    stalls while it keeps receiving.
+    """
+
+    def __init__(self, traffic: SyntheticGatewayTraffic):
+        self._traffic = traffic
+        self._master_fd, self._slave_fd = os.openpty()
+        tty.setraw(self._slave_fd)
+        os.set_blocking(self._master_fd, False)
+        self.slave_name = os.ttyname(self._slave_fd)
+        self.num_bytes_written = 0
+        self.num_bytes_dropped = 0
+        # longest generate+write of one tick, above tick_sec the source itself lags
+        self.max_write_sec = 0.0
+
+    def _write(self, data: bytes):
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(self._master_fd, view)
+            except OSError as exception:
+                if exception.errno != errno.EAGAIN:
+                    raise
+                self.num_bytes_dropped += len(view)
+                return
+            self.num_bytes_written += written
+            view = view[written:]
+
+    def run(self, packets_per_sec: float, duration_sec: float, tick_sec: float = 0.01):
+        """Emit traffic at a fixed packet rate, returns the number of transmissions"""
+        start_time = time.monotonic()
+        num_sent = 0
+        while True:
+            elapsed = time.monotonic() - start_time
+            if elapsed >= duration_sec:
+                break
+            num_due = int(elapsed * packets_per_sec) - num_sent
+            if num_due > 0:
+                self._write(self._traffic.next_chunk(num_due))
+                num_sent += num_due
+            write_sec = time.monotonic() - start_time - elapsed
+            self.max_write_sec = max(self.max_write_sec, write_sec)
+            time.sleep(tick_sec)
+        return num_sent
+
+    def close(self):
+        os.close(self._master_fd)
+        os.close(self._slave_fd)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic gateway trace in the gateway_reference.ino format."
+    )
+    parser.add_argument("-f", "--filename", required=True, help="Output trace file")
+    parser.add_argument(
+        "-n", "--num_packets", type=int, default=10000, help="Number of transmissions"
+    )
+    parser.add_argument("--num_nodes", type=int, default=10, help="Number of nodes")
+    parser.add_argument(
+        "--packet_size_bytes", type=int, default=16, help="Payload size in bytes"
+    )
+    parser.add_argument("--seed", type=int, help="Random seed")
+
+    args = parser.parse_args()
+    transmitted = write_synthetic_trace(
+        args.filename,
+        args.num_packets,
+        num_nodes=args.num_nodes,
+        packet_size_bytes=args.packet_size_bytes,
+        seed=args.seed,
+    )
+    print(f"Transmitted packets per node: {transmitted}")
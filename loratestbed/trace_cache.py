@@ -0,0 +1,239 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Bump when the decoded trace layout changes, old entries then miss
+CACHE_FORMAT_VERSION = 2
+DEFAULT_MAX_SIZE_BYTES = 2 * 1024**3
+HASH_BLOCK_SIZE = 1024 * 1024
+ENTRY_PREFIX = "trace-"
+
+
+def default_cache_dir() -> str:
+    return os.environ.get(
+        "LORATESTBED_CACHE_DIR",
+        os.path.join(os.path.expanduser("~"), ".cache", "loratestbed"),
+    )
+
+
+def file_digest(filename: str) -> str:
+    digest = hashlib.sha1()
+    digest.update(f"v{CACHE_FORMAT_VERSION}".encode())
+    with open(filename, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load_array(path: str, name: str, mmap_mode=None):
+    return np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+
+
+class CachedTrace:
+    """Memory-mapped cache entry, packets clustered by NodeAddress
+
+    Rows are stored sorted by (NodeAddress, Counter) with a node index of row
+    ranges, so a per-node or per-counter-range query only reads the pages of
+    the matching rows. Queries return decoded, unfiltered packets and their
+    payload bytes, indexed like the rows of the full trace.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "columns.txt")) as f:
+            self.columns = f.read().split()
+        self._columns = {
+            name: _load_array(path, f"column-{name}", "r") for name in self.columns
+        }
+        self._payload_bytes = _load_array(path, "payload_bytes", "r")
+        self._index = _load_array(path, "index", "r")
+        # one (address, start, stop) row per node
+        self._node_rows = {
+            address: (start, stop)
+            for address, start, stop in _load_array(path, "node_index").tolist()
+        }
+
+    def __len__(self):
+        return len(self._index)
+
+    def node_addresses(self):
+        return list(self._node_rows)
+
+    def rows(self, start: int, stop: int):
+        packet_trace = pd.DataFrame(
+            {
+                name: np.asarray(values[start:stop])
+                for name, values in self._columns.items()
+            },
+            index=np.asarray(self._index[start:stop]),
+        )
+        packet_trace["Payload"] = packet_trace["Payload"].str.decode("ascii")
+        return packet_trace, np.asarray(self._payload_bytes[start:stop])
+
+    def node(self, address: int):
+        start, stop = self._node_rows.get(address, (0, 0))
+        return self.rows(start, stop)
+
+    def counter_range(self, address: int, first: int, last: int):
+        """Packets of one node with first <= Counter <= last"""
+        start, stop = self._node_rows.get(address, (0, 0))
+        counters = self._columns["Counter"][start:stop]
+        return self.rows(
+            start + int(np.searchsorted(counters, first, side="left")),
+            start + int(np.searchsorted(counters, last, side="right")),
+        )
+
+    def load(self):
+        # full trace back in capture order
+        rows = _load_array(self.path, "row")
+
+        def unsorted(name):
+            values = _load_array(self.path, name)
+            original = np.empty_like(values)
+            original[rows] = values
+            return original
+
+        columns = {name: unsorted(f"column-{name}") for name in self.columns}
+        columns["Payload"] = columns["Payload"].astype(str)
+        packet_trace = pd.DataFrame(columns, index=unsorted("index"))
+        return packet_trace, unsorted("payload_bytes")
+
+
+class TraceCache:
+    """Decoded gateway traces stored by the hash of the capture content
+
+    Each entry is a directory of .npy arrays: one per column, the decoded
+    payload matrix, the row index and the node index of CachedTrace. The
+    least recently used entries are evicted once the cache grows above
+    max_size_bytes.
+    """
+
+    def __init__(self, cache_dir: str = None, max_size_bytes: int = None):
+        if max_size_bytes is None:
+            max_size_bytes = int(
+                os.environ.get("LORATESTBED_CACHE_MAX_BYTES", DEFAULT_MAX_SIZE_BYTES)
+            )
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_size_bytes = max_size_bytes
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{ENTRY_PREFIX}{key}")
+
+    def open(self, key: str):
+        """Returns the memory-mapped CachedTrace or None on a miss"""
+        path = self._entry_path(key)
+        try:
+            cached_trace = CachedTrace(path)
+        except (OSError, ValueError):
+            return None
+        # hits count as use for eviction
+        os.utime(path)
+        return cached_trace
+
+    def load(self, key: str):
+        """Returns (packet_trace, payload_bytes) or None on a miss"""
+        cached_trace = self.open(key)
+        if cached_trace is None:
+            return None
+        return cached_trace.load()
+
+    def store(self, key: str, packet_trace: pd.DataFrame, payload_bytes: np.ndarray):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        node_address = packet_trace["NodeAddress"].to_numpy()
+        rows = np.lexsort((packet_trace["Counter"].to_numpy(), node_address))
+        addresses, starts, counts = np.unique(
+            node_address[rows], return_index=True, return_counts=True
+        )
+
+        arrays = {
+            f"column-{name}": packet_trace[name].to_numpy()[rows]
+            for name in packet_trace
+        }
+        # valid payloads are hex, so fixed width bytes instead of python objects
+        arrays["column-Payload"] = packet_trace["Payload"].to_numpy(dtype="S")[rows]
+        arrays["payload_bytes"] = payload_bytes[rows]
+        arrays["index"] = packet_trace.index.to_numpy()[rows]
+        arrays["row"] = rows
+        arrays["node_index"] = np.column_stack([addresses, starts, starts + counts])
+
+        # write then rename, readers never see a partial entry
+        tmp_path = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            for name, values in arrays.items():
+                np.save(os.path.join(tmp_path, f"{name}.npy"), values)
+            with open(os.path.join(tmp_path, "columns.txt"), "w") as f:
+                f.write("\n".join(packet_trace.columns))
+            os.rename(tmp_path, self._entry_path(key))
+        except OSError:
+            # another process stored the same trace first
+            if not os.path.isdir(self._entry_path(key)):
+                raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        # the new entry stays even if it alone is above max_size_bytes, the
+        # caller opens it next
+        self.evict(keep=[self._entry_path(key)])
+
+    def entries(self):
+        # (path, size, last use) of every entry, least recently used first.
+        # Files are trace-<key>.npz entries of format version 1, they never hit.
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.startswith(ENTRY_PREFIX):
+                    continue
+                # another process may evict the entry while it is listed
+                try:
+                    if entry.is_dir():
+                        size = sum(
+                            file.stat().st_size for file in os.scandir(entry.path)
+                        )
+                    else:
+                        size = entry.stat().st_size
+                    entries.append((entry.path, size, entry.stat().st_mtime))
+                except FileNotFoundError:
+                    continue
+        return sorted(entries, key=lambda entry: entry[2])
+
+    @staticmethod
+    def _remove(path: str):
+        # another process may remove the same entry at the same time
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self, keep=()):
+        """Removes version 1 files, then least recently used entries not in keep"""
+        entries = []
+        for path, size, last_use in self.entries():
+            if os.path.isdir(path):
+                entries.append((path, size, last_use))
+            else:
+                logger.debug(f"Removing cache file of an old format {path}")
+                self._remove(path)
+        total_size = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            if path in keep:
+                continue
+            logger.debug(f"Evicting cached trace {path}")
+            self._remove(path)
+            total_size -= size
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            self._remove(path)
@@ -0,0 +1,155 @@
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# the active Tracer, None while tracing is off
+_tracer = None
+
+
+class Tracer:
+    """Collects spans as Chrome trace events (complete "X" events, times in us)"""
+
+    def __init__(self):
+        self.events = []
+        # perf_counter for durations, shifted to wall time so traces of
+        # several processes line up
+        self._offset_us = time.time() * 1e6 - time.perf_counter() * 1e6
+        self._thread_names = {}
+
+    def now_us(self) -> float:
+        return time.perf_counter() * 1e6 + self._offset_us
+
+    def add(self, name: str, start_us: float, end_us: float, args: dict = None):
+        thread = threading.current_thread()
+        self._thread_names.setdefault(thread.ident, thread.name)
+        event = {
+            "name": name,
+            "cat": name.split(".", 1)[0],
+            "ph": "X",
+            "ts": start_us,
+            "dur": end_us - start_us,
+            "pid": os.getpid(),
+            "tid": thread.ident,
+        }
+        if args:
+            event["args"] = args
+        # list.append is atomic, spans of every thread go to the same list
+        self.events.append(event)
+
+    def chrome_trace(self) -> dict:
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "tid": tid,
+                "args": {"name": thread_name},
+            }
+            for tid, thread_name in self._thread_names.items()
+        ]
+        return {"traceEvents": metadata + self.events, "displayTimeUnit": "ms"}
+
+    def write(self, filename: str):
+        with open(filename, "w") as f:
+            json.dump(self.chrome_trace(), f, default=str)
+        logger.info(f"Saved trace of {len(self.events)} spans to {filename}")
+
+
+class _Span:
+    __slots__ = ("_tracer", "_name", "_args", "_start_us")
+
+    def __init__(self, tracer: Tracer, name: str, args: dict):
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+
+    def __enter__(self):
+        self._start_us = self._tracer.now_us()
+        return self
+
+    def set(self, **args):
+        """Adds arguments known only inside the span, e.g. a result size"""
+        self._args.update(args)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._args["error"] = repr(exc_value)
+        self._tracer.add(self._name, self._start_us, self._tracer.now_us(), self._args)
+        return False
+
+
+class _NullSpan:
+    # what span() returns while tracing is off, one shared instance
+    def __enter__(self):
+        return self
+
+    def set(self, **args):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **args):
+    """Context manager timing a block as one span, a no-op while tracing is off"""
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Span(_tracer, name, args)
+
+
+def traced(name: str = None):
+    """Decorator timing every call of a function as one span"""
+
+    def decorator(func):
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _Span(_tracer, span_name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def enable_tracing() -> Tracer:
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def disable_tracing():
+    """Stops tracing, returns the tracer with the collected spans"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+@contextlib.contextmanager
+def tracing_to(filename: str = None):
+    """Traces the block and writes a Chrome trace, also if the block fails
+
+    Does nothing without a filename, so CLIs can pass an optional --trace.
+    Open the file in chrome://tracing or https://ui.perfetto.dev.
+    """
+    if filename is None:
+        yield None
+        return
+    tracer = enable_tracing()
+    try:
+        yield tracer
+    finally:
+        disable_tracing()
+        tracer.write(filename)
@@ -1,5 +1,8 @@
+import functools
 import math
 
+import numpy as np
+
 
 def uint8_to_bytes(value: int) -> bytes:
     # assert value >= 0 and value <= 255
@@ -42,40 +45,140 @@ def comp_lora_airtime(PL, SF, CRC, IH, DE, CR, SR, NS):
     return air_time
 
 
+# PHY settings the device firmware accepts
+LORA_SF_VALUES = np.arange(7, 13)
+LORA_BW_HZ_VALUES = np.array([125000, 250000, 500000])
+LORA_CR_VALUES = np.arange(1, 5)  # 1 is 4/5 ... 4 is 4/8
+LORA_MAX_PAYLOAD_BYTES = 255
+LORA_PREAMBLE_SYMBOLS = 8
+
+
+def lora_airtime(
+    payload_bytes,
+    sf,
+    bw_hz,
+    cr,
+    crc=1,
+    implicit_header=0,
+    low_data_rate=None,
+    preamble_symbols=LORA_PREAMBLE_SYMBOLS,
+):
+    """Vectorized LoRa airtime in seconds (SX1276 datasheet), arguments broadcast
+
+    cr is 1 for 4/5 up to 4 for 4/8. low_data_rate=None enables it like the
+    firmware (LMIC) does: for SF11 and SF12 at 125 kHz.
+    """
+    payload_bytes, sf, bw_hz, cr, crc, implicit_header = np.broadcast_arrays(
+        *(
+            np.asarray(arg)
+            for arg in (payload_bytes, sf, bw_hz, cr, crc, implicit_header)
+        )
+    )
+    if low_data_rate is None:
+        low_data_rate = (sf >= 11) & (bw_hz == 125000)
+    low_data_rate = np.asarray(low_data_rate, dtype=np.int64)
+
+    numerator = 8 * payload_bytes - 4 * sf + 28 + 16 * crc - 20 * implicit_header
+    payload_symbols = 8 + np.maximum(
+        np.ceil(numerator / (4 * (sf - 2 * low_data_rate))) * (cr + 4), 0
+    )
+    symbol_time = 2.0**sf / bw_hz
+    return (preamble_symbols + 4.25 + payload_symbols) * symbol_time
+
+
+@functools.lru_cache(maxsize=None)
+def lora_airtime_table():
+    """Airtime of every setting the firmware accepts
+
+    Indexed [payload_bytes, SF - 7, BW index, CR - 1, CRC, implicit header,
+    low data rate], built once and reused.
+    """
+    return lora_airtime(
+        np.arange(LORA_MAX_PAYLOAD_BYTES + 1)[:, None, None, None, None, None, None],
+        LORA_SF_VALUES[None, :, None, None, None, None, None],
+        LORA_BW_HZ_VALUES[None, None, :, None, None, None, None],
+        LORA_CR_VALUES[None, None, None, :, None, None, None],
+        np.arange(2)[None, None, None, None, :, None, None],
+        np.arange(2)[None, None, None, None, None, :, None],
+        np.arange(2)[None, None, None, None, None, None, :],
+    )
+
+
+def lookup_lora_airtime(
+    payload_bytes, sf, bw_hz, cr, crc=1, implicit_header=0, low_data_rate=None
+):
+    """lora_airtime from the precomputed table, for many configurations at once"""
+    payload_bytes, sf, bw_hz, cr, crc, implicit_header = np.broadcast_arrays(
+        *(
+            np.asarray(arg)
+            for arg in (payload_bytes, sf, bw_hz, cr, crc, implicit_header)
+        )
+    )
+    bw_idx = np.searchsorted(LORA_BW_HZ_VALUES, bw_hz)
+    valid_bw = (
+        LORA_BW_HZ_VALUES[np.minimum(bw_idx, len(LORA_BW_HZ_VALUES) - 1)] == bw_hz
+    )
+    for name, values, low, high in [
+        ("payload size", payload_bytes, 0, LORA_MAX_PAYLOAD_BYTES),
+        ("SF", sf, LORA_SF_VALUES[0], LORA_SF_VALUES[-1]),
+        ("CR", cr, LORA_CR_VALUES[0], LORA_CR_VALUES[-1]),
+    ]:
+        if np.any((values < low) | (values > high)):
+            raise ValueError(f"Invalid {name} value(s), must be in [{low}, {high}]")
+    if not np.all(valid_bw):
+        raise ValueError(f"Invalid BW value(s), must be one of {LORA_BW_HZ_VALUES}")
+
+    if low_data_rate is None:
+        low_data_rate = (sf >= 11) & (bw_hz == 125000)
+    return lora_airtime_table()[
+        payload_bytes,
+        sf - LORA_SF_VALUES[0],
+        bw_idx,
+        cr - 1,
+        crc,
+        implicit_header,
+        np.asarray(low_data_rate, dtype=np.int64),
+    ]
+
+
+def parse_sf(sf_str: str) -> int:
+    return int(sf_str.upper()[2:])
+
+
+def parse_bw_hz(bw_str: str) -> int:
+    return int(float(bw_str.upper()[2:]) * 1000)
+
+
+def parse_cr(cr_str: str) -> int:
+    # "CR_4_5" ... "CR_4_8" to 1 ... 4
+    cr_values = {"CR_4_5": 1, "CR_4_6": 2, "CR_4_7": 3, "CR_4_8": 4}
+    if cr_str.upper() not in cr_values:
+        raise ValueError(f"Invalid CR value {cr_str}")
+    return cr_values[cr_str.upper()]
+
+
 def compute_packet_time(payload_bytes: int, sf_str: str, bw_str: str, cr_str: str):
-    """_summary_
+    """Airtime in seconds of one packet with the firmware's PHY settings
 
     Args:
-        payload_bytes (int): _description_
-        sf (int): _description_
-        bw_str (str): _description_
-        cr_str (str): _description_
+        payload_bytes (int): payload size in bytes
+        sf_str (str): spreading factor, "SF7" ... "SF12"
+        bw_str (str): bandwidth, "BW125", "BW250" or "BW500"
+        cr_str (str): code rate, "CR_4_5" ... "CR_4_8"
 
     Raises:
-        ValueError: _description_
+        ValueError: for settings the firmware does not accept
 
     Returns:
-        _type_: _description_
+        float: airtime with explicit header, CRC on and low data rate
+        optimization as set by the firmware
     """
-    bw_khz: float = float(bw_str[2:])
-    sf_int: int = int(sf_str[2:])
-
-    if cr_str == "CR_4_8":
-        cr: int = 4
-    elif cr_str == "CR_4_5":
-        cr: int = 1
-    else:
-        raise ValueError(f"Invalid CR value {cr_str}")
-
-    num_samples_per_chirp: int = 2**sf_int
-    sampling_rate: float = bw_khz * 1000
-
-    packet_time_sec: float = comp_lora_airtime(
-        payload_bytes, sf_int, 1, 0, 0, cr, sampling_rate, num_samples_per_chirp
+    return float(
+        lookup_lora_airtime(
+            payload_bytes, parse_sf(sf_str), parse_bw_hz(bw_str), parse_cr(cr_str)
+        )
     )
 
-    return packet_time_sec
-
 
 def get_transmit_interval_msec(
     num_devices: int,
@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def trace_cache_dir(tmp_path, monkeypatch):
+    # keep the decoded trace cache out of the home directory
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("LORATESTBED_CACHE_DIR", str(cache_dir))
+    return cache_dir
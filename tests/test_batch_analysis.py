@@ -0,0 +1,105 @@
+import os
+import shutil
+from datetime import datetime
+
+import pandas as pd
+import pytest
+import yaml
+
+from loratestbed.batch_analysis import batch_analyze, select_logbook_entries
+from loratestbed.experiment_logbook import logbook_add_entry
+from loratestbed.metrics import (
+    compute_experiment_results,
+    extract_required_metrics_from_trace,
+    read_packet_trace,
+)
+
+FULLPATH = os.path.dirname(os.path.abspath(__file__))
+
+CONFIG = {
+    "experiment_time_sec": 10,
+    "offered_load_percent": 60,
+    "packet_size_bytes": 16,
+    "packet_airtime_sec": 0.1,
+    "device_list": [28, 34],
+}
+
+
+def _archive_run(results_folder, logbook_file, timestamp, expt_name, mac_protocol):
+    controller_df = pd.read_csv(
+        FULLPATH + "/data/contoller_test.csv",
+        names=["NodeAddress", "TransmittedPackets", "BackoffCounter", "LBTCounter"],
+    )
+    gateway_filename = f"{results_folder}/gateway-{timestamp}.csv"
+    shutil.copy(FULLPATH + "/data/gateway_test.csv", gateway_filename)
+    config_filename = f"{results_folder}/config-{timestamp}.yaml"
+    config = dict(CONFIG, mac_protocol=mac_protocol)
+    with open(config_filename, "w") as f:
+        yaml.dump(config, f)
+
+    node_metrics_df = extract_required_metrics_from_trace(
+        read_packet_trace(gateway_filename), controller_df
+    )
+    results_filename = f"{results_folder}/results-{timestamp}.pkl"
+    compute_experiment_results(node_metrics_df, **CONFIG).to_pickle(results_filename)
+    logbook_add_entry(
+        logbook_file,
+        {
+            "date_time_str": timestamp,
+            "expt_name": expt_name,
+            "expt_version": 1.0,
+            "experiment_time_sec": 10,
+            "controller_filename": results_filename,
+            "gateway_filename": gateway_filename,
+            "metadata_filename": config_filename,
+            "logbook_message": "",
+        },
+        config,
+    )
+    return controller_df
+
+
+@pytest.mark.parametrize(
+    "logbook_name", ["experiment_logbook.sqlite", "experiment_logbook.csv"]
+)
+def test_batch_analyze_selected_runs(tmp_path, logbook_name):
+    results_folder = str(tmp_path)
+    logbook_file = f"{results_folder}/{logbook_name}"
+    controller_df = _archive_run(
+        results_folder, logbook_file, "20240101-100000", "sweep-1", "csma"
+    )
+    controller_df.to_csv(
+        f"{results_folder}/controller-20240101-100000.csv", index=False
+    )
+    # older run without the controller csv, counts come from the results pickle
+    _archive_run(results_folder, logbook_file, "20240102-100000", "sweep-2", "aloha")
+    _archive_run(results_folder, logbook_file, "20240103-100000", "other", "csma")
+
+    entries = select_logbook_entries(logbook_file, name="sweep-*")
+    assert [entry["expt_name"] for entry in entries] == ["sweep-1", "sweep-2"]
+    entries = select_logbook_entries(
+        logbook_file,
+        end=datetime(2024, 1, 2, 12),
+        config_filters={"mac_protocol": "csma"},
+    )
+    assert [entry["expt_name"] for entry in entries] == ["sweep-1"]
+
+    results_df = batch_analyze(select_logbook_entries(logbook_file), max_workers=2)
+    assert results_df["timestamp"].unique().tolist() == [
+        "20240101-100000",
+        "20240102-100000",
+        "20240103-100000",
+    ]
+    assert results_df.groupby("timestamp")["mac_protocol"].first().tolist() == [
+        "csma",
+        "aloha",
+        "csma",
+    ]
+
+    # same trace, the counts from the pickle give the same metrics
+    metric_columns = ["node_indices", "total_packets", "packet_reception_ratio"]
+    run_results = [run_df for _, run_df in results_df.groupby("timestamp")]
+    pd.testing.assert_frame_equal(
+        run_results[0][metric_columns].reset_index(drop=True),
+        run_results[1][metric_columns].reset_index(drop=True),
+    )
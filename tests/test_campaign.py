@@ -0,0 +1,165 @@
+import itertools
+import os
+import shutil
+import types
+
+import pytest
+
+from loratestbed import sweep
+from loratestbed.campaign import CampaignState
+from loratestbed.experiment_logbook import query_logbook
+from loratestbed.metrics import read_packet_trace
+from loratestbed.sweep import _EchoInterface, expand_grid, order_runs, run_sweep
+
+TEST_TRACE_FILENAME = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "test_packet_trace.csv"
+)
+BASE_CONFIG = {
+    "device_list": [33, 26],
+    "experiment_time_sec": 10,
+    "offered_load_percent": 80,
+    "packet_size_bytes": 16,
+    "mac_protocol": "aloha",
+    "packet_arrival_model": "poisson",
+    "transmit_SF": "SF8",
+    "receive_SF": "SF8",
+    "transmit_BW": "BW125",
+    "receive_BW": "BW125",
+    "transmit_CR": "CR_4_8",
+    "receive_CR": "CR_4_8",
+}
+GRID = {"mac_protocol": ["aloha", "csma"], "offered_load_percent": [20, 80]}
+
+
+class FakeRecorder:
+    def __init__(self):
+        self.num_runs = 0
+
+    def start_run(self, filename):
+        self.num_runs += 1
+        shutil.copy(TEST_TRACE_FILENAME, filename)
+
+    def stop_run(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _no_hardware(port):
+    raise AssertionError("the hardware is not needed")
+
+
+@pytest.fixture
+def testbed(tmp_path, monkeypatch):
+    """Sweep hardware replaced by a recorder that copies a trace"""
+    monkeypatch.chdir(tmp_path)
+    packet_trace = read_packet_trace(TEST_TRACE_FILENAME)
+    result_df = (
+        packet_trace.groupby("NodeAddress")["Counter"].max().add(1).reset_index()
+    ).rename(columns={"Counter": "TransmittedPackets"})
+    recorder = FakeRecorder()
+    failures = {"read_results": set(), "analyze_run": set()}
+    calls = {"read_results": 0, "analyze_run": 0}
+
+    def read_results(device_manager, config):
+        calls["read_results"] += 1
+        if calls["read_results"] in failures["read_results"]:
+            raise AssertionError("Not all devices responded to ping")
+        return result_df
+
+    analyze_run = sweep.analyze_run
+
+    def failing_analyze_run(*args):
+        calls["analyze_run"] += 1
+        if calls["analyze_run"] in failures["analyze_run"]:
+            raise ValueError("analysis crashed")
+        return analyze_run(*args)
+
+    # one run time per capture, runs here finish within the same second
+    run_times = (f"20240101-{second:06d}" for second in itertools.count())
+    monkeypatch.setattr(
+        sweep, "time", types.SimpleNamespace(strftime=lambda fmt: next(run_times))
+    )
+    monkeypatch.setattr(sweep, "GatewayRecorder", lambda port: recorder)
+    monkeypatch.setattr(sweep, "SerialInterface", lambda port: _EchoInterface())
+    monkeypatch.setattr(sweep, "wait_for_experiment", lambda config: None)
+    monkeypatch.setattr(sweep, "read_results", read_results)
+    monkeypatch.setattr(sweep, "analyze_run", failing_analyze_run)
+    return recorder, failures, calls
+
+
+def test_campaign_state_checks_configs(tmp_path):
+    configs = expand_grid(BASE_CONFIG, GRID)
+    state = CampaignState(str(tmp_path), configs, "sweep")
+    state.set_phase(2, "captured", current_time="20240101-000000")
+
+    resumed = CampaignState(str(tmp_path), configs, "sweep")
+    assert resumed.phase(2) == "captured"
+    assert resumed.completed(2, "triggered")
+    assert not resumed.completed(2, "results_read")
+    assert resumed.run(2)["current_time"] == "20240101-000000"
+    assert resumed.remaining() == [0, 1, 2, 3]
+    with pytest.raises(ValueError):
+        CampaignState(str(tmp_path), configs[:2], "sweep")
+
+
+def test_resume_after_failed_read_does_not_capture_again(
+    tmp_path, monkeypatch, testbed
+):
+    recorder, failures, calls = testbed
+    configs = expand_grid(BASE_CONFIG, GRID)
+    order, _ = order_runs(configs)
+    campaign_dir = str(tmp_path / "campaign")
+    # ping of the third run fails after its capture
+    failures["read_results"].add(3)
+
+    with pytest.raises(AssertionError):
+        run_sweep("gw", "ctrl", configs, pipeline_depth=1, campaign_dir=campaign_dir)
+    state = CampaignState(campaign_dir, configs)
+    assert [state.phase(point) for point in order] == [
+        "logged",
+        "logged",
+        "captured",
+        "pending",
+    ]
+    assert recorder.num_runs == 3
+
+    run_sweep("gw", "ctrl", configs, pipeline_depth=1, campaign_dir=campaign_dir)
+    # the third run only read its results again
+    assert recorder.num_runs == 4
+    assert calls["read_results"] == 5
+    assert CampaignState(campaign_dir, configs).remaining() == []
+    logbook = query_logbook("results/experiment_logbook.sqlite")
+    assert logbook["expt_name"].tolist() == [f"sweep-{point:03d}" for point in order]
+    assert not [name for name in os.listdir(campaign_dir) if name.startswith("run-")]
+
+    # nothing left to do, the ports are not opened
+    monkeypatch.setattr(sweep, "GatewayRecorder", _no_hardware)
+    run_sweep("gw", "ctrl", configs, campaign_dir=campaign_dir)
+    assert len(query_logbook("results/experiment_logbook.sqlite")) == len(configs)
+
+
+def test_failed_analysis_is_redone_without_hardware(tmp_path, monkeypatch, testbed):
+    recorder, failures, calls = testbed
+    configs = expand_grid(BASE_CONFIG, GRID)
+    campaign_dir = str(tmp_path / "campaign")
+    failures["analyze_run"].add(2)
+
+    run_sweep("gw", "ctrl", configs, pipeline_depth=2, campaign_dir=campaign_dir)
+    state = CampaignState(campaign_dir, configs)
+    assert len(state.remaining()) == 1
+    assert state.phase(state.remaining()[0]) == "results_read"
+
+    monkeypatch.setattr(sweep, "GatewayRecorder", _no_hardware)
+    run_sweep("gw", "ctrl", configs, pipeline_depth=2, campaign_dir=campaign_dir)
+    assert recorder.num_runs == len(configs)
+    assert calls["analyze_run"] == len(configs) + 1
+    assert CampaignState(campaign_dir, configs).remaining() == []
+
+
+def test_temporary_campaign_is_removed(tmp_path, monkeypatch, testbed):
+    monkeypatch.setattr(sweep.tempfile, "tempdir", str(tmp_path))
+    run_sweep("gw", "ctrl", expand_grid(BASE_CONFIG, GRID), pipeline_depth=0)
+    assert not list(tmp_path.glob("sweep-*"))
+    assert len(query_logbook("results/experiment_logbook.sqlite")) == 4
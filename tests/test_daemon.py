@@ -0,0 +1,109 @@
+import os
+import threading
+
+import pytest
+import yaml
+
+from loratestbed import controller, sweep
+from loratestbed.daemon import HardwareRunner, JobQueue, run_pending, serve
+
+EXAMPLE_CONFIG_FILENAME = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "configs", "example.yaml"
+)
+
+
+def test_jobs_run_by_priority_then_fifo(tmp_path):
+    queue = JobQueue(tmp_path)
+    low = queue.submit({"experiment_time_sec": 1}, "low")
+    first = queue.submit({"experiment_time_sec": 1}, "first", priority=5)
+    second = queue.submit({"experiment_time_sec": 1}, "second", priority=5)
+    assert [job["job_id"] for job in queue.queued_jobs()] == [first, second, low]
+
+    order = []
+
+    def run_job(job, report):
+        report("running experiment")
+        assert queue.status(job["job_id"])["stage"] == "running experiment"
+        order.append(job["experiment_name"])
+        return {"total_normalized_throughput": 0.5}
+
+    assert run_pending(queue, run_job) == 3
+    assert order == ["first", "second", "low"]
+    status = queue.status(first)
+    assert status["state"] == "done"
+    assert status["results"]["total_normalized_throughput"] == 0.5
+    assert status["finished_at"] >= status["started_at"]
+
+
+def test_failed_and_cancelled_jobs(tmp_path):
+    queue = JobQueue(tmp_path)
+    failing = queue.submit({}, "failing")
+    cancelled = queue.submit({}, "cancelled")
+    assert queue.cancel(cancelled)
+    assert not queue.cancel(cancelled)
+
+    def run_job(job, report):
+        raise ValueError("no devices")
+
+    assert run_pending(queue, run_job) == 1
+    assert queue.status(failing)["state"] == "failed"
+    assert queue.status(failing)["error"] == "no devices"
+    assert (tmp_path / "failed" / f"{failing}.json").exists()
+    assert queue.status(cancelled)["state"] == "cancelled"
+
+
+def test_interrupted_jobs_fail_on_restart(tmp_path):
+    queue = JobQueue(tmp_path)
+    job_id = queue.submit({}, "interrupted")
+    queue.take_next()
+    queue.recover()
+    assert queue.status(job_id)["state"] == "failed"
+    assert not list((tmp_path / "running").iterdir())
+
+
+def test_wait_follows_served_job(tmp_path):
+    queue = JobQueue(tmp_path)
+    daemon = threading.Thread(
+        target=serve,
+        args=(JobQueue(tmp_path), lambda job, report: {"ok": True}, 0.05),
+        daemon=True,
+    )
+    daemon.start()
+    job_id = queue.submit({}, "served")
+    status = queue.wait(job_id, poll_interval_sec=0.05, timeout=5)
+    assert status["state"] == "done"
+    assert status["results"] == {"ok": True}
+
+
+def test_wait_times_out_without_daemon(tmp_path):
+    queue = JobQueue(tmp_path)
+    job_id = queue.submit({}, "never run")
+    with pytest.raises(TimeoutError):
+        queue.wait(job_id, poll_interval_sec=0.01, timeout=0.05)
+
+
+@pytest.mark.parametrize("keep_register_cache", [False, True])
+def test_register_cache_between_jobs(monkeypatch, keep_register_cache):
+    monkeypatch.setattr(controller, "SerialInterface", lambda port: None)
+    monkeypatch.setattr(sweep, "GatewayRecorder", lambda port: None)
+    runner = HardwareRunner("gateway", "controller", keep_register_cache)
+    with open(EXAMPLE_CONFIG_FILENAME, "r") as f:
+        config = yaml.safe_load(f)
+    device_list = config["device_list"]
+
+    device_manager = runner._device_manager(device_list)
+    device_manager._known_registers[:] = True
+    assert runner._device_manager(device_list) is device_manager
+    assert device_manager._known_registers.all() == keep_register_cache
+
+    # a failed job drops the cache either way
+    device_manager._known_registers[:] = True
+    monkeypatch.setattr(sweep, "run_point", _fail_ping)
+    with pytest.raises(AssertionError):
+        job = {"config": config, "experiment_name": "test", "logbook_message": ""}
+        runner(job, lambda stage: None)
+    assert not runner._device_manager(device_list)._known_registers.any()
+
+
+def _fail_ping(device_manager, *args):
+    raise AssertionError("Not all devices responded to ping")
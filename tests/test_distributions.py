@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from loratestbed.distributions import (
+    group_value_arrays,
+    grouped_histograms,
+    histogram_quantiles,
+    merged_quantiles,
+)
+
+
+def test_histogram_quantiles_match_numpy():
+    rng = np.random.default_rng(0)
+    values = rng.integers(-20, 30, 1000)
+    codes = rng.integers(0, 3, 1000)
+    histograms = grouped_histograms(values, codes, 4)
+    quantiles = [0.05, 0.5, 0.95]
+
+    result = histogram_quantiles(histograms, quantiles)
+    for code in range(3):
+        expected = np.quantile(values[codes == code], quantiles, method="inverted_cdf")
+        assert np.array_equal(result[code], expected)
+    # group without samples
+    assert np.isnan(result[3]).all()
+
+
+def test_group_value_arrays_keep_arrival_order():
+    values = np.array([5, -3, 7, 1, 2])
+    codes = np.array([1, 0, 1, -1, 0])
+    arrays = group_value_arrays(values, codes, 2, np.int8)
+    assert [array.tolist() for array in arrays] == [[-3, 2], [5, 7]]
+    assert arrays[0].dtype == np.int8
+
+
+def test_merged_quantiles_across_runs():
+    histograms = grouped_histograms([1, 2, 3, 10, 11, 12], [0, 0, 0, 1, 1, 2], 3)
+    results_df = pd.DataFrame(
+        {"mac_protocol": ["csma", "csma", "aloha"], "snr_hist": list(histograms)}
+    )
+    quantiles = merged_quantiles(results_df, "mac_protocol", quantiles=[0.5, 1.0])
+    assert quantiles.loc["csma"].tolist() == [3.0, 11.0]
+    assert quantiles.loc["aloha"].tolist() == [12.0, 12.0]
@@ -0,0 +1,135 @@
+import os
+import threading
+from datetime import datetime
+
+import pytest
+
+from loratestbed.experiment_logbook import (
+    import_csv_logbook,
+    logbook_add_entry,
+    logbook_load_entry,
+    query_logbook,
+)
+
+
+def _expt_params(timestamp, expt_name):
+    return {
+        "date_time_str": timestamp,
+        "expt_name": expt_name,
+        "expt_version": 1.0,
+        "experiment_time_sec": 10,
+        "controller_filename": f"results/results-{timestamp}.pkl",
+        "gateway_filename": f"results/gateway-{timestamp}.csv",
+        "metadata_filename": f"results/config-{timestamp}.yaml",
+        "logbook_message": "",
+    }
+
+
+def test_query_by_name_time_and_config(tmp_path):
+    logbook_file = str(tmp_path / "logbook.sqlite")
+    runs = [
+        (
+            "20240101-100000",
+            "sweep-1",
+            {"mac_protocol": "csma", "offered_load_percent": 20},
+        ),
+        (
+            "20240102-100000",
+            "sweep-2",
+            {"mac_protocol": "aloha", "offered_load_percent": 40.0},
+        ),
+        (
+            "20240103-100000",
+            "other",
+            {"mac_protocol": "csma", "offered_load_percent": 40},
+        ),
+    ]
+    for timestamp, expt_name, config in runs:
+        logbook_add_entry(logbook_file, _expt_params(timestamp, expt_name), config)
+
+    assert query_logbook(logbook_file)["expt_name"].tolist() == [
+        "sweep-1",
+        "sweep-2",
+        "other",
+    ]
+    assert query_logbook(logbook_file, name="sweep-*")["timestamp"].tolist() == [
+        "20240101-100000",
+        "20240102-100000",
+    ]
+    entries = query_logbook(
+        logbook_file,
+        start=datetime(2024, 1, 2),
+        config_filters={"offered_load_percent": 40},
+    )
+    assert entries["expt_name"].tolist() == ["sweep-2", "other"]
+    entries = query_logbook(logbook_file, config_filters={"mac_protocol": "csma"})
+    assert entries["expt_name"].tolist() == ["sweep-1", "other"]
+
+    entry, entries = logbook_load_entry(logbook_file, -1, name="sweep-*")
+    assert entry["expt_name"] == "sweep-2"
+    assert len(entries) == 2
+
+
+def test_concurrent_writers_do_not_lose_entries(tmp_path):
+    logbook_file = str(tmp_path / "logbook.sqlite")
+    logbook_add_entry(logbook_file, _expt_params("20240101-000000", "first"))
+
+    def add_entries(writer):
+        for run in range(20):
+            logbook_add_entry(
+                logbook_file,
+                _expt_params(f"20240101-{writer:02d}{run:04d}", f"writer-{writer}"),
+                {"run": run},
+            )
+
+    threads = [
+        threading.Thread(target=add_entries, args=(writer,)) for writer in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(query_logbook(logbook_file)) == 81
+    assert len(query_logbook(logbook_file, config_filters={"run": 3})) == 4
+
+
+def test_import_csv_logbook(tmp_path):
+    csv_file = str(tmp_path / "logbook.csv")
+    config_filename = tmp_path / "config-20240101-100000.yaml"
+    config_filename.write_text("mac_protocol: csma\n")
+    params = _expt_params("20240101-100000", "old-run")
+    params["metadata_filename"] = str(config_filename)
+    logbook_add_entry(csv_file, params)
+    # metadata file is gone, the entry is imported without config fields
+    logbook_add_entry(csv_file, _expt_params("20240102-100000", "older-run"))
+
+    logbook_file = str(tmp_path / "logbook.sqlite")
+    assert import_csv_logbook(logbook_file, csv_file) == 2
+    assert import_csv_logbook(logbook_file, csv_file) == 0
+    entries = query_logbook(logbook_file)
+    assert entries["timestamp"].tolist() == ["20240101-100000", "20240102-100000"]
+    entries = query_logbook(logbook_file, config_filters={"mac_protocol": "csma"})
+    assert entries["expt_name"].tolist() == ["old-run"]
+
+
+def test_queries_do_not_create_logbooks(tmp_path):
+    logbook_file = str(tmp_path / "typo.sqlite")
+    with pytest.raises(FileNotFoundError):
+        query_logbook(logbook_file)
+    assert logbook_load_entry(logbook_file) is None
+    assert not os.path.exists(logbook_file)
+
+
+def test_load_entry_filters_csv_logbook(tmp_path):
+    csv_file = str(tmp_path / "logbook.csv")
+    logbook_add_entry(csv_file, _expt_params("20240101-100000", "sweep-1"))
+    logbook_add_entry(csv_file, _expt_params("20240102-100000", "sweep-2"))
+    logbook_add_entry(csv_file, _expt_params("20240103-100000", "other"))
+
+    entry, entries = logbook_load_entry(csv_file, 0, name="sweep-*")
+    assert entries["expt_name"].tolist() == ["sweep-1", "sweep-2"]
+    entry, entries = logbook_load_entry(csv_file, 0, start=datetime(2024, 1, 2))
+    assert entry["expt_name"] == "sweep-2"
+    with pytest.raises(ValueError):
+        logbook_load_entry(csv_file, config_filters={"mac_protocol": "csma"})
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+
+from loratestbed.gateway_parser import GatewayLineParser, parse_gateway_buffer
+
+FULLPATH = "/".join(os.path.abspath(__file__).split("/")[:-1])
+FULL_PATH_FILENAME: str = FULLPATH + "/data/test_packet_trace.csv"
+
+
+def test_parse_gateway_buffer():
+    parsed = parse_gateway_buffer(
+        b"Hi, this is gateway rx\n"
+        b"21050100000000000000000000000000, -9, 28, 0\r\n"
+        b"1A0000000, -100, -3, 1\n"
+        b"FF0A, -61, -33, 0\n"
+        b"ZZ000000, 1, 1, 0\n"
+        b"21000000, 1-2, 1, 0\n"
+    )
+    assert len(parsed) == 2
+    assert parsed.num_malformed == 4
+    assert parsed.node_address.tolist() == [33, 1]
+    assert parsed.counter.tolist() == [261, 0xA0]
+    assert parsed.rssi.tolist() == [-9, -100]
+    assert parsed.snr.tolist() == [28, -3]
+    assert parsed.crc_status.tolist() == [0, 1]
+    assert parsed.payload_length.tolist() == [16, 5]
+    # odd length payloads get a leading zero nibble
+    assert parsed.payload[1, :5].tolist() == [0x01, 0xA0, 0x00, 0x00, 0x00]
+
+
+def test_parser_rejects_split_numbers_and_long_payloads():
+    padding = b"00" * 96
+    parsed = parse_gateway_buffer(
+        b"21000000, 1 2, 1, 0\n"
+        b"21010000, - 5, 1, 0\n"
+        b"21020000,  -5 , 7\r, 0\n"
+        b"21030000" + padding + b", -9, 28, 0\n"
+        b"21040000" + padding + b", -9, 28, 0\n"
+    )
+    assert parsed.counter.tolist() == [2, 3, 4]
+    assert parsed.rssi.tolist() == [-5, -9, -9]
+    assert parsed.num_malformed == 2
+    # 100 byte payloads come out whole
+    assert parsed.payload_length.tolist() == [4, 100, 100]
+    assert parsed.payload.shape[1] == 100
+
+    # over max_payload_bytes the line is malformed rather than cut
+    parsed = parse_gateway_buffer(b"21000000" + padding + b", 1, 1, 0\n", 64)
+    assert len(parsed) == 0
+    assert parsed.num_malformed == 1
+
+
+def test_parser_matches_text_parsing():
+    with open(FULL_PATH_FILENAME, "rb") as f:
+        data = f.read()
+    parsed = parse_gateway_buffer(data)
+
+    lines = data.decode().splitlines()
+    assert len(parsed) == len(lines)
+    for idx, line in enumerate(lines):
+        payload_hex, rssi, snr, crc_status = line.split(",")
+        payload = bytes.fromhex(payload_hex)
+        assert parsed.payload[idx, : len(payload)].tobytes() == payload
+        assert parsed.rssi[idx] == int(rssi)
+        assert parsed.snr[idx] == int(snr)
+        assert parsed.crc_status[idx] == int(crc_status)
+
+
+def test_parser_handles_partial_lines():
+    with open(FULL_PATH_FILENAME, "rb") as f:
+        data = f.read()
+    expected = parse_gateway_buffer(data)
+
+    parser = GatewayLineParser()
+    chunks = [
+        parser.feed(data[start : start + 37]) for start in range(0, len(data), 37)
+    ]
+    chunks.append(parser.flush())
+    counter = np.concatenate([chunk.counter for chunk in chunks])
+    rssi = np.concatenate([chunk.rssi for chunk in chunks])
+
+    assert np.array_equal(counter, expected.counter)
+    assert np.array_equal(rssi, expected.rssi)
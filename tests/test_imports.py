@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# analysis and debugging modules the entry points import only when used
+DEFERRED_MODULES = ["pandas", "matplotlib", "tabulate", "pdb"]
+
+
+def _loaded_modules(module: str, names):
+    # which of names a fresh interpreter has loaded after importing module
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import sys, {module}; "
+            f"print(' '.join(m for m in {list(names)!r} if m in sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=REPO_ROOT,
+        env=dict(os.environ, PYTHONPATH=REPO_ROOT),
+    )
+    return result.stdout.split()
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "loratestbed.main_gateway",
+        "loratestbed.main_controller",
+        "loratestbed.run_testbed",
+        "loratestbed.experiment_logbook",
+        "loratestbed.daemon",
+        "loratestbed.replay",
+    ],
+)
+def test_entry_points_defer_heavy_imports(module):
+    assert _loaded_modules(module, DEFERRED_MODULES) == []
+
+
+def test_metrics_does_not_import_plotting():
+    assert (
+        _loaded_modules("loratestbed.metrics", ["matplotlib", "tabulate", "pdb"]) == []
+    )
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from loratestbed.load_planner import encode_intervals, node_airtimes, plan_offered_load
+from loratestbed.main_controller import prepare_config
+from loratestbed.utils import compute_packet_time
+
+
+def _legacy_encoding(interval_msec):
+    # DeviceManager._set_transmit_interval_milliseconds
+    multiplier = interval_msec // 256 + 1
+    return int(interval_msec / multiplier) * multiplier
+
+
+def test_encode_intervals_beats_legacy_quantization():
+    targets = np.arange(1, 65026)
+    bases, multipliers, intervals = encode_intervals(targets)
+    assert np.array_equal(bases * multipliers, intervals)
+    assert bases.max() <= 255 and multipliers.max() <= 255
+
+    error = np.abs(targets / intervals - 1)
+    legacy_error = np.abs(
+        targets / np.array([_legacy_encoding(t) for t in targets]) - 1
+    )
+    assert np.all(error <= legacy_error + 1e-12)
+    # 1001 = 7 * 143, the legacy encoding writes 4 * 250
+    assert encode_intervals(1001)[2] == 1001
+
+
+def test_plan_heterogeneous_load():
+    airtimes = node_airtimes(3, 16, ["SF7", "SF7", "SF9"], "BW125", "CR_4_5")
+    assert airtimes[0] == compute_packet_time(16, "SF7", "BW125", "CR_4_5")
+    assert airtimes[2] == compute_packet_time(16, "SF9", "BW125", "CR_4_5")
+
+    plan = plan_offered_load(airtimes, node_offered_load_percent=[10, 20, 30])
+    assert np.allclose(
+        plan["achieved_load_percent"],
+        airtimes
+        * 1000
+        * 100
+        / (plan["tx_interval_base"] * plan["tx_interval_multiplier"]),
+    )
+    assert np.all(np.abs(plan["load_error_percent"]) / [10, 20, 30] < 0.005)
+
+    even_plan = plan_offered_load(airtimes[:2], offered_load_percent=50)
+    assert even_plan["requested_load_percent"].tolist() == [25, 25]
+
+
+def test_prepare_config_checks_node_loads():
+    config = {
+        "device_list": [33, 26],
+        "experiment_time_sec": 10,
+        "packet_size_bytes": 16,
+        "transmit_SF": "SF8",
+        "transmit_BW": "BW125",
+        "transmit_CR": "CR_4_8",
+        "node_offered_load_percent": [10, 50],
+    }
+    assert prepare_config(dict(config))["offered_load_percent"] == 60
+    with pytest.raises(ValueError):
+        prepare_config(dict(config, offered_load_percent=80))
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import yaml
+
+from loratestbed.main_controller import load_config
+from loratestbed.mac_simulator import (
+    _collisions,
+    arrival_intervals_ms,
+    simulate_experiment,
+    simulate_transmissions,
+)
+from loratestbed.metrics import compute_experiment_results
+
+
+def _config(tmp_path, **overrides):
+    config = {
+        "device_list": list(range(24, 34)),
+        "experiment_time_sec": 600,
+        "offered_load_percent": 80,
+        "packet_size_bytes": 16,
+        "mac_protocol": "aloha",
+        "packet_arrival_model": "poisson",
+        "transmit_SF": "SF8",
+        "receive_SF": "SF8",
+        "transmit_BW": "BW125",
+        "receive_BW": "BW125",
+        "transmit_CR": "CR_4_8",
+        "receive_CR": "CR_4_8",
+    }
+    config.update(overrides)
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(yaml.safe_dump(config))
+    return load_config(config_file)
+
+
+def test_arrival_intervals():
+    rng = np.random.default_rng(0)
+    assert np.all(arrival_intervals_ms(rng, 500, 10, "periodic") == 500)
+
+    poisson = arrival_intervals_ms(rng, 500, 100000, "poisson")
+    assert np.all(poisson == np.floor(poisson))
+    assert abs(poisson.mean() / 500 - 1) < 0.02
+
+    jittered = arrival_intervals_ms(rng, 500, 100000, "periodic", variance_ms=100)
+    assert jittered.min() >= 450 and jittered.max() <= 550
+
+
+def test_collisions_per_channel():
+    start = np.array([0.0, 0.5, 2.0, 2.1, 3.0])
+    end = start + 1
+    channel = np.array([0, 0, 0, 1, 0])
+    assert _collisions(start, end, channel).tolist() == [
+        True,
+        True,
+        False,
+        False,
+        False,
+    ]
+
+
+def test_single_node_never_collides():
+    transmissions = simulate_transmissions(100, [1000], 0.1, "csma", "periodic", seed=0)
+    assert not transmissions["collided"].any()
+    assert transmissions["counter"].tolist() == list(range(len(transmissions)))
+    # periodic arrivals every second, carrier sense adds a few ms
+    assert np.allclose(np.diff(transmissions["start_sec"]), 1.0)
+
+
+def test_carrier_sense_beats_aloha_at_high_load():
+    kwargs = {"interval_msec": np.full(20, 2000), "airtime_sec": 0.1, "seed": 0}
+    aloha = simulate_transmissions(600, mac_protocol="aloha", **kwargs)
+    csma = simulate_transmissions(600, mac_protocol="csma", **kwargs)
+    assert csma["collided"].mean() < aloha["collided"].mean() / 2
+    assert csma["backoffs"].sum() > 0
+
+
+def test_carrier_sense_misses_weak_transmissions():
+    kwargs = {"interval_msec": np.full(20, 2000), "airtime_sec": 0.1, "seed": 0}
+    aloha = simulate_transmissions(600, mac_protocol="aloha", **kwargs)
+    # below the -90 dBm CSMA threshold nobody senses anybody
+    weak = simulate_transmissions(
+        600, mac_protocol="csma", link_rssi_dbm=np.full(20, -100), **kwargs
+    )
+    assert weak["backoffs"].sum() == 0
+    assert weak["collided"].mean() > aloha["collided"].mean() / 2
+    # FSMA senses down to -116 dBm
+    fsma = simulate_transmissions(
+        600, mac_protocol="fsma", link_rssi_dbm=np.full(20, -100), **kwargs
+    )
+    assert fsma["backoffs"].sum() > 0
+
+    # half the nodes hear only each other
+    link_rssi_dbm = np.full((20, 20), -100.0)
+    link_rssi_dbm[:10, :10] = -40
+    hidden = simulate_transmissions(
+        600, mac_protocol="csma", link_rssi_dbm=link_rssi_dbm, **kwargs
+    )
+    assert 0 < hidden["backoffs"].sum()
+    assert hidden[hidden["node"] >= 10]["backoffs"].sum() == 0
+
+
+def test_simulate_experiment_columns(tmp_path):
+    config = _config(tmp_path)
+    expt_results_df = simulate_experiment(config, seed=0)
+
+    reference_df = compute_experiment_results(
+        pd.DataFrame(
+            {
+                "NodeAddress": [24],
+                "Counter": [0],
+                "SNR": [10],
+                "RSSI": [-30],
+                "TransmittedPackets": [1],
+            }
+        ),
+        **config,
+    )
+    assert expt_results_df.columns.tolist() == reference_df.columns.tolist()
+    assert sorted(expt_results_df["node_indices"]) == config["device_list"]
+    assert np.isclose(
+        expt_results_df["normalized_offered_load"].sum(),
+        config["offered_load_percent"] / 100,
+    )
+    # pure ALOHA at G = 0.8
+    assert 0.1 < expt_results_df["normalized_throughput"].sum() < 0.25
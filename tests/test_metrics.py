@@ -1,5 +1,18 @@
-from loratestbed.metrics import read_packet_trace, extract_required_metrics_from_trace
+from loratestbed.metrics import (
+    read_packet_trace,
+    extract_required_metrics_from_trace,
+    parse_byte_string,
+    filter_packet_trace,
+    compute_experiment_results,
+    compute_grouped_metrics,
+    compute_node_metrics,
+    stream_experiment_results,
+)
+from loratestbed.sequence import SEQUENCE_STAT_COLUMNS
 import os
+import numpy as np
+import pandas as pd
+import pytest
 import logging
 import pdb
 import sys
@@ -21,3 +34,239 @@ def test_read_packet_trace():
     packet_trace = read_packet_trace(FULL_PATH_FILENAME)
 
     print(packet_trace)
+
+
+def test_read_packet_trace_decodes_address_and_counter():
+    packet_trace = read_packet_trace(FULL_PATH_FILENAME)
+
+    for payload_hex, node_address, counter in zip(
+        packet_trace["Payload"], packet_trace["NodeAddress"], packet_trace["Counter"]
+    ):
+        payload = bytes.fromhex(
+            payload_hex if len(payload_hex) % 2 == 0 else "0" + payload_hex
+        )
+        assert (node_address, counter) == parse_byte_string(payload[:4])
+        assert all(byte == 0 for byte in payload[4:])
+
+
+def test_read_packet_trace_skips_malformed_lines(tmp_path):
+    filename = str(tmp_path / "gateway.csv")
+    with open(filename, "wb") as f:
+        f.write(b"Hi, this is gateway rx\n")
+        f.write(b"21000000000000000000000000000000, -9, 28, 0\n")
+        f.write(b"1F01000\n")
+        f.write(b"FF0A, -61, -33, 0\n")
+        f.write(b"21010000000000\xff00000000000000, -9, 28, 0\n")
+        f.write(b"21020000000000000000000000000000, -9, 28, 0, 5\n")
+        f.write(b"210300000000000000000000000000, -12, 20, 0\n")
+
+    packet_trace = read_packet_trace(filename)
+    assert packet_trace["Counter"].tolist() == [0, 3]
+    assert packet_trace["RSSI"].tolist() == [-9, -12]
+
+
+def test_read_packet_trace_keeps_long_payloads(tmp_path):
+    # packet_size_bytes goes up to 255, every byte is checked
+    filename = str(tmp_path / "gateway.csv")
+    padding = "00" * 96
+    with open(filename, "w") as f:
+        f.write(f"21000000{padding}, -9, 28, 0\n")
+        f.write(f"21010000{padding[:-2]}01, -9, 28, 0\n")
+        f.write(f"21020000{padding[:-2]}0G, -9, 28, 0\n")
+        f.write(f"21030000{'00' * 251}, -9, 28, 0\n")
+
+    packet_trace = read_packet_trace(filename, rssi_threshold=None)
+    assert packet_trace["Counter"].tolist() == [0, 3]
+    unfiltered = read_packet_trace(
+        filename, rssi_threshold=None, check_zero_padding=False
+    )
+    assert unfiltered["Counter"].tolist() == [0, 1, 3]
+
+
+def test_filter_packet_trace_rejections():
+    packet_trace = pd.DataFrame(
+        {
+            "Payload": ["21000000", "21010000", "17020000", "21030000", "2104000001"],
+            "RSSI": [-10, -10, -10, -60, -10],
+            "SNR": [20, 20, 20, 20, 20],
+            "CRCStatus": [0, 1, 0, 0, 0],
+            "NodeAddress": [33, 33, 23, 33, 33],
+            "Counter": [0, 1, 2, 3, 4],
+        }
+    )
+    filtered, rejections = filter_packet_trace(packet_trace, return_rejections=True)
+    assert filtered["Counter"].tolist() == [0]
+    assert rejections == {"crc": 1, "node_address": 1, "rssi": 1, "zero_padding": 1}
+
+    filtered = filter_packet_trace(
+        packet_trace, check_crc=False, min_node_address=None, rssi_threshold=-70
+    )
+    assert filtered["Counter"].tolist() == [0, 1, 2, 3]
+
+
+def _node_metrics_from_test_data():
+    packet_trace = read_packet_trace(FULLPATH + "/data/gateway_test.csv")
+    controller_df = pd.read_csv(
+        FULLPATH + "/data/contoller_test.csv",
+        names=["NodeAddress", "TransmittedPackets", "BackoffCounter", "LBTCounter"],
+    )
+    return extract_required_metrics_from_trace(packet_trace, controller_df)
+
+
+def test_compute_experiment_results_per_node():
+    node_metrics_df = _node_metrics_from_test_data()
+    expt_results_df = compute_experiment_results(node_metrics_df, 10, 0.1, 16, 60)
+
+    assert expt_results_df["node_indices"].tolist() == list(
+        node_metrics_df["NodeAddress"].unique()
+    )
+    num_nodes = len(expt_results_df)
+    for _, row in expt_results_df.iterrows():
+        node_df = node_metrics_df[node_metrics_df["NodeAddress"] == row["node_indices"]]
+        transmitted = node_df["TransmittedPackets"].iloc[0]
+        assert row["total_packets"] == transmitted
+        assert row["missing_packets"] == transmitted - len(node_df)
+        assert row["packet_reception_ratio"] == len(node_df) / transmitted
+        assert row["throughput_bps"] == len(node_df) * 16 * 8 / 10
+        assert np.isclose(row["normalized_offered_load"], 0.6 / num_nodes)
+        assert row["snr_values"].dtype == np.int8
+        assert np.array_equal(row["snr_values"], node_df["SNR"])
+        assert row["snr_p50"] == np.quantile(node_df["SNR"], 0.5, method="inverted_cdf")
+        assert row["rssi_hist"].sum() == len(node_df)
+        assert np.isclose(row["snr_mean"], node_df["SNR"].mean())
+        assert np.isclose(row["rssi_std"], node_df["RSSI"].std(ddof=0))
+
+
+def test_compute_grouped_metrics_by_key():
+    node_metrics_df = _node_metrics_from_test_data()
+    sf_group = (
+        node_metrics_df["NodeAddress"].map(lambda node: "SF7" if node < 30 else "SF8")
+    ).rename("SF")
+    grouped_df = compute_grouped_metrics(
+        node_metrics_df, 10, 0.1, 16, 60, group_keys=[sf_group]
+    ).set_index("SF")
+    per_node_df = compute_experiment_results(node_metrics_df, 10, 0.1, 16, 60)
+
+    sf7 = per_node_df[per_node_df["node_indices"] < 30]
+    assert grouped_df.loc["SF7", "num_nodes"] == len(sf7)
+    assert grouped_df.loc["SF7", "total_packets"] == sf7["total_packets"].sum()
+    assert np.isclose(
+        grouped_df.loc["SF7", "throughput_bps"], sf7["throughput_bps"].sum()
+    )
+    assert np.isclose(
+        grouped_df["normalized_offered_load"].sum(),
+        per_node_df["normalized_offered_load"].sum(),
+    )
+
+
+def test_stream_experiment_results_matches_full_read():
+    node_metrics_df = _node_metrics_from_test_data()
+    expected_df = compute_experiment_results(node_metrics_df, 10, 0.1, 16, 60)
+    controller_df = pd.read_csv(
+        FULLPATH + "/data/contoller_test.csv",
+        names=["NodeAddress", "TransmittedPackets", "BackoffCounter", "LBTCounter"],
+    )
+
+    # chunks much smaller than the trace, a node spans several of them
+    streamed_df = stream_experiment_results(
+        FULLPATH + "/data/gateway_test.csv",
+        controller_df,
+        10,
+        0.1,
+        16,
+        60,
+        chunk_size=7,
+    )
+    expected_df = expected_df.drop(
+        columns=["snr_values", "rssi_values"] + SEQUENCE_STAT_COLUMNS
+    )
+    pd.testing.assert_frame_equal(streamed_df, expected_df, check_dtype=False)
+
+
+def test_empty_trace_gives_empty_results(tmp_path):
+    controller_df = pd.read_csv(
+        FULLPATH + "/data/contoller_test.csv",
+        names=["NodeAddress", "TransmittedPackets", "BackoffCounter", "LBTCounter"],
+    )
+    for content in [b"", b"Hi, this is gateway rx\n"]:
+        filename = str(tmp_path / "gateway.csv")
+        with open(filename, "wb") as f:
+            f.write(content)
+        node_metrics_df = extract_required_metrics_from_trace(
+            read_packet_trace(filename, use_cache=False), controller_df
+        )
+        expected_df = compute_experiment_results(node_metrics_df, 10, 0.1, 16, 60)
+        streamed_df = stream_experiment_results(
+            filename, controller_df, 10, 0.1, 16, 60
+        )
+        assert expected_df.empty and streamed_df.empty
+        assert set(streamed_df.columns) <= set(expected_df.columns)
+
+
+def test_grouped_metrics_by_gateway():
+    node_metrics_df = _node_metrics_from_test_data()
+    # gw1 hears every other packet of what gw0 hears
+    both_df = pd.concat(
+        [
+            node_metrics_df.assign(Gateway="gw0"),
+            node_metrics_df[node_metrics_df["Counter"] % 2 == 0].assign(Gateway="gw1"),
+        ],
+        ignore_index=True,
+    )
+    grouped_df = compute_grouped_metrics(
+        both_df, 10, 0.1, 16, 60, group_keys=["Gateway"]
+    ).set_index("Gateway")
+
+    # nodes heard by both gateways count the counter range each one heard
+    for gateway, gateway_df in both_df.groupby("Gateway"):
+        counters = gateway_df.groupby("NodeAddress")["Counter"]
+        row = grouped_df.loc[gateway]
+        assert row["received_packets"] == len(gateway_df)
+        assert row["total_packets"] == (counters.max() - counters.min() + 1).sum()
+        assert row["num_nodes"] == gateway_df["NodeAddress"].nunique()
+    # every gateway is offered the load of the nodes it hears
+    assert np.isclose(grouped_df.loc["gw0", "normalized_offered_load"], 0.6)
+    assert (grouped_df["packet_reception_ratio"] <= 1).all()
+
+
+def test_grouped_metrics_by_time_window():
+    node_metrics_df = _node_metrics_from_test_data()
+    # periodic traffic, the counter stands in for the transmit time
+    window = (node_metrics_df["Counter"] // 20).rename("window")
+    grouped_df = compute_grouped_metrics(
+        node_metrics_df, 10, 0.1, 16, 60, group_keys=[window], group_time_sec=2
+    ).set_index("window")
+
+    assert grouped_df["received_packets"].sum() == len(node_metrics_df)
+    for window_idx, row in grouped_df.iterrows():
+        window_df = node_metrics_df[window == window_idx]
+        counters = window_df.groupby("NodeAddress")["Counter"]
+        assert row["total_packets"] == (counters.max() - counters.min() + 1).sum()
+        assert np.isclose(row["throughput_bps"], len(window_df) * 16 * 8 / 2)
+
+
+def test_compute_node_metrics_load_is_the_selection_load():
+    node_metrics_df = _node_metrics_from_test_data()
+    nodes = node_metrics_df["NodeAddress"].unique().tolist()[:3]
+    node_metrics = compute_node_metrics(node_metrics_df, 10, 0.1, 16, 30, nodes)
+    assert np.isclose(node_metrics["normalized_offered_load"], 0.3)
+    assert np.isclose(node_metrics["offered_load_bps"], 16 * 8 / 0.1 * 0.3)
+
+
+def test_experiment_results_use_per_node_loads():
+    node_metrics_df = _node_metrics_from_test_data()
+    device_list = node_metrics_df["NodeAddress"].unique().tolist()
+    node_loads = [10 * (idx + 1) for idx in range(len(device_list))]
+    expt_results_df = compute_experiment_results(
+        node_metrics_df,
+        10,
+        0.1,
+        16,
+        sum(node_loads),
+        device_list=device_list,
+        node_offered_load_percent=node_loads,
+    ).set_index("node_indices")
+    assert np.allclose(
+        expt_results_df.loc[device_list, "normalized_offered_load"],
+        np.array(node_loads) / 100,
+    )
@@ -0,0 +1,97 @@
+from loratestbed.multi_gateway import (
+    PacketMerger,
+    parse_gateway_line,
+    format_gateway_line,
+)
+
+
+def test_parse_gateway_line():
+    packet = parse_gateway_line(b"21050100000000000000000000000000, -9, 28, 0", "gw0")
+    assert packet.node_address == 33
+    assert packet.counter == 261
+    assert packet.rssi == -9
+    assert packet.snr == 28
+    assert packet.crc_status == 0
+    assert (
+        format_gateway_line(packet) == "21050100000000000000000000000000, -9, 28, 0\n"
+    )
+
+    assert parse_gateway_line(b"Hi, this is gateway rx") is None
+    assert parse_gateway_line(b"FF0A, -61, -33, 0") is None
+
+    # long payloads are written to the merged trace whole
+    line = b"21050100" + b"00" * 96 + b", -9, 28, 0"
+    packet = parse_gateway_line(line)
+    assert len(packet.payload) == 100
+    assert format_gateway_line(packet) == line.decode() + "\n"
+    assert parse_gateway_line(b"ZZ0A0000, -61, -33, 0") is None
+
+
+def test_packet_merger_deduplicates_and_selects_best():
+    merger = PacketMerger(hold_time_sec=1.0)
+    merger.add(parse_gateway_line(b"21000000, -40, 10, 0", "gw0", 0.0))
+    merger.add(parse_gateway_line(b"21000000, -30, 20, 0", "gw1", 0.1))
+    merger.add(parse_gateway_line(b"21010000, -50, 5, 0", "gw1", 0.2))
+
+    assert merger.pop_ready(now=0.5) == []
+    released = merger.pop_ready(now=1.05)
+    assert len(released) == 1
+    packet, num_gateways = released[0]
+    assert packet.gateway == "gw1"
+    assert num_gateways == 2
+
+    # late copy of an already released packet is only counted
+    merger.add(parse_gateway_line(b"21000000, -20, 30, 0", "gw0", 1.1))
+    released = merger.flush()
+    assert [(p.counter, n) for p, n in released] == [(1, 1)]
+
+    stats = merger.gateway_stats()
+    assert stats["gw0"]["received"] == 2
+    assert stats["gw0"]["late_duplicates"] == 1
+    assert stats["gw0"]["selected"] == 0
+    assert stats["gw1"]["selected"] == 2
+    assert stats["gw1"]["unique"] == 1
+    assert stats["gw1"]["heard"] == 2
+
+
+def test_packet_merger_prefers_crc_ok():
+    merger = PacketMerger(hold_time_sec=0.0)
+    merger.add(parse_gateway_line(b"21000000, -10, 40, 1", "gw0", 0.0))
+    merger.add(parse_gateway_line(b"21000000, -60, 2, 0", "gw1", 0.0))
+    ((packet, _),) = merger.flush()
+    assert packet.gateway == "gw1"
+
+
+def test_crc_failed_key_does_not_block_later_packet():
+    merger = PacketMerger(hold_time_sec=0.0)
+    # corrupted copy carries the key of a packet that is still to come
+    merger.add(parse_gateway_line(b"21070000, -80, 1, 1", "gw0", 0.0))
+    ((packet, num_gateways),) = merger.flush()
+    assert packet.crc_status == 1
+    assert num_gateways == 0
+
+    merger.add(parse_gateway_line(b"21070000, -30, 20, 0", "gw1", 1.0))
+    ((packet, num_gateways),) = merger.flush()
+    assert packet.gateway == "gw1"
+    assert num_gateways == 1
+
+    stats = merger.gateway_stats()
+    assert stats["gw0"]["late_duplicates"] == 0
+    assert stats["gw0"]["heard"] == 0
+    assert stats["gw0"]["unique"] == 0
+    assert stats["gw0"]["selected"] == 1
+    assert stats["gw1"]["unique"] == 1
+
+
+def test_crc_failed_copy_is_not_counted_as_heard():
+    merger = PacketMerger(hold_time_sec=1.0)
+    merger.add(parse_gateway_line(b"21080000, -30, 20, 0", "gw0", 0.0))
+    merger.add(parse_gateway_line(b"21080000, -80, 1, 1", "gw1", 0.1))
+    ((packet, num_gateways),) = merger.flush()
+    assert packet.gateway == "gw0"
+    assert num_gateways == 1
+
+    stats = merger.gateway_stats()
+    assert stats["gw0"]["unique"] == 1
+    assert stats["gw1"]["heard"] == 0
+    assert stats["gw1"]["crc_errors"] == 1
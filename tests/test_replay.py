@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+import pytest
+
+from loratestbed.gateway_parser import parse_gateway_buffer
+from loratestbed.multi_gateway import format_tagged_line, packets_from_parsed
+from loratestbed.replay import (
+    archived_run_files,
+    load_capture,
+    replay_capture,
+    replay_schedule,
+)
+from loratestbed.synthetic import write_synthetic_trace
+
+TEST_TRACE_FILENAME = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "test_packet_trace.csv"
+)
+
+
+def _write_tagged_capture(filename, num_lines=40, line_spacing_sec=0.01):
+    with open(TEST_TRACE_FILENAME, "rb") as f:
+        packets = packets_from_parsed(parse_gateway_buffer(f.read()))[:num_lines]
+    with open(filename, "w") as f:
+        for idx, packet in enumerate(packets):
+            gateway = "gw0" if idx % 2 == 0 else "gw1"
+            timestamp = 1700000000.0 + idx * line_spacing_sec
+            f.write(
+                format_tagged_line(
+                    packet._replace(timestamp=timestamp, gateway=gateway)
+                )
+            )
+    return packets
+
+
+def test_load_plain_capture_segment():
+    with open(TEST_TRACE_FILENAME, "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+
+    capture = load_capture(TEST_TRACE_FILENAME)
+    assert capture.timestamps is None
+    assert capture.data == b"".join(lines)
+    assert len(capture.line_ends) == len(lines)
+
+    segment = load_capture(TEST_TRACE_FILENAME, skip_lines=10, max_lines=5)
+    assert segment.data == b"".join(lines[10:15])
+    assert segment.line_ends[-1] == len(segment.data)
+    assert len(load_capture(TEST_TRACE_FILENAME, skip_lines=len(lines)).data) == 0
+    with pytest.raises(ValueError):
+        load_capture(TEST_TRACE_FILENAME, gateway="gw0")
+
+
+def test_load_tagged_capture(tmp_path):
+    filename = str(tmp_path / "tagged.csv")
+    packets = _write_tagged_capture(filename)
+
+    capture = load_capture(filename)
+    parsed = parse_gateway_buffer(capture.data)
+    assert len(parsed) == len(packets)
+    assert parsed.counter.tolist() == [packet.counter for packet in packets]
+    assert np.allclose(np.diff(capture.timestamps), 0.01, atol=1e-5)
+
+    gateway_capture = load_capture(filename, gateway="gw1")
+    assert len(gateway_capture.line_ends) == len(packets) // 2
+    assert gateway_capture.timestamps[0] == pytest.approx(1700000000.01)
+
+
+def test_replay_schedule(tmp_path):
+    filename = str(tmp_path / "tagged.csv")
+    _write_tagged_capture(filename, num_lines=11)
+    capture = load_capture(filename)
+    assert replay_schedule(capture, None) is None
+    assert replay_schedule(capture, 2.0)[-1] == pytest.approx(0.05)
+
+    plain_capture = load_capture(TEST_TRACE_FILENAME, max_lines=10)
+    assert replay_schedule(plain_capture, 1.0, duration_sec=5)[-1] == pytest.approx(4.5)
+    with pytest.raises(ValueError):
+        replay_schedule(plain_capture, 1.0)
+
+
+def test_replay_at_max_speed_matches_capture(tmp_path):
+    capture_filename = str(tmp_path / "gateway-20240101-120000.csv")
+    write_synthetic_trace(capture_filename, 20000, num_nodes=10, seed=0)
+    output_filename = str(tmp_path / "replayed.csv")
+
+    capture = load_capture(capture_filename)
+    stats = replay_capture(capture, None, output_filename)
+    with open(output_filename, "rb") as f:
+        assert f.read() == capture.data
+    parsed = parse_gateway_buffer(capture.data)
+    assert stats["num_bytes_dropped"] == 0
+    assert stats["num_packets"] == len(parsed)
+    assert stats["num_malformed"] == parsed.num_malformed
+    assert stats["num_crc_errors"] == int(parsed.crc_status.sum())
+
+
+def test_replay_keeps_capture_timing(tmp_path):
+    capture_filename = str(tmp_path / "tagged.csv")
+    _write_tagged_capture(capture_filename, num_lines=41, line_spacing_sec=0.01)
+    output_filename = str(tmp_path / "replayed.csv")
+
+    capture = load_capture(capture_filename)
+    stats = replay_capture(capture, replay_schedule(capture, 2.0), output_filename)
+    assert stats["scheduled_sec"] == pytest.approx(0.2)
+    assert 0.2 <= stats["replay_sec"] < 1.0
+    assert stats["num_packets"] == 41
+    with open(output_filename, "rb") as f:
+        assert f.read() == capture.data
+
+
+def test_archived_run_files(tmp_path):
+    capture_filename = str(tmp_path / "gateway-20240101-120000.csv")
+    (tmp_path / "config-20240101-120000.yaml").write_text("experiment_time_sec: 10\n")
+    assert archived_run_files(capture_filename) == (
+        str(tmp_path / "config-20240101-120000.yaml"),
+        None,
+    )
+    assert archived_run_files(str(tmp_path / "capture.csv")) == (None, None)
@@ -0,0 +1,138 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from loratestbed.experiment_logbook import logbook_add_entry
+from loratestbed.metrics import (
+    compute_experiment_results,
+    extract_required_metrics_from_trace,
+    read_packet_trace,
+)
+from loratestbed.results_store import ResultsStore, flatten_config, import_logbook
+
+FULLPATH = os.path.dirname(os.path.abspath(__file__))
+
+CONFIG = {
+    "experiment_time_sec": 10,
+    "offered_load_percent": 60,
+    "packet_size_bytes": 16,
+    "packet_airtime_sec": 0.1,
+    "device_list": [28, 34],
+    "mac_protocol": "csma",
+    "transmit_SF": "SF8",
+    "packet_filter": {"check_crc": True, "rssi_threshold": None},
+}
+
+
+def _results():
+    controller_df = pd.read_csv(
+        FULLPATH + "/data/contoller_test.csv",
+        names=["NodeAddress", "TransmittedPackets", "BackoffCounter", "LBTCounter"],
+    )
+    node_metrics_df = extract_required_metrics_from_trace(
+        read_packet_trace(FULLPATH + "/data/gateway_test.csv"), controller_df
+    )
+    return compute_experiment_results(node_metrics_df, **CONFIG)
+
+
+def test_flatten_config():
+    assert flatten_config(CONFIG) == {
+        "experiment_time_sec": 10,
+        "offered_load_percent": 60,
+        "packet_size_bytes": 16,
+        "packet_airtime_sec": 0.1,
+        "mac_protocol": "csma",
+        "transmit_SF": "SF8",
+        "packet_filter.check_crc": True,
+    }
+
+
+def test_append_and_query_runs(tmp_path):
+    store = ResultsStore(str(tmp_path / "dataset"))
+    expt_results_df = _results()
+    runs = [
+        ("20240101-100000", "csma", "SF8", 20),
+        ("20240101-110000", "aloha", "SF8", 40),
+        ("20240102-100000", "csma", "SF7", 60),
+        ("20240103-100000", "csma", "SF8", 80),
+    ]
+    for timestamp, mac_protocol, sf, load in runs:
+        config = dict(
+            CONFIG, mac_protocol=mac_protocol, transmit_SF=sf, offered_load_percent=load
+        )
+        store.append_run(expt_results_df, config, timestamp, "sweep")
+    assert os.path.isdir(
+        tmp_path / "dataset" / "date=2024-01-01" / "mac_protocol=aloha"
+    )
+
+    table = store.read(
+        ["offered_load_percent", "normalized_throughput"],
+        {"mac_protocol": "csma", "transmit_SF": "SF8"},
+    )
+    assert list(table.columns) == ["offered_load_percent", "normalized_throughput"]
+    assert table["offered_load_percent"].tolist() == [20] * len(expt_results_df) + [
+        80
+    ] * len(expt_results_df)
+    np.testing.assert_allclose(
+        table["normalized_throughput"][: len(expt_results_df)],
+        expt_results_df["normalized_throughput"],
+    )
+
+    # partitions outside the time range are not opened
+    assert len(store.fragments(start=datetime(2024, 1, 2))) == 2
+    table = store.read(
+        ["timestamp", "node_indices"],
+        {"offered_load_percent": [40, 60], "node_indices": 34},
+        end=datetime(2024, 1, 2, 12),
+    )
+    assert table["timestamp"].tolist() == ["20240101-110000", "20240102-100000"]
+    assert store.read(filters={"transmit_SF": "SF9"}).empty
+
+
+def test_array_columns_round_trip(tmp_path):
+    store = ResultsStore(str(tmp_path / "dataset"))
+    expt_results_df = _results()
+    store.append_run(expt_results_df, CONFIG, "20240101-100000", "sweep")
+
+    table = store.read()
+    assert table["mac_protocol"].unique().tolist() == ["csma"]
+    assert table["packet_filter.check_crc"].all()
+    assert (
+        table["total_offered_load"].iloc[0]
+        == expt_results_df["normalized_offered_load"].sum()
+    )
+    for column in ["snr_hist", "snr_values", "rssi_values"]:
+        for stored, original in zip(table[column], expt_results_df[column]):
+            np.testing.assert_array_equal(stored, original)
+
+
+def test_import_logbook(tmp_path):
+    results_folder = tmp_path / "results"
+    results_folder.mkdir()
+    results_filename = str(results_folder / "results-20240101-100000.pkl")
+    config_filename = str(results_folder / "config-20240101-100000.yaml")
+    _results().to_pickle(results_filename)
+    with open(config_filename, "w") as f:
+        yaml.dump(CONFIG, f)
+    logbook_file = str(results_folder / "experiment_logbook.sqlite")
+    logbook_add_entry(
+        logbook_file,
+        {
+            "date_time_str": "20240101-100000",
+            "expt_name": "old-run",
+            "expt_version": 1.0,
+            "experiment_time_sec": 10,
+            "controller_filename": results_filename,
+            "gateway_filename": str(results_folder / "gateway-20240101-100000.csv"),
+            "metadata_filename": config_filename,
+            "logbook_message": "",
+        },
+        CONFIG,
+    )
+
+    store = ResultsStore(str(results_folder / "dataset"))
+    assert import_logbook(store, logbook_file) == 1
+    assert store.read(["expt_name"])["expt_name"].unique().tolist() == ["old-run"]
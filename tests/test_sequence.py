@@ -0,0 +1,39 @@
+import pandas as pd
+
+from loratestbed.sequence import loss_run_lengths, sequence_stats, windowed_prr
+
+
+def _node_metrics(rows):
+    return pd.DataFrame(rows, columns=["NodeAddress", "Counter", "TransmittedPackets"])
+
+
+def test_sequence_stats():
+    # node 30 sent 0..9: 2-3 and 7-9 lost, 5 repeated, 4 after 6
+    # node 25 sent 0..3: all received
+    node_metrics_df = _node_metrics(
+        [(30, c, 10) for c in [0, 1, 5, 6, 5, 4]] + [(25, c, 4) for c in [0, 1, 2, 3]]
+    )
+    stats = sequence_stats(node_metrics_df)
+
+    assert stats.index.tolist() == [30, 25]
+    assert stats.loc[30, "duplicate_packets"] == 1
+    assert stats.loc[30, "out_of_order_packets"] == 1
+    assert stats.loc[30, "loss_runs"] == 2
+    assert stats.loc[30, "max_loss_run"] == 3
+    assert stats.loc[30, "mean_loss_run"] == 2.5
+    assert stats.loc[30, "loss_after_loss_ratio"] == 3 / 5
+    assert stats.loc[25, "loss_runs"] == 0
+    assert stats.loc[25, "max_loss_run"] == 0
+
+    runs = loss_run_lengths(node_metrics_df)
+    assert runs.values.tolist() == [[30, 2, 1], [30, 3, 1]]
+
+
+def test_windowed_prr():
+    node_metrics_df = _node_metrics([(30, c, 10) for c in [0, 1, 5, 6, 5, 4]])
+    windows = windowed_prr(node_metrics_df, window_packets=4, stride=2)
+
+    assert windows["window_start"].tolist() == [0, 2, 4, 6, 8]
+    assert windows["window_end"].tolist() == [4, 6, 8, 10, 10]
+    assert windows["received_packets"].tolist() == [2, 2, 3, 1, 0]
+    assert windows["packet_reception_ratio"].tolist() == [0.5, 0.5, 0.75, 0.25, 0.0]
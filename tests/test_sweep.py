@@ -0,0 +1,136 @@
+import threading
+import time
+
+from loratestbed.device_manager import DeviceManager, LoRaRegister
+from loratestbed.main_controller import configure_devices, prepare_config
+from loratestbed.metrics import read_packet_trace
+from loratestbed.sweep import (
+    AnalysisPipeline,
+    GatewayRecorder,
+    _dry_run_configure,
+    _EchoInterface,
+    expand_grid,
+    order_runs,
+    register_image,
+)
+from loratestbed.synthetic import PtyTrafficSource, SyntheticGatewayTraffic
+
+BASE_CONFIG = {
+    "device_list": [33, 26],
+    "experiment_time_sec": 10,
+    "offered_load_percent": 80,
+    "packet_size_bytes": 16,
+    "mac_protocol": "aloha",
+    "packet_arrival_model": "poisson",
+    "transmit_SF": "SF8",
+    "receive_SF": "SF8",
+    "transmit_BW": "BW125",
+    "receive_BW": "BW125",
+    "transmit_CR": "CR_4_8",
+    "receive_CR": "CR_4_8",
+}
+GRID = {
+    "offered_load_percent": [20, 80],
+    "mac_protocol": ["aloha", "csma"],
+    "transmit_SF": ["SF7", "SF8"],
+    "packet_size_bytes": [16, 32],
+}
+
+
+def test_expand_grid_links_receive_settings():
+    configs = expand_grid(BASE_CONFIG, GRID)
+    assert len(configs) == 16
+    assert all(config["receive_SF"] == config["transmit_SF"] for config in configs)
+    assert configs[0]["offered_load_percent"] == 20
+    assert "tx_interval_base" in configs[0]
+
+
+def test_register_cache_skips_unchanged_writes():
+    config = prepare_config(dict(BASE_CONFIG))
+    device_manager = DeviceManager(
+        config["device_list"], _EchoInterface(), cache_registers=True
+    )
+    first_writes = _dry_run_configure(device_manager, config)
+    # the broadcast disable resets the experiment time, nothing else changed
+    assert _dry_run_configure(device_manager, config) == 2 + len(config["device_list"])
+    assert device_manager.num_skipped_writes > 0
+
+    uncached = DeviceManager(config["device_list"], _EchoInterface())
+    _dry_run_configure(uncached, config)
+    assert _dry_run_configure(uncached, config) == first_writes
+
+    device_manager.invalidate_register_cache()
+    assert _dry_run_configure(device_manager, config) == first_writes
+
+
+def test_periodic_variance_is_written():
+    config = prepare_config(
+        dict(BASE_CONFIG, packet_arrival_model="periodic", periodic_variance_ms=100)
+    )
+    image = register_image(config).reshape(len(config["device_list"]), -1)
+    assert (image[:, LoRaRegister.SCHEDULER_INTERVAL_MODE.value] == 2).all()
+    assert (image[:, LoRaRegister.PERIODIC_TX_VARIANCE_X10_MS.value] == 10).all()
+
+
+def test_order_runs_reduces_register_writes():
+    configs = expand_grid(BASE_CONFIG, GRID)
+    order, num_writes = order_runs(configs)
+    assert sorted(order) == list(range(len(configs)))
+
+    device_manager = DeviceManager(
+        BASE_CONFIG["device_list"], _EchoInterface(), cache_registers=True
+    )
+    grid_order_writes = sum(
+        _dry_run_configure(device_manager, config) for config in configs
+    )
+    assert sum(num_writes) < grid_order_writes
+
+
+def test_gateway_recorder_records_only_during_runs(tmp_path):
+    source = PtyTrafficSource(
+        SyntheticGatewayTraffic(
+            num_nodes=4, crc_error_rate=0, short_line_rate=0, seed=0
+        )
+    )
+    recorder = GatewayRecorder(source.slave_name)
+    try:
+        source.run(packets_per_sec=2000, duration_sec=0.2)
+        time.sleep(0.2)
+        for run in range(2):
+            trace_filename = tmp_path / f"gateway-{run}.csv"
+            recorder.start_run(trace_filename)
+            source.run(packets_per_sec=2000, duration_sec=0.3)
+            time.sleep(0.3)
+            recorder.stop_run()
+            assert recorder.num_packets > 0
+            packet_trace = read_packet_trace(
+                trace_filename, use_cache=False, rssi_threshold=None
+            )
+            assert len(packet_trace) == recorder.num_packets
+    finally:
+        recorder.close()
+        source.close()
+
+
+def test_analysis_pipeline_keeps_order_and_bounds_queue():
+    processed = []
+    release = threading.Event()
+
+    def slow_process(name):
+        release.wait()
+        processed.append(name)
+        return None, {"expt_name": name}
+
+    pipeline = AnalysisPipeline(slow_process, max_pending=1)
+    pipeline.submit("run-0")  # taken by the worker, blocked in slow_process
+    pipeline.submit("run-1")  # fills the queue
+    blocked_submit = threading.Thread(target=pipeline.submit, args=("run-2",))
+    blocked_submit.start()
+    blocked_submit.join(timeout=0.2)
+    assert blocked_submit.is_alive()
+
+    release.set()
+    blocked_submit.join()
+    pipeline.close()
+    assert processed == ["run-0", "run-1", "run-2"]
+    assert [entry["expt_name"] for entry in pipeline.logbook_entries] == processed
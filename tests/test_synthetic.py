@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from loratestbed.gateway_parser import parse_gateway_buffer
+from loratestbed.synthetic import SyntheticGatewayTraffic, write_synthetic_trace
+
+
+def test_synthetic_traffic_format():
+    traffic = SyntheticGatewayTraffic(
+        num_nodes=5,
+        reception_ratio=1.0,
+        crc_error_rate=0.0,
+        short_line_rate=0.0,
+        seed=0,
+    )
+    parsed = parse_gateway_buffer(traffic.next_chunk(1000))
+    assert len(parsed) == 1000
+    assert parsed.num_malformed == 0
+    assert set(parsed.node_address.tolist()) == {24, 25, 26, 27, 28}
+    assert (parsed.payload[:, 4:] == 0).all()
+
+    # counters of each node run 0, 1, 2, ... in arrival order
+    transmitted = traffic.transmitted_packets()
+    for node_address, num_transmitted in transmitted.items():
+        counter = parsed.counter[parsed.node_address == node_address]
+        assert np.array_equal(counter, np.arange(num_transmitted))
+
+
+def test_synthetic_trace_losses_and_errors(tmp_path):
+    filename = str(tmp_path / "gateway.csv")
+    transmitted = write_synthetic_trace(
+        filename,
+        20000,
+        chunk_size=3000,
+        num_nodes=10,
+        reception_ratio=0.8,
+        crc_error_rate=0.05,
+        short_line_rate=0.01,
+        seed=1,
+    )
+    assert sum(transmitted.values()) == 20000
+
+    with open(filename, "rb") as f:
+        parsed = parse_gateway_buffer(f.read())
+    # banner plus short lines are malformed
+    assert 100 < parsed.num_malformed < 300
+    assert 14000 < len(parsed) < 18000
+    assert 0.03 < parsed.crc_status.mean() < 0.07
+
+
+def test_synthetic_node_addresses_are_unique():
+    with pytest.raises(ValueError):
+        SyntheticGatewayTraffic(num_nodes=22)
+    with pytest.raises(ValueError):
+        SyntheticGatewayTraffic(node_addresses=[24, 25, 24])
+
+    traffic = SyntheticGatewayTraffic(node_addresses=list(range(100, 130)), seed=0)
+    traffic.next_chunk(3000)
+    transmitted = traffic.transmitted_packets()
+    assert len(transmitted) == 30
+    assert sum(transmitted.values()) == 3000
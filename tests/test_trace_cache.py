@@ -0,0 +1,115 @@
+import os
+import shutil
+
+import pandas as pd
+
+from loratestbed.metrics import (
+    filter_packet_trace,
+    open_packet_trace,
+    read_packet_trace,
+)
+from loratestbed.trace_cache import TraceCache, file_digest
+
+FULLPATH = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_read_packet_trace_hits_cache(tmp_path, trace_cache_dir):
+    trace_filename = str(tmp_path / "gateway.csv")
+    shutil.copy(FULLPATH + "/data/gateway_test.csv", trace_filename)
+
+    parsed = read_packet_trace(trace_filename)
+    assert len(TraceCache().entries()) == 1
+    cached = read_packet_trace(trace_filename)
+    pd.testing.assert_frame_equal(cached, parsed)
+
+    # filters apply to the cached trace, so they can change between reads
+    unfiltered = read_packet_trace(trace_filename, rssi_threshold=None)
+    assert len(unfiltered) > len(parsed)
+
+    # same content under another name is the same entry
+    shutil.copy(trace_filename, tmp_path / "copy.csv")
+    assert file_digest(str(tmp_path / "copy.csv")) == file_digest(trace_filename)
+
+    with open(trace_filename, "a") as f:
+        f.write("21000000, -9, 28, 0\n")
+    assert (
+        len(read_packet_trace(trace_filename, rssi_threshold=None))
+        == len(unfiltered) + 1
+    )
+    assert len(TraceCache().entries()) == 2
+
+
+def test_cache_evicts_least_recently_used():
+    trace_filename = FULLPATH + "/data/gateway_test.csv"
+    read_packet_trace(trace_filename)
+    ((_, entry_size, _),) = TraceCache().entries()
+
+    cache = TraceCache(max_size_bytes=int(2.5 * entry_size))
+    decoded = cache.load(file_digest(trace_filename))
+    cache.clear()
+    cache.store("first", *decoded)
+    cache.store("second", *decoded)
+    os.utime(os.path.join(cache.cache_dir, "trace-first"), (0, 0))
+    os.utime(os.path.join(cache.cache_dir, "trace-second"), (1, 1))
+
+    # a hit makes the entry recently used, the oldest one goes when full
+    assert cache.load("first") is not None
+    cache.store("third", *decoded)
+    entry_names = sorted(os.path.basename(path) for path, _, _ in cache.entries())
+    assert entry_names == ["trace-first", "trace-third"]
+
+
+def test_open_packet_trace_queries_match_full_read():
+    trace_filename = FULLPATH + "/data/gateway_test.csv"
+    packet_trace = read_packet_trace(trace_filename, use_cache=False)
+    cached_trace = open_packet_trace(trace_filename)
+    # unfiltered, so every node of the filtered trace is there
+    assert set(packet_trace["NodeAddress"]) <= set(cached_trace.node_addresses())
+
+    node_trace, payload_bytes = cached_trace.node(28)
+    node_trace = filter_packet_trace(node_trace, payload_bytes)
+    expected = packet_trace[packet_trace["NodeAddress"] == 28].sort_values(
+        "Counter", kind="stable"
+    )
+    pd.testing.assert_frame_equal(node_trace, expected)
+
+    range_trace, payload_bytes = cached_trace.counter_range(28, 10, 20)
+    assert range_trace["Counter"].between(10, 20).all()
+    range_trace = filter_packet_trace(range_trace, payload_bytes)
+    pd.testing.assert_frame_equal(
+        range_trace, expected[expected["Counter"].between(10, 20)]
+    )
+    assert len(cached_trace.node(1000)[0]) == 0
+
+
+def test_small_cache_keeps_entry_just_stored(monkeypatch):
+    monkeypatch.setenv("LORATESTBED_CACHE_MAX_BYTES", "1000")
+    trace_filename = FULLPATH + "/data/gateway_test.csv"
+    cached_trace = open_packet_trace(trace_filename)
+    assert cached_trace is not None
+    assert 28 in set(cached_trace.node_addresses())
+    # the next store evicts it
+    cache = TraceCache()
+    cache.store("other", *cache.load(file_digest(trace_filename)))
+    entry_names = [os.path.basename(path) for path, _, _ in cache.entries()]
+    assert entry_names == ["trace-other"]
+
+
+def test_evict_removes_old_format_and_tolerates_removed_entries(trace_cache_dir):
+    cache = TraceCache()
+    os.makedirs(cache.cache_dir, exist_ok=True)
+    legacy_filename = os.path.join(cache.cache_dir, "trace-0123abcd.npz")
+    with open(legacy_filename, "wb") as f:
+        f.write(b"\0" * 100)
+    assert [path for path, _, _ in cache.entries()] == [legacy_filename]
+    cache.evict()
+    assert not os.path.exists(legacy_filename)
+
+    # another process removed the entry after this one listed it
+    trace_filename = FULLPATH + "/data/gateway_test.csv"
+    read_packet_trace(trace_filename)
+    ((entry_path, _, _),) = cache.entries()
+    shutil.rmtree(entry_path)
+    cache._remove(entry_path)
+    cache.clear()
+    assert cache.entries() == []
@@ -0,0 +1,84 @@
+import json
+import os
+import threading
+
+import pytest
+
+from loratestbed import tracing
+from loratestbed.metrics import read_packet_trace
+from loratestbed.tracing import span, traced, tracing_to
+
+TEST_TRACE_FILENAME = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "test_packet_trace.csv"
+)
+
+
+@traced()
+def _configure(num_registers):
+    with span("test.write_registers", num_registers=num_registers):
+        return num_registers
+
+
+def _spans(tracer):
+    return [
+        event for event in tracer.chrome_trace()["traceEvents"] if event["ph"] == "X"
+    ]
+
+
+def test_disabled_tracing_records_nothing():
+    assert tracing._tracer is None
+    assert span("test.block") is tracing._NULL_SPAN
+    with span("test.block") as block:
+        block.set(size=1)
+    assert _configure(3) == 3
+    assert tracing._tracer is None
+
+
+def test_spans_of_traced_functions_nest():
+    with tracing_to(None) as tracer:
+        assert tracer is None
+
+    tracer = tracing.enable_tracing()
+    try:
+        assert _configure(3) == 3
+    finally:
+        tracing.disable_tracing()
+    inner, outer = _spans(tracer)
+    assert outer["name"] == "test_tracing._configure"
+    assert inner["name"] == "test.write_registers"
+    assert inner["args"] == {"num_registers": 3}
+    assert outer["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+
+
+def test_failing_span_is_written(tmp_path):
+    trace_filename = str(tmp_path / "trace.json")
+    with pytest.raises(ValueError):
+        with tracing_to(trace_filename):
+            thread = threading.Thread(
+                target=read_packet_trace,
+                args=(TEST_TRACE_FILENAME, False),
+                name="reader",
+            )
+            thread.start()
+            thread.join()
+            with span("test.read_results") as block:
+                block.set(num_devices=2)
+                raise ValueError("Not all devices responded to ping")
+    assert tracing._tracer is None
+
+    with open(trace_filename, "r") as f:
+        chrome_trace = json.load(f)
+    events = chrome_trace["traceEvents"]
+    thread_names = {
+        event["tid"]: event["args"]["name"]
+        for event in events
+        if event["ph"] == "M" and event["name"] == "thread_name"
+    }
+    spans = {event["name"]: event for event in events if event["ph"] == "X"}
+    assert "metrics.read_packet_trace" in spans
+    assert "metrics.parse_csv" in spans
+    assert thread_names[spans["metrics.read_packet_trace"]["tid"]] == "reader"
+    assert spans["test.read_results"]["args"]["num_devices"] == 2
+    assert "Not all devices" in spans["test.read_results"]["args"]["error"]
+    assert all(event["dur"] >= 0 for event in spans.values())
@@ -3,7 +3,13 @@ from loratestbed.utils import (
     bytes_to_uint8,
     compute_packet_time,
     get_transmit_interval_msec,
+    comp_lora_airtime,
+    lora_airtime,
+    lookup_lora_airtime,
 )
+import itertools
+import numpy as np
+import pytest
 
 
 def test_uint8_to_bytes():
@@ -62,3 +68,40 @@ def test_transmit_interval():
     print(
         f"10 devices, {packet_size_bytes} byte payload, [SF{sf_val}|{bw_str}|{cr_str}] \nOffered load: {100}%, Transmit interval: {transmit_interval_msec} msec"
     )
+
+
+def test_airtime_table_matches_datasheet_formula():
+    settings = list(
+        itertools.product([0, 16, 51, 255], range(7, 13), [125000, 500000], range(1, 5))
+    )
+    payload_bytes, sf, bw_hz, cr = np.array(settings).T
+    table_airtime = lookup_lora_airtime(payload_bytes, sf, bw_hz, cr)
+
+    for (pl, sf_val, bw_val, cr_val), airtime in zip(settings, table_airtime):
+        low_data_rate = int(sf_val >= 11 and bw_val == 125000)
+        expected = comp_lora_airtime(
+            pl, sf_val, 1, 0, low_data_rate, cr_val, bw_val, 2**sf_val
+        )
+        assert airtime == pytest.approx(expected)
+    assert np.allclose(table_airtime, lora_airtime(payload_bytes, sf, bw_hz, cr))
+
+
+def test_compute_packet_time_all_settings():
+    # 16 bytes at SF7/125 kHz: 12.25 preamble + 8 + 6 blocks of CR + 4 symbols
+    assert compute_packet_time(16, "SF7", "BW125", "CR_4_5") == pytest.approx(
+        (12.25 + 8 + 30) * 128 / 125000
+    )
+    assert compute_packet_time(16, "SF7", "BW125", "CR_4_7") == pytest.approx(
+        (12.25 + 8 + 42) * 128 / 125000
+    )
+    # low data rate optimization is on at SF12/125 kHz, not at SF12/250 kHz
+    assert compute_packet_time(16, "SF12", "BW125", "CR_4_8") == pytest.approx(
+        (12.25 + 8 + 32) * 4096 / 125000
+    )
+    assert compute_packet_time(16, "SF12", "BW250", "CR_4_8") == pytest.approx(
+        (12.25 + 8 + 24) * 4096 / 250000
+    )
+    with pytest.raises(ValueError):
+        compute_packet_time(16, "SF6", "BW125", "CR_4_5")
+    with pytest.raises(ValueError):
+        compute_packet_time(16, "SF7", "BW125", "CR_4_9")